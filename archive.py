@@ -0,0 +1,73 @@
+import csv, gzip, io, os, threading
+from datetime import datetime, timedelta
+import config, search
+from models import Booking, HEADER
+
+# ===== LƯU TRỮ ĐƠN CŨ =====
+# Mỗi ngày hẹn 1 file archive/YYYY-MM-DD.csv.gz (10 cột A-J). Ghi thêm dưới dạng
+# gzip nhiều member nên không phải đọc lại file cũ. File nằm trên ổ đĩa của instance (mất khi
+# deploy lại) nên chỉ dùng để tìm nhanh; bản lưu chính là tab ARCHIVE_SHEET (sheets.clear_old_data).
+
+_lock = threading.Lock()
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value.strip(), '%d/%m/%Y').date()
+    except (ValueError, AttributeError):
+        return None
+
+def row_day(b):
+    # Ngày hẹn (cột F); không đọc được thì dùng ngày tạo (cột J: 'HH:MM dd/mm/yyyy')
+    day = parse_date(b.date)
+    if day is None:
+        day = parse_date(b.created[-10:])
+    return day
+
+def is_old(b, today):
+    # Đơn của ngày đã qua; dòng không rõ ngày thì giữ lại trên sheet
+    day = row_day(b)
+    return day is not None and day < today
+
+def _path(day):
+    return os.path.join(config.ARCHIVE_DIR, f"{day.isoformat()}.csv.gz")
+
+def write_rows(bookings):
+    by_day = {}
+    for b in bookings:
+        by_day.setdefault(row_day(b), []).append(b.to_row())
+    with _lock:
+        os.makedirs(config.ARCHIVE_DIR, exist_ok=True)
+        for day, day_rows in by_day.items():
+            path = _path(day)
+            buf = io.StringIO()
+            w = csv.writer(buf)
+            if not os.path.exists(path):
+                w.writerow(HEADER)
+            w.writerows(day_rows)
+            with gzip.open(path, 'at', encoding='utf-8', newline='') as f:
+                f.write(buf.getvalue())
+    return {day.isoformat(): len(r) for day, r in by_day.items()}
+
+def read_day(day):
+    # day: date hoặc chuỗi dd/mm/yyyy
+    if isinstance(day, str):
+        day = parse_date(day)
+    path = _path(day) if day else ''
+    if not day or not os.path.exists(path):
+        return []
+    with gzip.open(path, 'rt', encoding='utf-8', newline='') as f:
+        return [Booking.from_row(r) for r in csv.reader(f) if tuple(r) != HEADER]
+
+def search_archive(keyword, days=30, limit=10):
+    # Tìm trong lịch sử các ngày gần đây, mới nhất trước
+    import sheets
+    q = search.Query(keyword)
+    today = sheets.vn_now().date()
+    results = []
+    for i in range(1, days + 1):
+        for b in reversed(read_day(today - timedelta(days=i))):
+            if search.matches(q, b):
+                results.append(b)
+                if len(results) >= limit:
+                    return results
+    return results
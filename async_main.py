@@ -0,0 +1,134 @@
+import asyncio, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+import config, logs, metrics
+import main
+
+# ===== SERVER ASYNC (aiohttp) =====
+# Cùng các route với main.py (logic dùng chung ở main.process_*). Đây là lớp nhận request trên
+# event loop đặt trước thread pool: loop chỉ đọc / trả request, mọi phần chặn (gspread, SQLite,
+# handler, lệnh gọi Telegram / Zalo qua http_client) chạy trong pool ASYNC_BLOCKING_WORKERS
+# thread; request vượt quá thì chờ trên loop chứ không giữ worker. Lệnh gửi Telegram / Zalo từ
+# webhook vốn đã chạy nền (hàng đợi theo chat, outbox) nên không có bản HTTP client async riêng.
+# Chạy: SERVER_MODE=async (gunicorn.conf.py) hoặc python async_main.py
+
+log = logs.get_logger('async')
+
+_pool = ThreadPoolExecutor(config.ASYNC_BLOCKING_WORKERS, thread_name_prefix='blocking')
+pool_stats = {'calls': 0, 'in_flight': 0}
+
+metrics.collect('async_blocking_in_flight', 'gauge', 'Blocking calls running or waiting in the async thread pool',
+                lambda: pool_stats['in_flight'])
+
+async def blocking(fn, *args):
+    # Chạy fn trong thread pool, giữ request id (contextvars) cho log
+    ctx = contextvars.copy_context()
+    pool_stats['calls'] += 1
+    pool_stats['in_flight'] += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_pool, ctx.run, fn, *args)
+    finally:
+        pool_stats['in_flight'] -= 1
+
+async def _json(request):
+    try:
+        data = await request.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+def reply(result):
+    body, status = result
+    return web.json_response(body, status=status)
+
+
+# ===== REQUEST ID, ĐO THỜI GIAN & CORS =====
+# CORS mở cho mọi origin như flask-cors trong main.py
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+
+@web.middleware
+async def request_context(request, handler):
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else 'unmatched'
+    with metrics.timer('http_request_seconds', route=route):
+        logs.new_request_id(request.headers.get('X-Request-ID'))
+        if request.method == 'OPTIONS':
+            response = web.json_response({'ok': True}, headers={
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': request.headers.get('Access-Control-Request-Headers', '*'),
+            })
+        else:
+            try:
+                response = await handler(request)
+            except web.HTTPException as e:
+                response = web.Response(status=e.status, text=e.text, headers=e.headers)
+        response.headers.update(CORS_HEADERS)
+        response.headers['X-Request-ID'] = logs.request_id.get()
+    metrics.inc('http_requests_total', route=route, status=response.status)
+    return response
+
+
+# ===== ROUTES =====
+async def home(request):
+    return web.json_response(main.home_info())
+
+async def handle_booking(request):
+    try:
+        form, raw = {}, ''
+        if request.content_type == 'multipart/form-data':
+            form = dict(await request.post())
+        else:
+            raw = await request.text()
+            if request.content_type == 'application/x-www-form-urlencoded':
+                form = dict(await request.post())
+        log.debug("Booking request", content_type=request.content_type, size=len(raw))
+        return reply(await blocking(main.process_booking, main.parse_booking(raw, form), request.headers.get('Idempotency-Key')))
+    except Exception as e:
+        log.exception(f"Booking error: {e}")
+        return web.json_response({'success': False, 'message': 'Lỗi hệ thống!'}, status=500)
+
+async def handle_telegram(request):
+    return reply(await blocking(main.process_telegram, await _json(request)))
+
+async def handle_zalo(request):
+    # Chỉ kiểm tra + đưa vào hàng đợi Zalo, không chặn: chạy thẳng trên loop
+    return reply(main.process_zalo(await _json(request), request.headers.get('X-ZaloOA-Secret', '')))
+
+async def setup(request):
+    return web.json_response(await blocking(main.setup_info, str(request.url.origin())))
+
+async def debug(request):
+    info = await blocking(main.debug_info)
+    info['async_pool'] = dict(pool_stats, workers=config.ASYNC_BLOCKING_WORKERS)
+    return web.json_response(info)
+
+async def metrics_endpoint(request):
+    return web.Response(text=await blocking(metrics.render),
+                        headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+async def test_booking(request):
+    return reply(await blocking(main.test_booking_result))
+
+async def reset(request):
+    return reply(await blocking(main.reset_result))
+
+
+async def _cleanup(app):
+    _pool.shutdown(wait=False)
+
+app = web.Application(middlewares=[request_context])
+app.add_routes([
+    web.get('/', home),
+    web.post('/booking', handle_booking),
+    web.post('/telegram', handle_telegram),
+    web.post('/zalo', handle_zalo),
+    web.get('/setup', setup),
+    web.get('/debug', debug),
+    web.get('/metrics', metrics_endpoint),
+    web.get('/test-booking', test_booking),
+    web.get('/reset', reset),
+])
+app.on_cleanup.append(_cleanup)
+
+if __name__ == '__main__':
+    web.run_app(app, host='0.0.0.0', port=config.PORT)
@@ -0,0 +1,237 @@
+import re, time
+from datetime import datetime
+import config, db, logs, search, sheets
+from models import Status, parse_status
+
+log = logs.get_logger('availability')
+
+# ===== LỊCH TRỐNG THEO KHUNG GIỜ =====
+# Giờ làm việc (WORK_HOURS) chia thành ô SLOT_MINUTES phút; mỗi ô nhận tối đa SLOT_CAPACITY
+# khách cùng lúc. Mỗi đơn chiếm các ô phủ [giờ hẹn, giờ hẹn + thời lượng dịch vụ).
+# Chỗ đã đặt nằm trong bảng slot_bookings (SQLite, mọi worker dùng chung), theo từng ngày:
+# lần đầu hỏi tới 1 ngày thì nạp từ storage (index trong bộ nhớ / SQLite, không gọi Google),
+# sau đó chỉ sửa từng dòng khi giữ chỗ / hủy. Hỏi giờ trống của 1 ngày: đọc các đơn của ngày
+# đó, cộng dồn ra số khách từng ô rồi quét 1 lượt -> O(số ô).
+# Giữ chỗ (reserve) kiểm tra và ghi trong cùng 1 transaction BEGIN IMMEDIATE nên 2 request
+# cùng giờ ở 2 worker không thể cùng lọt. Giờ đã qua và giờ lệch mốc ô (08:15 khi ô 30 phút)
+# bị từ chối như giờ ngoài giờ làm việc.
+
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS slot_bookings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        day TEXT NOT NULL,
+        booking_id TEXT NOT NULL DEFAULT '',
+        start INTEGER NOT NULL,
+        minutes INTEGER NOT NULL,
+        held REAL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_slot_bookings_day ON slot_bookings (day)',
+    "CREATE UNIQUE INDEX IF NOT EXISTS idx_slot_bookings_booking ON slot_bookings (day, booking_id, start) WHERE booking_id != ''",
+    'CREATE TABLE IF NOT EXISTS slot_days (day TEXT PRIMARY KEY, built REAL NOT NULL)',
+)
+
+# Thời lượng (phút) theo tên dịch vụ trong zalo_bot.SERVICES (phần trước ' - ', bỏ dấu)
+DURATIONS = {
+    'cat toc nam': 30,
+    'cao rau & tao kieu': 30,
+    'nhuom toc': 90,
+    'goi dau & massage': 45,
+    'uon / duoi': 120,
+    'combo vip': 90,
+}
+DEFAULT_DURATION = 30
+# Chỗ giữ mà request chết trước khi lưu xong đơn: sau bấy nhiêu giây thì bỏ (= timeout gunicorn)
+HOLD_TTL = 120
+
+MESSAGES = {
+    'taken': 'Khung giờ này đã kín lịch, vui lòng chọn giờ khác!',
+    'closed': 'Ngoài giờ làm việc, vui lòng chọn giờ khác!',
+    'past': 'Giờ này đã qua, vui lòng chọn giờ khác!',
+    'off_grid': f'Giờ hẹn theo mốc {config.SLOT_MINUTES} phút, vui lòng chọn giờ khác!',
+}
+# Lý do từ chối -> khóa trong stats
+REASON_STATS = {'taken': 'conflicts', 'closed': 'closed', 'past': 'past', 'off_grid': 'off_grid'}
+
+stats = {'reserved': 0, 'conflicts': 0, 'closed': 0, 'past': 0, 'off_grid': 0, 'released': 0, 'days_built': 0, 'queries': 0}
+_built = set()   # ngày worker này đã biết là có trong slot_days
+
+
+def parse_time(text):
+    # 'HH:MM' -> số phút từ 00:00; sai định dạng -> None
+    m = re.match(r'^\s*([01]?\d|2[0-3]):([0-5]\d)', text or '')
+    return int(m.group(1)) * 60 + int(m.group(2)) if m else None
+
+def format_time(minutes):
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+def day_of(date):
+    # 'yyyy-mm-dd' (website) hoặc 'dd/mm/yyyy' (sheet, Zalo) -> 'yyyy-mm-dd'; sai -> None
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y'):
+        try:
+            return datetime.strptime((date or '').strip(), fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            pass
+    return None
+
+def duration_of(service):
+    name = search.fold(service.split(' - ')[0].split(' — ')[0]).strip()
+    for key, minutes in DURATIONS.items():
+        if name.startswith(key):
+            return minutes
+    return DEFAULT_DURATION
+
+def _work_hours():
+    # '08:00-13:00,14:00-17:00' -> [(480, 780), (840, 1020)]
+    hours = []
+    for part in config.WORK_HOURS.split(','):
+        start, _, end = part.partition('-')
+        start, end = parse_time(start), parse_time(end)
+        if start is not None and end is not None and start < end:
+            hours.append((start, end))
+    return sorted(hours)
+
+HOURS = _work_hours()
+OPEN = HOURS[0][0] if HOURS else 0
+SLOTS = -(-(HOURS[-1][1] - OPEN) // config.SLOT_MINUTES) if HOURS else 0
+# Ô nào nằm trọn trong giờ làm việc
+_OPEN_MASK = bytes(
+    any(s <= OPEN + i * config.SLOT_MINUTES and OPEN + (i + 1) * config.SLOT_MINUTES <= e for s, e in HOURS)
+    for i in range(SLOTS))
+
+def _span(start, minutes):
+    # Các ô [first, last) mà khoảng [start, start + minutes) phủ lên
+    first = (start - OPEN) // config.SLOT_MINUTES
+    last = -(-(start + minutes - OPEN) // config.SLOT_MINUTES)
+    return first, last
+
+
+# ===== SỐ KHÁCH TỪNG Ô =====
+def _ensure(day):
+    # Ngày chưa có trong slot_days: nạp các đơn của ngày đó từ storage (đơn bị từ chối không chiếm chỗ)
+    if day in _built:
+        return
+    conn = db.connect()
+    if conn.execute('SELECT 1 FROM slot_days WHERE day = ?', (day,)).fetchone() is None:
+        import storage
+        date = datetime.strptime(day, '%Y-%m-%d').strftime('%d/%m/%Y')
+        rows = [(day, b.id, parse_time(b.time), duration_of(b.service))
+                for b in storage.backend().get_bookings_by_date(date)
+                if parse_status(b.status) != Status.REJECTED and parse_time(b.time) is not None]
+        today = sheets.vn_now().strftime('%Y-%m-%d')
+        with db.transaction() as conn:
+            if conn.execute('SELECT 1 FROM slot_days WHERE day = ?', (day,)).fetchone() is None:
+                conn.executemany('INSERT OR IGNORE INTO slot_bookings (day, booking_id, start, minutes) VALUES (?, ?, ?, ?)', rows)
+                conn.execute('INSERT INTO slot_days (day, built) VALUES (?, ?)', (day, time.time()))
+                conn.execute('DELETE FROM slot_bookings WHERE day < ?', (today,))
+                conn.execute('DELETE FROM slot_days WHERE day < ?', (today,))
+                stats['days_built'] += 1
+                log.info(f"Availability: loaded {len(rows)} bookings for {day}")
+    _built.add(day)
+
+def _occupancy(conn, day):
+    # Số khách từng ô: mảng hiệu (+1 ở ô đầu, -1 sau ô cuối) rồi cộng dồn
+    diff = [0] * (SLOTS + 1)
+    for start, minutes in conn.execute(
+            "SELECT start, minutes FROM slot_bookings WHERE day = ? AND (booking_id != '' OR held >= ?)",
+            (day, time.time() - HOLD_TTL)):
+        first, last = _span(start, minutes)
+        first, last = max(first, 0), min(last, SLOTS)
+        if first < last:
+            diff[first] += 1
+            diff[last] -= 1
+    counts, used = [], 0
+    for d in diff[:SLOTS]:
+        used += d
+        counts.append(used)
+    return counts
+
+def _free_run(counts):
+    # run[i] = số ô trống liên tiếp tính từ ô i
+    run = [0] * (SLOTS + 1)
+    for i in range(SLOTS - 1, -1, -1):
+        run[i] = run[i + 1] + 1 if _OPEN_MASK[i] and counts[i] < config.SLOT_CAPACITY else 0
+    return run
+
+def _check(counts, day, start, minutes):
+    # None nếu còn chỗ, không thì 'past' / 'off_grid' / 'closed' / 'taken'
+    now = sheets.vn_now()
+    today = now.strftime('%Y-%m-%d')
+    if day < today or (day == today and start <= now.hour * 60 + now.minute):
+        return 'past'
+    if (start - OPEN) % config.SLOT_MINUTES:
+        return 'off_grid'
+    first, last = _span(start, minutes)
+    if first < 0 or last > SLOTS or not all(_OPEN_MASK[first:last]):
+        return 'closed'
+    if any(c >= config.SLOT_CAPACITY for c in counts[first:last]):
+        return 'taken'
+    return None
+
+
+# ===== API =====
+def free_slots(date, service=''):
+    # Giờ còn nhận được dịch vụ này trong ngày -> ['08:00', '08:30', ...]; hôm nay thì bỏ giờ đã qua
+    day = day_of(date)
+    if day is None:
+        return []
+    _ensure(day)
+    stats['queries'] += 1
+    run = _free_run(_occupancy(db.connect(), day))
+    need = -(-duration_of(service) // config.SLOT_MINUTES)
+    now = sheets.vn_now()
+    earliest = now.hour * 60 + now.minute if now.strftime('%Y-%m-%d') == day else -1
+    return [format_time(OPEN + i * config.SLOT_MINUTES) for i in range(SLOTS)
+            if run[i] >= need and OPEN + i * config.SLOT_MINUTES > earliest]
+
+def check(date, time_text, service=''):
+    # Thông báo lỗi nếu giờ này không nhận được, None nếu còn chỗ (hoặc ngày / giờ không đọc được)
+    day, start = day_of(date), parse_time(time_text)
+    if day is None or start is None:
+        return None
+    _ensure(day)
+    reason = _check(_occupancy(db.connect(), day), day, start, duration_of(service))
+    return MESSAGES[reason] if reason else None
+
+def reserve(date, time_text, service=''):
+    # Giữ chỗ trước khi lưu đơn -> (hold, lỗi). Ngày / giờ không đọc được thì không kiểm tra: (None, None)
+    day, start = day_of(date), parse_time(time_text)
+    if day is None or start is None:
+        return None, None
+    _ensure(day)
+    minutes = duration_of(service)
+    with db.transaction() as conn:
+        reason = _check(_occupancy(conn, day), day, start, minutes)
+        if reason is None:
+            hold = conn.execute('INSERT INTO slot_bookings (day, start, minutes, held) VALUES (?, ?, ?, ?)',
+                                (day, start, minutes, time.time())).lastrowid
+    if reason is not None:
+        stats[REASON_STATS[reason]] += 1
+        log.info(f"Availability: {day} {format_time(start)} {reason}")
+        return None, MESSAGES[reason]
+    stats['reserved'] += 1
+    return hold, None
+
+def confirm(hold, booking_id):
+    # Đơn đã lưu: chỗ giữ thành chỗ của đơn (không còn hết hạn)
+    if hold is not None:
+        with db.transaction() as conn:
+            conn.execute('UPDATE OR IGNORE slot_bookings SET booking_id = ?, held = NULL WHERE id = ?', (booking_id, hold))
+
+def cancel(hold):
+    if hold is not None:
+        with db.transaction() as conn:
+            conn.execute('DELETE FROM slot_bookings WHERE id = ?', (hold,))
+
+def release(booking):
+    # Đơn bị từ chối: trả lại chỗ
+    day, start = day_of(booking.date), parse_time(booking.time)
+    if day is None or start is None:
+        return
+    with db.transaction() as conn:
+        if conn.execute('DELETE FROM slot_bookings WHERE day = ? AND booking_id = ? AND start = ?',
+                        (day, booking.id, start)).rowcount:
+            stats['released'] += 1
+
+def get_stats():
+    return dict(stats, slot_minutes=config.SLOT_MINUTES, capacity=config.SLOT_CAPACITY,
+                work_hours=config.WORK_HOURS, days_known=len(_built))
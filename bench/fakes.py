@@ -0,0 +1,179 @@
+import json, re, threading, time
+import requests
+from requests.adapters import BaseAdapter
+from gspread.exceptions import APIError
+
+# ===== GIẢ LẬP GOOGLE SHEETS / TELEGRAM / ZALO CHO BENCHMARK =====
+# Chạy trong cùng process, không gọi mạng. Mỗi lần gọi có độ trễ giả lập và được đếm
+# theo method để tính số lời gọi ra ngoài trên mỗi request.
+
+HEADER = ['ID', 'Họ tên', 'SĐT', 'Email', 'Dịch vụ', 'Ngày', 'Giờ', 'Ghi chú', 'Trạng thái', 'Tạo lúc']
+READS = {'get_all_values', 'row_values', 'batch_get', 'get_values'}
+
+
+def _response(status, body, url=''):
+    resp = requests.Response()
+    resp.status_code = status
+    resp._content = json.dumps(body).encode()
+    resp.headers['Content-Type'] = 'application/json'
+    resp.url = url
+    return resp
+
+
+class Counter:
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def hit(self, name):
+        with self.lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.calls)
+
+
+class Quota:
+    # Cửa sổ 60 giây như quota đọc / ghi theo user của Sheets API; 0 = không giới hạn
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.window = {'read': [0.0, 0], 'write': [0.0, 0]}
+        self.lock = threading.Lock()
+
+    def take(self, kind):
+        if not self.per_minute:
+            return True
+        with self.lock:
+            w = self.window[kind]
+            now = time.monotonic()
+            if now - w[0] >= 60:
+                w[0], w[1] = now, 0
+            if w[1] >= self.per_minute:
+                return False
+            w[1] += 1
+            return True
+
+
+class FakeSpreadsheet:
+    def __init__(self, ws):
+        self.ws = ws
+        self.tabs = {}
+
+    def worksheet(self, title):
+        # Tab khác (ARCHIVE_SHEET): tạo khi gọi lần đầu, đã có dòng tiêu đề
+        if title not in self.tabs:
+            self.tabs[title] = FakeWorksheet(latency=self.ws.latency)
+        return self.tabs[title]
+
+    def batch_update(self, body):
+        self.ws._enter('spreadsheet.batch_update')
+        with self.ws.lock:
+            for r in body.get('requests', []):
+                rg = r['deleteDimension']['range']
+                del self.ws.rows[rg['startIndex']:rg['endIndex']]
+        return {}
+
+
+class FakeWorksheet:
+    # Đủ các method gspread.Worksheet mà sheets.py dùng
+    def __init__(self, rows=(), latency=0.0, quota=0):
+        self.rows = [list(HEADER)] + [list(r) for r in rows]
+        self.latency = latency
+        self.quota = Quota(quota)
+        self.counter = Counter()
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.id = 0
+        self.spreadsheet = FakeSpreadsheet(self)
+
+    def _enter(self, name):
+        self.counter.hit(name)
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.quota.take('read' if name in READS else 'write'):
+            self.throttled += 1
+            raise APIError(_response(429, {'error': {
+                'code': 429, 'message': 'Quota exceeded (fake)', 'status': 'RESOURCE_EXHAUSTED'}}))
+
+    def get_all_values(self, *a, **kw):
+        self._enter('get_all_values')
+        with self.lock:
+            return [list(r) for r in self.rows]
+
+    def row_values(self, row, *a, **kw):
+        self._enter('row_values')
+        with self.lock:
+            return list(self.rows[row - 1]) if row <= len(self.rows) else []
+
+    def update_cell(self, row, col, value):
+        self._enter('update_cell')
+        with self.lock:
+            self._cell(row, col, value)
+
+    def batch_update(self, data, **kw):
+        self._enter('batch_update')
+        with self.lock:
+            for d in data:
+                m = re.match(r'([A-Z])(\d+)', d['range'])
+                col, row = ord(m.group(1)) - 64, int(m.group(2))
+                for j, v in enumerate(d['values'][0]):
+                    self._cell(row, col + j, v)
+        return {}
+
+    def append_rows(self, values, **kw):
+        self._enter('append_rows')
+        with self.lock:
+            start = len(self.rows) + 1
+            self.rows.extend(list(v) for v in values)
+            end = len(self.rows)
+        return {'updates': {'updatedRange': f"Sheet1!A{start}:J{end}"}}
+
+    def append_row(self, values, **kw):
+        return self.append_rows([values], **kw)
+
+    def _cell(self, row, col, value):
+        while len(self.rows) < row:
+            self.rows.append([''] * 10)
+        r = self.rows[row - 1]
+        r.extend([''] * (col - len(r)))
+        r[col - 1] = value
+
+
+class FakeBotAPI(BaseAdapter):
+    # Gắn vào requests.Session: trả lời như Telegram Bot API / Zalo Bot API
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.counter = Counter()
+        self.message_id = 0
+        self.lock = threading.Lock()
+
+    def send(self, request, **kw):
+        host = re.match(r'https?://([^/]+)', request.url).group(1)
+        method = request.url.rsplit('/', 1)[-1].split('?')[0]
+        service = 'telegram' if 'telegram' in host else 'zalo' if 'zalo' in host else 'other'
+        self.counter.hit(f'{service}.{method}' if service != 'other' else 'other')
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.message_id += 1
+            result = {'message_id': self.message_id}
+        resp = _response(200, {'ok': True, 'result': result}, request.url)
+        resp.request = request
+        return resp
+
+    def close(self):
+        pass
+
+
+def group(calls):
+    # {'telegram.sendMessage': 3, ...} -> {'telegram': {'sendMessage': 3}, ...}
+    out = {}
+    for name, n in calls.items():
+        service, _, method = name.partition('.')
+        out.setdefault(service, {})[method or service] = n
+    return out
+
+def diff(after, before):
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
@@ -0,0 +1,250 @@
+"""Benchmark offline cho /booking, /telegram (callback) và /zalo (cả hội thoại đặt lịch).
+
+Google Sheets, Telegram và Zalo được thay bằng bản giả lập trong bench/fakes.py
+(có độ trễ và quota), nên chạy được không cần mạng / credentials:
+
+    python bench/run.py                         # sheet 10, 100, 1000, 10000 dòng
+    python bench/run.py --sizes 10,1000 --requests 100 --out bench/report.json
+
+Mỗi kích thước sheet chạy trong 1 process riêng (trạng thái module sạch). Kết quả ghi
+ra file JSON: throughput, p50/p99 và số lời gọi ra ngoài trên mỗi request.
+"""
+import argparse, json, os, platform, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+# {date} / {time}: mỗi khách 1 khung giờ riêng còn trống (xem slot_for)
+ZALO_SCRIPT = ['đặt lịch', '1', 'Nguyễn Văn Bench', '0901234567', '{date}', '{time}', '0', '1']
+# Giờ bắt đầu còn trống trong giờ làm việc mặc định (WORK_HOURS), 1 đơn / giờ
+SLOT_TIMES = ['08:00', '09:00', '10:00', '11:00', '12:00', '14:00', '15:00', '16:00']
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+def latency_ms(samples):
+    return {
+        'p50': round(percentile(samples, 0.50) * 1000, 3),
+        'p99': round(percentile(samples, 0.99) * 1000, 3),
+        'max': round(max(samples) * 1000, 3) if samples else 0.0,
+        'mean': round(sum(samples) / len(samples) * 1000, 3) if samples else 0.0,
+    }
+
+def seed_rows(n):
+    # Đơn cũ đã có trên sheet: rải trong 30 ngày tới, đủ các trạng thái
+    statuses = ['⏳ Chờ xác nhận', '✅ Đã xác nhận', '✅ Đã hoàn thành', '❌ Đã từ chối']
+    today = datetime.now()
+    created = (today - timedelta(days=1)).strftime('%H:%M %d/%m/%Y')
+    return [[f'OLD{i:05d}', f'Khách {i}', f'09{i:08d}', '', 'Cắt Tóc Nam - 100K',
+             (today + timedelta(days=i % 30)).strftime('%d/%m/%Y'), f'{9 + i % 10}:00', '',
+             statuses[i % 4], created] for i in range(n)]
+
+
+# ===== CHẠY TRONG PROCESS CON (1 KÍCH THƯỚC SHEET) =====
+class Env:
+    def __init__(self, args):
+        tmp = tempfile.mkdtemp(prefix='booking-bench-')
+        os.environ.update({
+            'DB_PATH': os.path.join(tmp, 'bench.db'),
+            'ARCHIVE_DIR': os.path.join(tmp, 'archive'),
+            'LOG_LEVEL': 'WARNING',
+            'STORAGE_BACKEND': args.backend,
+            'NOTIFY_DIGEST_WINDOW': str(args.digest_window),
+            'RENDER_EXTERNAL_URL': 'https://bench.invalid',
+        })
+        sys.path.insert(0, ROOT)
+        sys.path.insert(0, BENCH_DIR)
+        import fakes
+        import scheduler
+        scheduler.start = lambda: None  # không chạy keep-alive / reset hằng ngày trong benchmark
+        import http_client, sheets
+        self.fakes = fakes
+        self.api = fakes.FakeBotAPI(args.api_latency)
+        http_client._session.mount('https://', self.api)
+        http_client._session.mount('http://', self.api)
+        self.ws = fakes.FakeWorksheet(seed_rows(args.rows), args.sheets_latency, args.sheets_quota)
+        sheets._sheet = self.ws
+        import config, journal, main, notifier
+        self.config, self.journal, self.main, self.notifier = config, journal, main, notifier
+        self.client = main.app.test_client()
+
+    def calls(self):
+        return dict({f'sheets.{k}': v for k, v in self.ws.counter.snapshot().items()}, **self.api.counter.snapshot())
+
+    def drain(self, timeout=60):
+        # Chờ mọi việc nền (journal, thông báo, hàng đợi Zalo / Telegram) xong để đếm đủ lời gọi ra ngoài
+        self.main.zalo_executor.queue.join()
+        self.main.telegram_executor.queue.join()
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            self.journal.flush()
+            if (not self.journal.pending_count() and not self.notifier.pending_count()
+                    and self.notifier._queue.empty()):
+                return True
+            time.sleep(0.05)
+        return False
+
+    def measure(self, name, requests, send, concurrency, units=None):
+        before, throttled = self.calls(), self.ws.throttled
+        samples, errors = [], [0]
+        lock = threading.Lock()
+
+        def one(item):
+            started = time.perf_counter()
+            status = send(item)
+            took = time.perf_counter() - started
+            with lock:
+                samples.append(took)
+                if status >= 400:
+                    errors[0] += 1
+
+        started = time.perf_counter()
+        if callable(requests):
+            requests(one)
+        elif concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                list(pool.map(one, requests))
+        else:
+            for item in requests:
+                one(item)
+        drained = self.drain()
+        wall = time.perf_counter() - started
+        count = units or len(samples)
+        calls = self.fakes.diff(self.calls(), before)
+        by_service = self.fakes.group(calls)
+        return {
+            'scenario': name,
+            'requests': count,
+            'errors': errors[0],
+            'drained': drained,
+            'seconds': round(wall, 4),
+            'throughput_rps': round(count / wall, 2) if wall else 0.0,
+            'latency_ms': latency_ms(samples),
+            'external_calls': by_service,
+            'external_calls_per_request': {s: round(sum(m.values()) / count, 3) for s, m in by_service.items()} if count else {},
+            'sheets_throttled': self.ws.throttled - throttled,
+        }
+
+
+def slot_for(i, first_day):
+    # Khung giờ thứ i không trùng ai, từ ngày first_day (tính từ hôm nay) trở đi -> (ngày, giờ)
+    day = datetime.now() + timedelta(days=first_day + i // len(SLOT_TIMES))
+    return day, SLOT_TIMES[i % len(SLOT_TIMES)]
+
+def bench_booking(env, args):
+    # Bắt đầu sau 30 ngày của seed_rows để đơn nào cũng còn chỗ (không bị 409)
+    def send(i):
+        day, at = slot_for(i, 31)
+        return env.client.post('/booking', json={
+            'fullname': f'Bench {i}', 'phone': f'091{i:07d}', 'email': '', 'service': 'Cắt Tóc Nam - 100K',
+            'date': day.strftime('%Y-%m-%d'), 'time': at, 'note': '', 'source': 'Bench'}).status_code
+    return env.measure('booking', range(args.requests), send, args.concurrency)
+
+def bench_telegram(env, args):
+    # Xác nhận các đơn vừa tạo ở bước /booking bằng callback của nút bấm
+    import storage
+    from models import Status
+    ids = [b.id for b in storage.get_bookings_by_status(Status.PENDING) if not b.id.startswith('OLD')]
+    ids = (ids * (args.requests // max(len(ids), 1) + 1))[:args.requests] if ids else []
+    chat = env.config.TELEGRAM_CHAT_ID
+    def send(i):
+        bid = ids[i]
+        return env.client.post('/telegram', json={'update_id': 100000 + i, 'callback_query': {
+            'id': str(i), 'data': f'confirm_{bid}',
+            'message': {'chat': {'id': chat}, 'message_id': 1, 'text': f'🆔 {bid}',
+                        'reply_markup': {'inline_keyboard': [[{'text': '✅', 'callback_data': f'confirm_{bid}'}]]}}}}).status_code
+    return env.measure('telegram_callback', range(len(ids)), send, args.concurrency)
+
+def bench_zalo(env, args):
+    # Mỗi khách gửi lần lượt các bước; tin tiếp theo chỉ gửi khi bước trước đã xử lý xong
+    users = [f'bench-{i}' for i in range(max(1, args.requests // 2))]
+    secret = {'X-ZaloOA-Secret': env.config.ZALO_SECRET_TOKEN}
+    counter = [0]
+    def send(item):
+        user, text = item
+        counter[0] += 1
+        return env.client.post('/zalo', headers=secret, json={'result': {
+            'event_name': 'message.text.received',
+            'message': {'chat': {'id': user}, 'message_id': f'm{counter[0]}-{user}', 'text': text,
+                        'from': {'display_name': 'Khách'}}}}).status_code
+    def rounds(one):
+        for text in ZALO_SCRIPT:
+            for i, user in enumerate(users):
+                day, at = slot_for(i, 31 + args.requests // len(SLOT_TIMES) + 1)
+                one((user, text.format(date=day.strftime('%d/%m/%Y'), time=at)))
+            env.main.zalo_executor.queue.join()
+    result = env.measure('zalo_conversation', rounds, send, 1, units=len(users) * len(ZALO_SCRIPT))
+    result['conversations'] = len(users)
+    return result
+
+def child(args):
+    env = Env(args)
+    results = [bench_booking(env, args), bench_telegram(env, args), bench_zalo(env, args)]
+    for r in results:
+        r['rows'] = args.rows
+    with open(args.child_out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False)
+
+
+# ===== PROCESS CHA: CHẠY TỪNG KÍCH THƯỚC, GỘP BÁO CÁO =====
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+def main():
+    p = argparse.ArgumentParser(description='Offline benchmark cho booking-bot')
+    p.add_argument('--sizes', default='10,100,1000,10000', help='số dòng có sẵn trên sheet, cách nhau bởi dấu phẩy')
+    p.add_argument('--requests', type=int, default=50, help='số request mỗi kịch bản')
+    p.add_argument('--concurrency', type=int, default=1, help='số thread gửi song song (/booking, /telegram)')
+    p.add_argument('--backend', default='sheets', choices=['sheets', 'sqlite'])
+    p.add_argument('--sheets-latency', type=float, default=0.05, help='độ trễ mỗi lời gọi Sheets API (giây)')
+    p.add_argument('--sheets-quota', type=int, default=60, help='quota đọc / ghi mỗi phút (0 = không giới hạn)')
+    p.add_argument('--api-latency', type=float, default=0.02, help='độ trễ mỗi lời gọi Telegram / Zalo (giây)')
+    p.add_argument('--digest-window', type=float, default=0.2, help='NOTIFY_DIGEST_WINDOW khi chạy benchmark')
+    p.add_argument('--out', default=os.path.join(BENCH_DIR, 'report.json'))
+    p.add_argument('--rows', type=int, help=argparse.SUPPRESS)
+    p.add_argument('--child-out', help=argparse.SUPPRESS)
+    args = p.parse_args()
+
+    if args.child_out:
+        return child(args)
+
+    params = {k: v for k, v in vars(args).items() if k not in ('rows', 'child_out', 'out')}
+    results = []
+    for size in [int(s) for s in args.sizes.split(',') if s.strip()]:
+        fd, path = tempfile.mkstemp(suffix='.json')
+        os.close(fd)
+        cmd = [sys.executable, os.path.abspath(__file__), '--rows', str(size), '--child-out', path]
+        for k, v in params.items():
+            cmd += [f"--{k.replace('_', '-')}", str(v)]
+        print(f"rows={size} ...", file=sys.stderr, flush=True)
+        subprocess.run(cmd, check=True, stdout=subprocess.DEVNULL)
+        with open(path, encoding='utf-8') as f:
+            size_results = json.load(f)
+        os.remove(path)
+        for r in size_results:
+            print(f"  {r['scenario']:<18} {r['throughput_rps']:>8} req/s  p50 {r['latency_ms']['p50']:>8} ms"
+                  f"  p99 {r['latency_ms']['p99']:>8} ms  calls/req {r['external_calls_per_request']}", file=sys.stderr)
+        results.extend(size_results)
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'params': params,
+        'results': results,
+    }
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Report: {args.out}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
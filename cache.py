@@ -0,0 +1,104 @@
+import threading, time
+from collections import OrderedDict
+import config, db, logs
+
+# ===== CACHE KẾT QUẢ TRUY VẤN (ĐỌC XUYÊN, THEO TAG) =====
+# Mỗi kết quả gắn vài tag ('date:19/10/2026', 'status', ...). Ghi dữ liệu thì tăng version
+# của tag trong SQLite (mọi worker cùng thấy) và bỏ ngay các mục liên quan trong worker này.
+# - Còn hạn (CACHE_TTL) và version không đổi: trả luôn.
+# - Version không đổi, quá hạn nhưng chưa quá CACHE_STALE: trả bản cũ và làm mới ở nền.
+# - Version đổi (worker khác vừa ghi): làm mới nguồn rồi tải đồng bộ, không trả bản cũ.
+# - Còn lại: tải đồng bộ.
+# Kết quả được dùng chung giữa các request: không sửa trực tiếp.
+
+log = logs.get_logger('cache')
+
+db.schema('CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+
+stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0, 'revalidations': 0, 'errors': 0}
+
+class _Entry:
+    __slots__ = ('value', 'at', 'tags', 'versions')
+
+    def __init__(self, value, tags, versions):
+        self.value = value
+        self.at = time.time()
+        self.tags = tags
+        self.versions = versions
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_refreshing = set()
+
+def _versions(tags):
+    rows = dict(db.connect().execute(
+        f"SELECT tag, version FROM cache_tags WHERE tag IN ({', '.join('?' * len(tags))})", tags).fetchall())
+    return tuple(rows.get(t, 0) for t in tags)
+
+def _store(key, value, tags, versions):
+    with _lock:
+        _entries[key] = _Entry(value, tags, versions)
+        _entries.move_to_end(key)
+        while len(_entries) > config.CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+def _revalidate(key, tags, loader):
+    with _lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def run():
+        try:
+            versions = _versions(tags)
+            _store(key, loader(), tags, versions)
+            stats['revalidations'] += 1
+        except Exception as e:
+            stats['errors'] += 1
+            log.warning(f"Cache revalidate {key} error: {e}")
+        finally:
+            with _lock:
+                _refreshing.discard(key)
+
+    threading.Thread(target=run, daemon=True).start()
+
+def get(key, tags, loader, refresh=None):
+    # refresh(): chạy trước loader khi worker khác đã ghi (vd tải lại index sheet của worker này)
+    tags = list(tags)
+    versions = _versions(tags)
+    now = time.time()
+    with _lock:
+        entry = _entries.get(key)
+    if entry is not None:
+        age = now - entry.at
+        if entry.versions != versions:
+            if refresh is not None:
+                refresh()
+        elif age < config.CACHE_TTL:
+            stats['hits'] += 1
+            return entry.value
+        elif age < config.CACHE_STALE:
+            stats['stale'] += 1
+            _revalidate(key, tags, loader)
+            return entry.value
+    stats['misses'] += 1
+    value = loader()
+    _store(key, value, tags, versions)
+    return value
+
+def invalidate(tags):
+    tags = list(dict.fromkeys(tags))
+    with db.transaction() as conn:
+        conn.executemany('INSERT INTO cache_tags (tag, version) VALUES (?, 1) '
+                         'ON CONFLICT(tag) DO UPDATE SET version = version + 1', [(t,) for t in tags])
+    # Trong worker này dữ liệu đã mới: bỏ luôn để lần đọc sau tải lại đồng bộ
+    drop = set(tags)
+    with _lock:
+        for key in [k for k, e in _entries.items() if drop.intersection(e.tags)]:
+            del _entries[key]
+    stats['invalidations'] += 1
+
+def get_stats():
+    total = stats['hits'] + stats['misses'] + stats['stale']
+    return dict(stats, entries=len(_entries),
+                hit_ratio=round((stats['hits'] + stats['stale']) / total, 4) if total else 0.0)
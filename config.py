@@ -10,6 +10,81 @@ ZALO_SECRET_TOKEN = os.environ.get('ZALO_SECRET_TOKEN', 'ymd7w-W6kp-uL9QUrs')
 
 # Google Sheets
 SHEET_ID = os.environ.get('SHEET_ID', '1V0KtvRjKn1sNLXgHEHs3Q0a2mz1y_HP9-evKU2CUyiw')
+# Index trong bộ nhớ tự dựng lại sau bao nhiêu giây (bắt kịp thay đổi từ worker khác)
+SHEET_INDEX_MAX_AGE = int(os.environ.get('SHEET_INDEX_MAX_AGE', 60))
+
+# SQLite cục bộ dùng chung giữa các worker (bộ đếm mã đơn, ...)
+DB_PATH = os.environ.get('DB_PATH', 'booking.db')
+
+# Backend lưu trữ chính: 'sheets' (Google Sheets) hoặc 'sqlite' (SQLite + mirror lên sheet)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'sheets')
+
+# Journal ghi sau: chu kỳ đẩy lên sheet (giây) và số dòng tối đa mỗi lần
+JOURNAL_FLUSH_INTERVAL = float(os.environ.get('JOURNAL_FLUSH_INTERVAL', 1))
+JOURNAL_BATCH_SIZE = int(os.environ.get('JOURNAL_BATCH_SIZE', 50))
+
+# Hàng đợi thông báo Telegram: số worker, sức chứa, cửa sổ gộp đơn mới (giây), chu kỳ gửi lại
+NOTIFY_WORKERS = int(os.environ.get('NOTIFY_WORKERS', 2))
+NOTIFY_QUEUE_SIZE = int(os.environ.get('NOTIFY_QUEUE_SIZE', 200))
+NOTIFY_DIGEST_WINDOW = float(os.environ.get('NOTIFY_DIGEST_WINDOW', 3))
+NOTIFY_RETRY_INTERVAL = float(os.environ.get('NOTIFY_RETRY_INTERVAL', 15))
+
+# Phiên hội thoại Zalo hết hạn sau bao nhiêu giây không hoạt động
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 1800))
+
+# Webhook Zalo: số thread xử lý, sức chứa hàng đợi, số message_id nhớ để chống trùng
+ZALO_WORKERS = int(os.environ.get('ZALO_WORKERS', 4))
+ZALO_QUEUE_SIZE = int(os.environ.get('ZALO_QUEUE_SIZE', 100))
+ZALO_DEDUPE_SIZE = int(os.environ.get('ZALO_DEDUPE_SIZE', 5000))
+
+# Webhook Telegram: trả lời ngay, xử lý sau theo thứ tự từng chat; số thread, sức chứa hàng
+# đợi, số update_id gần nhất còn tra trùng
+TELEGRAM_WORKERS = int(os.environ.get('TELEGRAM_WORKERS', 4))
+TELEGRAM_QUEUE_SIZE = int(os.environ.get('TELEGRAM_QUEUE_SIZE', 200))
+TELEGRAM_DEDUPE_WINDOW = int(os.environ.get('TELEGRAM_DEDUPE_WINDOW', 1000))
+
+# Lịch trống: giờ làm việc (các khoảng cách nhau bởi dấu phẩy), độ dài 1 ô (phút),
+# số khách phục vụ cùng lúc trong 1 ô
+WORK_HOURS = os.environ.get('WORK_HOURS', '08:00-13:00,14:00-17:00')
+SLOT_MINUTES = int(os.environ.get('SLOT_MINUTES', 30))
+SLOT_CAPACITY = int(os.environ.get('SLOT_CAPACITY', 1))
+
+# Lưu trữ đơn của các ngày đã qua: tab trên cùng spreadsheet là bản lưu chính (ổ đĩa của
+# instance bị xóa mỗi lần deploy), thư mục gzip CSV theo ngày chỉ là bản sao để tìm nhanh
+ARCHIVE_SHEET = os.environ.get('ARCHIVE_SHEET', 'Archive')
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+
+# Log: mức log, tỉ lệ lấy mẫu payload thô (0-1) khi không ở DEBUG, sức chứa hàng đợi log
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_PAYLOAD_SAMPLE = float(os.environ.get('LOG_PAYLOAD_SAMPLE', 0.05))
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Metrics: chu kỳ mỗi worker ghi snapshot vào SQLite để /metrics gộp (giây)
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+
+# Quota Google Sheets API (theo user, mọi worker dùng chung): số lệnh đọc / ghi mỗi phút,
+# thời gian tối đa 1 lệnh chờ quota (giây), cửa sổ gom các lệnh ghi ô (giây)
+SHEETS_READS_PER_MINUTE = int(os.environ.get('SHEETS_READS_PER_MINUTE', 60))
+SHEETS_WRITES_PER_MINUTE = int(os.environ.get('SHEETS_WRITES_PER_MINUTE', 60))
+SHEETS_QUOTA_MAX_WAIT = float(os.environ.get('SHEETS_QUOTA_MAX_WAIT', 60))
+SHEETS_WRITE_COALESCE = float(os.environ.get('SHEETS_WRITE_COALESCE', 0.05))
+
+# Cache kết quả truy vấn cho lệnh admin: còn mới trong CACHE_TTL giây, quá hạn nhưng
+# chưa quá CACHE_STALE giây thì vẫn trả bản cũ và làm mới ở nền; số mục tối đa
+CACHE_TTL = float(os.environ.get('CACHE_TTL', 15))
+CACHE_STALE = float(os.environ.get('CACHE_STALE', 300))
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 256))
+
+# Chế độ server: 'sync' = Flask + gunicorn sync worker (main:app), 'async' = aiohttp
+# (async_main:app, 1 process nhận hàng trăm webhook cùng lúc, phần chặn chạy trong thread pool);
+# số thread chạy phần chặn (Sheets / SQLite / Telegram / Zalo) trong chế độ async
+SERVER_MODE = os.environ.get('SERVER_MODE', 'sync')
+ASYNC_BLOCKING_WORKERS = int(os.environ.get('ASYNC_BLOCKING_WORKERS', 16))
+
+# Chống gửi trùng POST /booking: giữ kết quả theo Idempotency-Key bao lâu, và theo dấu vân tay
+# nội dung (SĐT + ngày + giờ + dịch vụ) khi không có header (giây)
+IDEMPOTENCY_TTL = float(os.environ.get('IDEMPOTENCY_TTL', 86400))
+IDEMPOTENCY_FINGERPRINT_TTL = float(os.environ.get('IDEMPOTENCY_FINGERPRINT_TTL', 600))
 
 # Server
 PORT = int(os.environ.get('PORT', 10000))
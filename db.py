@@ -0,0 +1,93 @@
+import sqlite3, threading, time
+from contextlib import contextmanager
+import config
+
+# SQLite dùng chung giữa các gunicorn worker (WAL cho phép đọc song song)
+_local = threading.local()
+_schemas = []
+
+def schema(*statements):
+    # Module khác đăng ký bảng của mình, connect() sẽ tự tạo
+    _schemas.extend(statements)
+
+def connect():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(config.DB_PATH, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        _local.conn = conn
+        _local.applied = 0
+    while _local.applied < len(_schemas):
+        conn.execute(_schemas[_local.applied])
+        _local.applied += 1
+    return conn
+
+@contextmanager
+def transaction():
+    # BEGIN IMMEDIATE: giữ write lock ngay từ đầu để các worker không giẫm lên nhau
+    conn = connect()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        yield conn
+        conn.execute('COMMIT')
+    except:
+        conn.execute('ROLLBACK')
+        raise
+
+# ===== BỘ ĐẾM NGUYÊN TỬ =====
+schema('CREATE TABLE IF NOT EXISTS sequences (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+def current_sequence(name):
+    row = connect().execute('SELECT value FROM sequences WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+def next_sequence(name, floor=0):
+    with transaction() as conn:
+        row = conn.execute('SELECT value FROM sequences WHERE name = ?', (name,)).fetchone()
+        value = max(row[0] if row else 0, floor) + 1
+        conn.execute('INSERT OR REPLACE INTO sequences (name, value) VALUES (?, ?)', (name, value))
+    return value
+
+
+# ===== LEASE THEO DÒNG (journal, outbox) =====
+class Lease:
+    # Giữ 1 nhóm dòng trong lúc xử lý. Giá trị lease_until ghi vào dòng chính là "vé": gia hạn /
+    # xóa chỉ có tác dụng trên các dòng còn đúng giá trị đó, worker khác đã lấy lại thì biết ngay.
+    def __init__(self, table, key, seconds):
+        self.table, self.key, self.seconds = table, key, seconds
+        self.ids, self.until = [], 0.0
+
+    def _where(self, ids):
+        return f"{self.key} IN ({', '.join('?' * len(ids))}) AND lease_until = ?"
+
+    def claim(self, conn, ids):
+        self.ids, self.until = list(ids), time.time() + self.seconds
+        if self.ids:
+            conn.execute(f"UPDATE {self.table} SET lease_until = ? WHERE {self.key} IN ({', '.join('?' * len(self.ids))})",
+                         [self.until] + self.ids)
+
+    def renew(self):
+        # Gia hạn trước mỗi lần gọi ra ngoài; False nếu đã mất lease (dù chỉ 1 dòng)
+        if not self.ids:
+            return True
+        until = time.time() + self.seconds
+        with transaction() as conn:
+            n = conn.execute(f"UPDATE {self.table} SET lease_until = ? WHERE {self._where(self.ids)}",
+                             [until] + self.ids + [self.until]).rowcount
+        if n != len(self.ids):
+            return False
+        self.until = until
+        return True
+
+    def delete(self, conn, ids):
+        # Xóa các dòng đã xong; trả về số dòng thực sự còn trong lease
+        self.ids = [i for i in self.ids if i not in set(ids)]
+        return conn.execute(f"DELETE FROM {self.table} WHERE {self._where(ids)}", list(ids) + [self.until]).rowcount
+
+    def release(self, conn, ids, sets, args):
+        # Trả dòng về hàng đợi (sets vd 'attempts = attempts + 1, next_try = ?'), chỉ dòng còn trong lease
+        self.ids = [i for i in self.ids if i not in set(ids)]
+        return conn.execute(f"UPDATE {self.table} SET {sets}, lease_until = 0 WHERE {self._where(ids)}",
+                            list(args) + list(ids) + [self.until]).rowcount
@@ -0,0 +1,194 @@
+import contextvars, queue, threading, time
+from collections import OrderedDict, deque
+import db, logs
+
+log = logs.get_logger('dispatch')
+
+# ===== POOL WORKER CÓ GIỚI HẠN & CHỐNG TRÙNG =====
+
+class BoundedExecutor:
+    # Số thread cố định + hàng đợi có giới hạn; đầy thì submit() trả False để webhook trả lời ngay
+    def __init__(self, name, workers, queue_size):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stats = {'submitted': 0, 'rejected': 0, 'completed': 0, 'errors': 0,
+                      'wait_seconds_total': 0.0, 'run_seconds_total': 0.0, 'run_seconds_max': 0.0}
+        self._lock = threading.Lock()
+        self._started = False
+
+    def _start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        for i in range(self.workers):
+            threading.Thread(target=self._run, name=f'{self.name}-{i}', daemon=True).start()
+
+    def submit(self, fn, *args):
+        self._start()
+        try:
+            # Chạy trong context của người gửi để giữ request id cho log
+            self.queue.put_nowait((contextvars.copy_context(), fn, args, time.monotonic()))
+        except queue.Full:
+            self.stats['rejected'] += 1
+            return False
+        self.stats['submitted'] += 1
+        return True
+
+    def _execute(self, ctx, fn, args, queued_at):
+        started = time.monotonic()
+        try:
+            ctx.run(fn, *args)
+        except Exception as e:
+            self.stats['errors'] += 1
+            ctx.run(log.exception, f"{self.name} task error: {e}")
+        finally:
+            took = time.monotonic() - started
+            with self._lock:
+                self.stats['completed'] += 1
+                self.stats['wait_seconds_total'] += started - queued_at
+                self.stats['run_seconds_total'] += took
+                self.stats['run_seconds_max'] = max(self.stats['run_seconds_max'], took)
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self._execute(*item)
+            finally:
+                self.queue.task_done()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def get_stats(self):
+        done = self.stats['completed']
+        return dict(self.stats, queue_depth=self.depth(), queue_size=self.queue_size,
+                    avg_wait_seconds=round(self.stats['wait_seconds_total'] / done, 4) if done else 0.0,
+                    avg_run_seconds=round(self.stats['run_seconds_total'] / done, 4) if done else 0.0)
+
+
+class KeyedExecutor(BoundedExecutor):
+    # Như BoundedExecutor nhưng việc cùng khóa (vd cùng chat) chạy lần lượt đúng thứ tự gửi,
+    # khóa khác nhau chạy song song. self.queue chỉ chứa các khóa đang có việc chờ.
+    def __init__(self, name, workers, queue_size):
+        super().__init__(name, workers, queue_size)
+        self._pending = {}   # khóa -> deque việc; việc đầu deque là việc đang chạy / sắp chạy
+        self._size = 0
+
+    def submit(self, key, fn, *args):
+        self._start()
+        item = (contextvars.copy_context(), fn, args, time.monotonic())
+        with self._lock:
+            if self._size >= self.queue_size:
+                self.stats['rejected'] += 1
+                return False
+            self._size += 1
+            tasks = self._pending.get(key)
+            if tasks is None:
+                self._pending[key] = deque([item])
+                self.queue.put_nowait(key)
+            else:
+                tasks.append(item)
+        self.stats['submitted'] += 1
+        return True
+
+    def _run(self):
+        while True:
+            key = self.queue.get()
+            try:
+                with self._lock:
+                    item = self._pending[key][0]
+                self._execute(*item)
+            finally:
+                with self._lock:
+                    tasks = self._pending[key]
+                    tasks.popleft()
+                    self._size -= 1
+                    if tasks:
+                        self.queue.put_nowait(key)
+                    else:
+                        del self._pending[key]
+                self.queue.task_done()
+
+    def depth(self):
+        return self._size
+
+
+class RecentIds:
+    # LRU các id đã thấy gần đây (chống webhook gửi lại)
+    def __init__(self, size):
+        self.size = size
+        self._ids = OrderedDict()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    def add(self, key):
+        # True nếu id mới, False nếu đã thấy
+        with self._lock:
+            if key in self._ids:
+                self._ids.move_to_end(key)
+                self.duplicates += 1
+                return False
+            self._ids[key] = None
+            if len(self._ids) > self.size:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, key):
+        with self._lock:
+            self._ids.pop(key, None)
+
+
+# ===== CHỐNG TRÙNG THEO update_id (LƯU SQLITE, MỌI WORKER DÙNG CHUNG) =====
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS seen_updates (
+        source TEXT NOT NULL,
+        update_id INTEGER NOT NULL,
+        PRIMARY KEY (source, update_id)
+    )''',
+    '''CREATE TABLE IF NOT EXISTS update_marks (
+        source TEXT PRIMARY KEY,
+        high INTEGER NOT NULL,
+        updated REAL NOT NULL
+    )''',
+)
+
+# Telegram đánh update_id tăng dần; không có update nào quá 1 tuần thì dãy id có thể bắt đầu lại
+RESTART_AFTER = 7 * 86400
+
+class UpdateIds:
+    # Mốc cao nhất (high-water mark) + bảng id đã thấy trong cửa sổ `window` id gần nhất:
+    # id thấp hơn cả cửa sổ là bản gửi lại cũ, bỏ luôn không cần tra bảng
+    def __init__(self, source, window):
+        self.source = source
+        self.window = window
+        self.duplicates = 0
+
+    def add(self, update_id):
+        # True nếu update mới, False nếu đã nhận
+        now = time.time()
+        with db.transaction() as conn:
+            row = conn.execute('SELECT high, updated FROM update_marks WHERE source = ?', (self.source,)).fetchone()
+            high = row[0] if row else None
+            if high is not None and update_id <= high - self.window:
+                if now - row[1] < RESTART_AFTER:
+                    self.duplicates += 1
+                    return False
+                conn.execute('DELETE FROM seen_updates WHERE source = ?', (self.source,))
+                high = None
+            if not conn.execute('INSERT OR IGNORE INTO seen_updates (source, update_id) VALUES (?, ?)',
+                                (self.source, update_id)).rowcount:
+                self.duplicates += 1
+                return False
+            high = update_id if high is None else max(high, update_id)
+            conn.execute('INSERT OR REPLACE INTO update_marks (source, high, updated) VALUES (?, ?, ?)',
+                         (self.source, high, now))
+            conn.execute('DELETE FROM seen_updates WHERE source = ? AND update_id <= ?', (self.source, high - self.window))
+        return True
+
+    def discard(self, update_id):
+        # Không nhận được vào hàng đợi: để Telegram gửi lại
+        db.connect().execute('DELETE FROM seen_updates WHERE source = ? AND update_id = ?', (self.source, update_id))
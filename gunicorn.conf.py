@@ -0,0 +1,18 @@
+import os
+import config
+
+# ===== GUNICORN: CHỌN APP THEO SERVER_MODE =====
+# Procfile: gunicorn -c gunicorn.conf.py
+# - sync: Flask (main:app), mỗi worker xử lý 1 request một lúc
+# - async: aiohttp (async_main:app), 1 process nhận mọi webhook trên event loop, phần chặn
+#   chạy trong thread pool
+bind = f"0.0.0.0:{config.PORT}"
+timeout = 120
+
+if config.SERVER_MODE == 'async':
+    wsgi_app = 'async_main:app'
+    worker_class = 'aiohttp.GunicornWebWorker'
+    workers = int(os.environ.get('WEB_CONCURRENCY', 1))
+else:
+    wsgi_app = 'main:app'
+    workers = int(os.environ.get('WEB_CONCURRENCY', 2))
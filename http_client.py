@@ -0,0 +1,163 @@
+import random, threading, time
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
+
+# ===== HTTP CLIENT DÙNG CHUNG CHO TELEGRAM / ZALO =====
+# Giữ kết nối keep-alive, giới hạn tốc độ bằng token bucket theo bot và theo chat,
+# tự chờ khi bị 429 (retry_after) và thử lại có jitter khi lỗi mạng / 5xx.
+# Chế độ async (async_main.py) cũng gọi qua đây trong thread pool: chỉ 1 bộ giới hạn tốc độ.
+
+POOL_SIZE = 20
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+
+# (tốc độ token/giây, dung lượng burst)
+BOT_LIMITS = {'telegram': (30, 30), 'zalo': (10, 10)}
+CHAT_LIMITS = {'telegram': (1, 3), 'zalo': (1, 3)}
+MAX_CHAT_BUCKETS = 1000
+
+_session = requests.Session()
+_session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+_session.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE))
+
+stats = {'requests': 0, 'retries': 0, 'throttled_429': 0, 'errors': 0, 'waited_seconds': 0.0}
+
+metrics.histogram('external_request_seconds', 'Telegram / Zalo API call latency (per attempt)')
+metrics.counter('external_responses_total', 'Telegram / Zalo API responses by HTTP status')
+metrics.counter('external_throttled_total', 'Telegram / Zalo 429 responses')
+metrics.counter('external_errors_total', 'Telegram / Zalo connection errors and timeouts')
+metrics.histogram('external_throttle_wait_seconds', 'Time spent waiting on local rate limit buckets')
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        # Lấy 1 token nếu có; trả về số giây phải chờ (0 = lấy được)
+        with self.lock:
+            self._refill(time.monotonic())
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        # Chặn đến khi có token; trả về số giây đã chờ
+        waited = 0.0
+        while True:
+            wait = self.take()
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    def is_idle(self):
+        with self.lock:
+            self._refill(time.monotonic())
+            return self.tokens >= self.capacity
+
+    def pause(self, seconds):
+        # Server báo 429: rút cạn bucket để các request sau cùng chờ
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def _bucket(key, limits):
+    with _buckets_lock:
+        b = _buckets.get(key)
+        if b is None:
+            if len(_buckets) > MAX_CHAT_BUCKETS:
+                for k in [k for k, v in _buckets.items() if ':' in k and v.is_idle()]:
+                    del _buckets[k]
+            b = _buckets[key] = TokenBucket(*limits)
+        return b
+
+def _limiters(bot, chat_id):
+    out = []
+    if bot in BOT_LIMITS:
+        out.append(_bucket(bot, BOT_LIMITS[bot]))
+    if bot in CHAT_LIMITS and chat_id is not None:
+        out.append(_bucket(f'{bot}:{chat_id}', CHAT_LIMITS[bot]))
+    return out
+
+def _retry_after(resp):
+    try:
+        value = resp.json().get('parameters', {}).get('retry_after')
+        if value:
+            return float(value)
+    except Exception:
+        pass
+    try:
+        return float(resp.headers.get('Retry-After', 1))
+    except ValueError:
+        return 1.0
+
+def _backoff(attempt):
+    return BACKOFF_BASE * (2 ** attempt) * (0.5 + random.random())
+
+def _labels(bot, url):
+    # Nhãn metrics: tên method của bot API (sendMessage, ...), URL có token nên không dùng nguyên
+    return bot or 'other', url.rsplit('/', 1)[-1].split('?')[0] if bot else 'other'
+
+def request(method, url, bot=None, chat_id=None, timeout=10, **kwargs):
+    limiters = _limiters(bot, chat_id)
+    service, endpoint = _labels(bot, url)
+    last_exc = None
+    for attempt in range(MAX_RETRIES + 1):
+        waited = sum(b.acquire() for b in limiters)
+        stats['waited_seconds'] += waited
+        if limiters:
+            metrics.observe('external_throttle_wait_seconds', waited, service=service)
+        stats['requests'] += 1
+        started = time.perf_counter()
+        try:
+            resp = _session.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            last_exc = e
+            stats['errors'] += 1
+            metrics.inc('external_errors_total', service=service, endpoint=endpoint)
+            if attempt < MAX_RETRIES:
+                stats['retries'] += 1
+                time.sleep(_backoff(attempt))
+            continue
+        finally:
+            metrics.observe('external_request_seconds', time.perf_counter() - started, service=service, endpoint=endpoint)
+        metrics.inc('external_responses_total', service=service, endpoint=endpoint, code=resp.status_code)
+        if resp.status_code == 429:
+            metrics.inc('external_throttled_total', service=service)
+        if resp.status_code == 429 and attempt < MAX_RETRIES:
+            stats['throttled_429'] += 1
+            stats['retries'] += 1
+            # Tạm dừng bucket hẹp nhất (theo chat nếu có, không thì cả bot)
+            if limiters:
+                limiters[-1].pause(_retry_after(resp))
+            else:
+                time.sleep(_retry_after(resp))
+            continue
+        if resp.status_code >= 500 and attempt < MAX_RETRIES:
+            stats['retries'] += 1
+            time.sleep(_backoff(attempt))
+            continue
+        return resp
+    raise last_exc
+
+def post(url, bot=None, chat_id=None, timeout=10, **kwargs):
+    return request('POST', url, bot=bot, chat_id=chat_id, timeout=timeout, **kwargs)
+
+def get(url, bot=None, chat_id=None, timeout=10, **kwargs):
+    return request('GET', url, bot=bot, chat_id=chat_id, timeout=timeout, **kwargs)
+
+def get_stats():
+    return dict(stats, buckets=len(_buckets))
@@ -0,0 +1,117 @@
+import hashlib, json, threading, time
+import config, db, logs, metrics, search
+
+log = logs.get_logger('idempotency')
+
+# ===== CHỐNG GỬI TRÙNG POST /booking =====
+# Khóa = header Idempotency-Key; không có thì lấy dấu vân tay nội dung (SĐT + ngày + giờ + dịch vụ).
+# Lần đầu ghi 'pending' vào SQLite rồi mới xử lý. Bản trùng đến lúc đang xử lý thì chờ kết quả
+# (cùng worker chờ Event, worker khác hỏi lại SQLite); đến sau thì nhận lại đúng kết quả cũ,
+# không tạo đơn / gửi Telegram lần nữa. Kết quả lỗi 5xx không lưu để lần gửi lại được làm lại;
+# khóa dấu vân tay chỉ lưu kết quả 2xx (khách gửi lại sau khi bị báo kín giờ / sai dữ liệu phải
+# được kiểm tra lại, không nhận lại lỗi cũ suốt IDEMPOTENCY_FINGERPRINT_TTL).
+
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS idempotency (
+        key TEXT PRIMARY KEY,
+        state TEXT NOT NULL,
+        response TEXT,
+        status INTEGER,
+        expires REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_idempotency_expires ON idempotency (expires)',
+)
+
+# Request đầu chết giữa chừng: sau bấy nhiêu giây bản trùng được xử lý lại (= timeout gunicorn)
+PENDING_TIMEOUT = 120
+POLL_INTERVAL = 0.1
+
+stats = {'processed': 0, 'replayed': 0, 'collapsed': 0, 'timeouts': 0}
+_waiting = {}   # khóa -> Event của request đang xử lý trong worker này
+_lock = threading.Lock()
+
+metrics.counter('idempotent_duplicates_total', 'Duplicate POST /booking answered from the idempotency store')
+
+def fingerprint(data):
+    phone = str(data.get('phone', ''))
+    phone = search.normalize_phone(phone) or ''.join(c for c in phone if c.isdigit())
+    parts = [phone] + [str(data.get(k, '')).strip().lower() for k in ('date', 'time', 'service')]
+    return hashlib.sha256('\x00'.join(parts).encode()).hexdigest()[:32]
+
+def key_for(header, data):
+    # -> (khóa, ttl)
+    if header and header.strip():
+        return 'key:' + header.strip()[:200], config.IDEMPOTENCY_TTL
+    return 'fp:' + fingerprint(data), config.IDEMPOTENCY_FINGERPRINT_TTL
+
+def _claim(key):
+    # None = giành được quyền xử lý; còn lại trả về (state, response, status) đang có
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT state, response, status FROM idempotency WHERE key = ? AND expires >= ?',
+                           (key, now)).fetchone()
+        if row:
+            return row
+        conn.execute('DELETE FROM idempotency WHERE expires < ?', (now,))
+        conn.execute("INSERT INTO idempotency (key, state, expires) VALUES (?, 'pending', ?)", (key, now + PENDING_TIMEOUT))
+    return None
+
+def _stored(key, status):
+    # Kết quả nào được lưu để trả lại cho bản trùng
+    if key.startswith('fp:'):
+        return 200 <= status < 300
+    return status < 500
+
+def _finish(key, body, status, ttl):
+    with db.transaction() as conn:
+        if not _stored(key, status):
+            conn.execute('DELETE FROM idempotency WHERE key = ?', (key,))
+        else:
+            conn.execute("UPDATE idempotency SET state = 'done', response = ?, status = ?, expires = ? WHERE key = ?",
+                         (json.dumps(body, ensure_ascii=False), status, time.time() + ttl, key))
+
+def run(key, ttl, fn):
+    # fn() -> (body, status). Bản trùng nhận lại (body cũ + 'duplicate': True, status cũ)
+    deadline = time.time() + PENDING_TIMEOUT
+    waited = False
+    while True:
+        row = _claim(key)
+        if row is None:
+            break
+        state, response, status = row
+        if state == 'done':
+            stats['replayed'] += 1
+            metrics.inc('idempotent_duplicates_total', kind=key.split(':', 1)[0], state='collapsed' if waited else 'done')
+            log.info("Booking: duplicate submission replayed", key=key)
+            return dict(json.loads(response), duplicate=True), status
+        if not waited:
+            waited = True
+            stats['collapsed'] += 1
+        if time.time() >= deadline:
+            stats['timeouts'] += 1
+            return {'success': False, 'message': 'Đơn đang được xử lý, vui lòng đợi!'}, 409
+        with _lock:
+            event = _waiting.get(key)
+        if event is not None:
+            event.wait(max(0, deadline - time.time()))
+        else:
+            time.sleep(POLL_INTERVAL)
+
+    event = threading.Event()
+    with _lock:
+        _waiting[key] = event
+    try:
+        body, status = fn()
+        _finish(key, body, status, ttl)
+        stats['processed'] += 1
+        return body, status
+    except Exception:
+        _finish(key, None, 500, ttl)
+        raise
+    finally:
+        with _lock:
+            _waiting.pop(key, None)
+        event.set()
+
+def get_stats():
+    return dict(stats, waiting=len(_waiting))
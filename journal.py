@@ -0,0 +1,158 @@
+import json, random, threading, time
+import cache, config, db, logs, sheets
+
+log = logs.get_logger('journal')
+
+# ===== JOURNAL GHI SAU (WRITE-BEHIND) =====
+# /booking chỉ ghi vào SQLite rồi trả về; luồng nền đẩy dần lên Google Sheets.
+# Bản ghi chưa đẩy được sẽ được thử lại, kể cả sau khi restart.
+# Backend SQLite cũng dùng journal này để mirror mọi thay đổi lên sheet.
+db.schema('''CREATE TABLE IF NOT EXISTS journal (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT
+)''')
+
+# Lease gia hạn trước mỗi nhóm nên chỉ cần đủ cho 1 lần gọi Sheets: thời gian chờ quota tối đa
+# + thời gian của chính lệnh gọi (dư rộng), để worker khác không lấy lại giữa chừng mà ghi trùng
+LEASE_SECONDS = config.SHEETS_QUOTA_MAX_WAIT + 120
+MAX_BACKOFF = 300
+# Đổi trạng thái cho dòng chưa có trên sheet: thử lại bấy nhiêu lần (chờ lần append đang chạy) rồi bỏ
+MAX_MISSING_ATTEMPTS = 8
+
+_wake = threading.Event()
+_flush_lock = threading.Lock()
+_started = False
+stats = {'recorded': 0, 'flushed': 0, 'batches': 0, 'failures': 0, 'last_error': ''}
+
+def enqueue(kind, payload, conn=None):
+    # conn: ghi chung transaction với thao tác của caller (backend SQLite)
+    sql = 'INSERT INTO journal (kind, payload, created) VALUES (?, ?, ?)'
+    args = (kind, json.dumps(payload, ensure_ascii=False), time.time())
+    if conn is not None:
+        conn.execute(sql, args)
+    else:
+        with db.transaction() as c:
+            c.execute(sql, args)
+    stats['recorded'] += 1
+    _wake.set()
+
+def record_booking(data):
+    booking_id = sheets.generate_booking_id()
+    b = sheets.build_row(booking_id, data)
+    enqueue('append', b.to_row())
+    log.debug("Journal: booking recorded", booking_id=booking_id)
+    return booking_id, b.date
+
+def _claim(limit):
+    # Giữ lease để worker khác không đẩy trùng; lease hết hạn thì bản ghi được phát lại
+    now = time.time()
+    lease = db.Lease('journal', 'seq', LEASE_SECONDS)
+    with db.transaction() as conn:
+        rows = conn.execute(
+            'SELECT seq, kind, payload, attempts FROM journal WHERE next_try <= ? AND lease_until < ? ORDER BY seq LIMIT ?',
+            (now, now, limit)).fetchall()
+        lease.claim(conn, [r[0] for r in rows])
+    return rows, lease
+
+def _apply(kind, payloads):
+    # Trả về vị trí các payload cần ghi lại sau (chưa ghi được nhưng không phải lỗi)
+    # Backend sheets chỉ thấy đơn mới sau khi đẩy lên sheet: báo cache ở mọi worker (xem storage.py)
+    if kind == 'append':
+        sheets.append_rows(payloads)
+        cache.invalidate(['date:' + row[5] for row in payloads] + ['status', 'stats', 'find'])
+    elif kind == 'status':
+        return sheets.set_statuses(payloads)
+    elif kind == 'clear':
+        result = sheets.clear_old_data(write_archive=payloads[0].get('archive', True))
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        cache.invalidate(['all'])
+    else:
+        raise ValueError(f"Unknown journal kind: {kind}")
+    return []
+
+def flush(limit=None):
+    # Đẩy các bản ghi đến hạn; trả về số bản ghi đã ghi xuống sheet
+    limit = limit or config.JOURNAL_BATCH_SIZE
+    done = 0
+    with _flush_lock:
+        rows, lease = _claim(limit)
+        # Gom các bản ghi liên tiếp cùng loại thành 1 lần gọi API
+        groups = []
+        for seq, kind, payload, attempts in rows:
+            if groups and groups[-1][0] == kind:
+                groups[-1][1].append((seq, json.loads(payload), attempts))
+            else:
+                groups.append((kind, [(seq, json.loads(payload), attempts)]))
+        for i, (kind, items) in enumerate(groups):
+            seqs = [it[0] for it in items]
+            if not lease.renew():
+                log.warning(f"Journal: lease lost before {kind} x{len(items)}, leaving it to the other worker")
+                break
+            try:
+                missing = _apply(kind, [it[1] for it in items])
+            except Exception as e:
+                stats['failures'] += 1
+                stats['last_error'] = str(e)
+                log.exception(f"Journal flush error ({kind} x{len(items)}): {e}")
+                backoff = min(MAX_BACKOFF, 2 ** min(items[0][2], 10)) * (0.5 + random.random())
+                # Nhả lease cho cả nhóm lỗi và các nhóm sau để giữ đúng thứ tự
+                pending = [it[0] for _, its in groups[i:] for it in its]
+                with db.transaction() as conn:
+                    lease.release(conn, pending, 'attempts = attempts + 1, next_try = ?, last_error = ?',
+                                  [time.time() + backoff, str(e)[:500]])
+                break
+            waiting = [items[j] for j in missing]
+            dropped = [it for it in waiting if it[2] + 1 >= MAX_MISSING_ATTEMPTS]
+            waiting = [it for it in waiting if it not in dropped]
+            if dropped:
+                log.error(f"Journal: giving up on {kind} x{len(dropped)}, rows never reached the sheet",
+                          payloads=[it[1] for it in dropped])
+            finished = [it[0] for it in items if it not in waiting]
+            with db.transaction() as conn:
+                if lease.delete(conn, finished) != len(finished):
+                    log.warning(f"Journal: lease on {kind} x{len(items)} expired during the Sheets call")
+                if waiting:
+                    # Giữ thứ tự: các mục chờ và mọi nhóm sau đợi lần flush tới
+                    pending = [it[0] for it in waiting] + [it[0] for _, its in groups[i + 1:] for it in its]
+                    backoff = min(MAX_BACKOFF, 2 ** min(waiting[0][2], 10)) * (0.5 + random.random())
+                    lease.release(conn, pending, 'attempts = attempts + 1, next_try = ?, last_error = ?',
+                                  [time.time() + backoff, 'row not on sheet yet'])
+            done += len(finished)
+            stats['flushed'] += len(finished)
+            stats['batches'] += 1
+            if waiting:
+                break
+    return done
+
+def pending_count():
+    return db.connect().execute('SELECT COUNT(*) FROM journal').fetchone()[0]
+
+def get_stats():
+    return dict(stats, pending=pending_count())
+
+def _flush_loop():
+    while True:
+        _wake.wait(config.JOURNAL_FLUSH_INTERVAL)
+        _wake.clear()
+        try:
+            while flush() >= config.JOURNAL_BATCH_SIZE:
+                pass
+        except Exception as e:
+            log.exception(f"Journal loop error: {e}")
+            time.sleep(config.JOURNAL_FLUSH_INTERVAL)
+
+def start():
+    # Gọi khi worker khởi động: phát lại các bản ghi còn tồn từ lần chạy trước
+    global _started
+    if _started:
+        return
+    _started = True
+    threading.Thread(target=_flush_loop, daemon=True).start()
+    _wake.set()
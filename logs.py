@@ -0,0 +1,137 @@
+import atexit, contextvars, json, logging, logging.handlers, queue, random, re, sys, time, uuid
+import config
+
+# ===== LOG CÓ CẤU TRÚC =====
+# Thread xử lý request chỉ đẩy record vào hàng đợi; 1 thread QueueListener ghi ra
+# stdout dạng JSON mỗi dòng 1 record. Hàng đợi đầy thì bỏ record (không chặn request).
+# SĐT / email / tên khách được che trước khi ghi.
+
+request_id = contextvars.ContextVar('request_id', default='')
+stats = {'records': 0, 'dropped': 0, 'payloads_sampled_out': 0}
+
+# Khóa chứa dữ liệu cá nhân trong payload (form web, Telegram, Zalo)
+PII_KEYS = {'phone', 'email', 'fullname', 'name', 'display_name', 'first_name', 'last_name', 'username'}
+_PHONE_RE = re.compile(r'(?<!\d)(?:\+?84|0)\d{8,10}(?!\d)')
+_EMAIL_RE = re.compile(r'[\w.+-]+@[\w-]+\.[\w.-]+')
+
+
+def mask(key, value):
+    value = str(value)
+    if not value:
+        return value
+    if 'phone' in key:
+        return '*' * max(len(value) - 3, 0) + value[-3:]
+    if 'email' in key:
+        user, _, domain = value.partition('@')
+        return f"{user[:1]}***@{domain}"
+    return value[:1] + '***'
+
+def redact_text(text):
+    text = _EMAIL_RE.sub(lambda m: mask('email', m.group()), text)
+    return _PHONE_RE.sub(lambda m: mask('phone', m.group()), text)
+
+def redact(value, key=''):
+    if isinstance(value, dict):
+        return {k: redact(v, str(k).lower()) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [redact(v, key) for v in value]
+    if key in PII_KEYS and isinstance(value, (str, int)):
+        return mask(key, value)
+    if isinstance(value, str):
+        return redact_text(value)
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    # Chạy trong thread listener, không nằm trên đường đi của request
+    def format(self, record):
+        out = {
+            'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': redact_text(record.getMessage()),
+        }
+        if record.rid:
+            out['rid'] = record.rid
+        if record.fields:
+            out.update(redact(record.fields))
+        if record.exc_info:
+            out['exc'] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, default=str)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Gắn request id ở thread gọi; định dạng để dành cho listener
+        record.rid = request_id.get()
+        if not hasattr(record, 'fields'):
+            record.fields = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            stats['records'] += 1
+        except queue.Full:
+            stats['dropped'] += 1
+
+
+class Logger:
+    # Bọc logging.Logger: thêm trường có cấu trúc bằng keyword, vd log.info('Saved', booking_id=bid)
+    def __init__(self, name):
+        self._log = logging.getLogger(f'booking.{name}')
+
+    def _emit(self, level, msg, fields, exc_info=False):
+        if self._log.isEnabledFor(level):
+            self._log.log(level, msg, exc_info=exc_info, extra={'fields': fields or None})
+
+    def debug(self, msg, **fields):
+        self._emit(logging.DEBUG, msg, fields)
+
+    def info(self, msg, **fields):
+        self._emit(logging.INFO, msg, fields)
+
+    def warning(self, msg, **fields):
+        self._emit(logging.WARNING, msg, fields)
+
+    def error(self, msg, **fields):
+        self._emit(logging.ERROR, msg, fields)
+
+    def exception(self, msg, **fields):
+        self._emit(logging.ERROR, msg, fields, exc_info=True)
+
+    def payload(self, msg, data):
+        # Payload thô rất nhiều: đầy đủ khi LOG_LEVEL=DEBUG, còn lại chỉ lấy mẫu LOG_PAYLOAD_SAMPLE
+        if self._log.isEnabledFor(logging.DEBUG):
+            level = logging.DEBUG
+        elif random.random() < config.LOG_PAYLOAD_SAMPLE:
+            level = logging.INFO
+        else:
+            stats['payloads_sampled_out'] += 1
+            return
+        # Che ngay ở đây vì payload có thể bị sửa tiếp sau khi log
+        self._emit(level, msg, {'payload': redact(data)})
+
+
+def get_logger(name):
+    return Logger(name)
+
+def new_request_id(incoming=None):
+    rid = (incoming or uuid.uuid4().hex[:12])[:64]
+    request_id.set(rid)
+    return rid
+
+def get_stats():
+    return dict(stats, queue_depth=_queue.qsize(), level=logging.getLevelName(_root.level))
+
+
+_queue = queue.Queue(config.LOG_QUEUE_SIZE)
+_root = logging.getLogger('booking')
+_root.setLevel(config.LOG_LEVEL.upper())
+_root.propagate = False
+_root.addHandler(_QueueHandler(_queue))
+_stream = logging.StreamHandler(sys.stdout)
+_stream.setFormatter(JsonFormatter())
+_listener = logging.handlers.QueueListener(_queue, _stream)
+_listener.start()
+atexit.register(_listener.stop)
@@ -1,60 +1,102 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from datetime import datetime, timezone, timedelta
-import threading, time, os, json, traceback
+import os, json, time
 import requests as http_requests
-import config, sheets, telegram_bot
+import availability, cache, config, dispatch, http_client, idempotency, logs, metrics, notifier, quota, render, scheduler, sheets, storage, telegram_bot, journal, zalo_bot
 
 app = Flask(__name__)
 CORS(app)
 
 VN_TZ = timezone(timedelta(hours=7))
+log = logs.get_logger('main')
 
 def vn_now():
     return datetime.now(VN_TZ)
 
 # ===== KEEP-ALIVE & DAILY RESET =====
-def keep_alive_and_reset():
-    last_reset = ''
-    while True:
-        time.sleep(300)  # 5 phút
-        try:
-            url = config.RENDER_URL or 'https://booking-bot-df6q.onrender.com'
-            http_requests.get(url, timeout=10)
-            print(f"Keep-alive OK at {vn_now().strftime('%H:%M %d/%m/%Y')} VN")
-        except Exception as e:
-            print(f"Keep-alive error: {e}")
-
-        now = vn_now()
-        today_str = now.strftime('%Y-%m-%d')
-        hour = now.hour
-        minute = now.minute
-
-        # Reset lúc 00:00-00:10 giờ VN
-        if hour == 0 and minute < 10 and last_reset != today_str:
-            last_reset = today_str
-            print(f"=== DAILY RESET at {now.strftime('%H:%M %d/%m/%Y')} VN ===")
-            try:
-                send_daily_summary()
-            except Exception as e:
-                print(f"Summary error: {e}")
-            try:
-                result = sheets.clear_old_data()
-                print(f"Clear result: {result}")
-            except Exception as e:
-                print(f"Clear error: {e}")
-
-threading.Thread(target=keep_alive_and_reset, daemon=True).start()
-
-def send_daily_summary():
-    summary = sheets.get_daily_summary()
+# Chạy qua scheduler: chỉ 1 worker (leader) thực thi, trạng thái lưu trong SQLite
+@scheduler.job('keep_alive', '*/5 * * * *')
+def keep_alive():
+    url = config.RENDER_URL or 'https://booking-bot-df6q.onrender.com'
+    http_requests.get(url, timeout=10)
+    log.debug("Keep-alive OK")
+
+# Reset lúc 00:00 giờ VN: báo cáo ngày vừa qua rồi chuyển đơn cũ sang lưu trữ.
+# Chỉ đơn của ngày đã qua bị chuyển đi nên chạy bù muộn trong ngày vẫn an toàn: lỡ giờ thì
+# chạy bù trong vòng 20 giờ sau 00:00.
+@scheduler.job('daily_reset', '0 0 * * *', catchup=20 * 3600)
+def daily_reset():
+    log.info("Daily reset")
+    try:
+        send_daily_summary((vn_now() - timedelta(days=1)).strftime('%d/%m/%Y'))
+    except Exception as e:
+        log.exception(f"Summary error: {e}")
+    result = storage.clear_old_data()
+    log.info("Clear result", result=result)
+
+scheduler.start()
+journal.start()
+notifier.start()
+metrics.start()
+
+zalo_executor = dispatch.BoundedExecutor('zalo', config.ZALO_WORKERS, config.ZALO_QUEUE_SIZE)
+zalo_seen = dispatch.RecentIds(config.ZALO_DEDUPE_SIZE)
+telegram_executor = dispatch.KeyedExecutor('telegram', config.TELEGRAM_WORKERS, config.TELEGRAM_QUEUE_SIZE)
+telegram_seen = dispatch.UpdateIds('telegram', config.TELEGRAM_DEDUPE_WINDOW)
+
+# ===== METRICS =====
+metrics.histogram('http_request_seconds', 'Request latency by route')
+metrics.counter('http_requests_total', 'Requests by route and status')
+metrics.histogram('telegram_update_lag_seconds', 'Time from Telegram webhook ack to the start of processing')
+metrics.histogram('telegram_update_seconds', 'Telegram update processing time after the ack')
+metrics.collect('sheets_client_cache_total', 'counter', 'Sheets worksheet handle cache lookups',
+                lambda: [({'result': 'hit'}, sheets.cache_stats['hits']), ({'result': 'miss'}, sheets.cache_stats['misses'])])
+metrics.ratio('sheets_client_cache_hit_ratio', 'Sheets worksheet handle cache hit ratio', 'sheets_client_cache_total', 'result', 'hit')
+metrics.collect('sheets_index_rebuilds_total', 'counter', 'Full reloads of the in-memory sheet index',
+                lambda: sheets.index_stats['rebuilds'])
+metrics.collect('sheets_index_reused_rows_total', 'counter', 'Rows reused across sheet index rebuilds',
+                lambda: sheets.index_stats['reused_rows'])
+metrics.collect('query_cache_total', 'counter', 'Admin query result cache lookups',
+                lambda: [({'result': r}, cache.stats[k]) for r, k in (('hit', 'hits'), ('miss', 'misses'), ('stale', 'stale'))])
+metrics.ratio('query_cache_hit_ratio', 'Admin query cache fresh hit ratio', 'query_cache_total', 'result', 'hit')
+# Hàng đợi trong bộ nhớ thì cộng theo worker; hàng đợi trong SQLite dùng chung thì lấy max
+metrics.collect('queue_depth', 'gauge', 'Items waiting in in-process queues', lambda: [
+    ({'queue': 'notify'}, notifier._queue.qsize()),
+    ({'queue': 'zalo'}, zalo_executor.queue.qsize()),
+    ({'queue': 'telegram'}, telegram_executor.depth()),
+    ({'queue': 'logs'}, logs._queue.qsize()),
+])
+metrics.collect('shared_queue_depth', 'gauge', 'Rows waiting in SQLite-backed queues',
+                lambda: [({'queue': 'journal'}, journal.pending_count()), ({'queue': 'outbox'}, notifier.pending_count())],
+                agg='max')
+metrics.collect('sheets_quota_throttled_total', 'counter', 'Sheets 429/5xx responses that triggered backoff',
+                lambda: quota.stats['throttled'])
+metrics.collect('sheets_quota_wait_seconds_total', 'counter', 'Time spent waiting for Sheets quota budget',
+                lambda: quota.stats['wait_seconds'])
+metrics.collect('sheets_coalesced_total', 'counter', 'Sheets calls saved by read single-flight and write batching',
+                lambda: [({'kind': 'read'}, quota.stats['reads_coalesced']), ({'kind': 'write'}, quota.stats['writes_coalesced'])])
+metrics.collect('zalo_rejected_total', 'counter', 'Zalo updates shed because the executor was full',
+                lambda: zalo_executor.stats['rejected'])
+metrics.collect('zalo_duplicates_total', 'counter', 'Duplicate Zalo updates dropped', lambda: zalo_seen.duplicates)
+metrics.collect('telegram_rejected_total', 'counter', 'Telegram updates shed because the executor was full',
+                lambda: telegram_executor.stats['rejected'])
+metrics.collect('telegram_duplicates_total', 'counter', 'Redelivered Telegram updates dropped by update_id',
+                lambda: telegram_seen.duplicates)
+metrics.collect('slot_rejections_total', 'counter', 'Bookings refused because the slot was taken, closed, past or off the slot grid',
+                lambda: [({'reason': r}, availability.stats[k]) for r, k in availability.REASON_STATS.items()])
+metrics.collect('logs_dropped_total', 'counter', 'Log records dropped on a full log queue', lambda: logs.stats['dropped'])
+
+def send_daily_summary(date=None):
+    date = date or sheets.get_today_str()
+    summary = storage.get_daily_summary(date)
     if not summary:
-        telegram_bot.send_message(
+        telegram_bot.queue_message(
             config.TELEGRAM_CHAT_ID,
-            f"📋 <b>BÁO CÁO CUỐI NGÀY</b>\n📅 {sheets.get_today_str()}\n\nKhông có đơn hôm nay."
+            f"📋 <b>BÁO CÁO CUỐI NGÀY</b>\n📅 {date}\n\nKhông có đơn trong ngày."
         )
         return
-    msg = (
+    pages = render.Pages(
         f"📋 <b>BÁO CÁO CUỐI NGÀY</b>\n"
         f"📅 {summary['date']}\n"
         f"━━━━━━━━━━━━━━━\n\n"
@@ -62,145 +104,168 @@ def send_daily_summary():
         f"✅ Hoàn thành: <b>{summary['completed']}</b>\n"
         f"✔️ Xác nhận: <b>{summary['confirmed']}</b>\n"
         f"⏳ Chờ: <b>{summary['pending']}</b>\n"
-        f"❌ Từ chối: <b>{summary['rejected']}</b>\n\n"
+        f"❌ Từ chối: <b>{summary['rejected']}</b>\n\n",
+        f"\n━━━━━━━━━━━━━━━\n⏰ {vn_now().strftime('%H:%M %d/%m/%Y')} (VN)",
+        per_page=30
     )
     for c in summary['customers']:
-        msg += f"🆔 {c['id']} | {c['name']} | 🕐 {c['time']} | {c['status']}\n"
-    msg += f"\n━━━━━━━━━━━━━━━\n⏰ {vn_now().strftime('%H:%M %d/%m/%Y')} (VN)"
-    telegram_bot.send_message(config.TELEGRAM_CHAT_ID, msg)
-
-# ===== ROUTES =====
-@app.route('/')
-def home():
-    return jsonify({
-        'service': 'BarberShop Booking Bot',
-        'status': 'running',
-        'endpoints': ['/booking', '/telegram', '/zalo', '/setup', '/debug'],
-        'server_time_vn': vn_now().strftime('%H:%M:%S %d/%m/%Y'),
-        'timezone': 'UTC+7 (Vietnam/Hanoi)'
-    })
+        pages.add(f"🆔 {c.id} | {c.name} | 🕐 {c.time} | {c.status}\n")
+    telegram_bot.queue_pages(config.TELEGRAM_CHAT_ID, pages)
 
-@app.route('/booking', methods=['POST', 'OPTIONS'])
-def handle_booking():
-    if request.method == 'OPTIONS':
-        return jsonify({'ok': True})
+# ===== XỬ LÝ ROUTE =====
+# Dùng chung cho Flask (bên dưới) và async_main.py: nhận dữ liệu đã đọc từ request,
+# trả về (body, status). Các hàm này chặn (Sheets / SQLite / Telegram), bản async chạy
+# chúng trong thread pool.
+def parse_booking(raw, form):
     try:
-        print(f"=== BOOKING REQUEST at {vn_now().strftime('%H:%M:%S %d/%m/%Y')} VN ===")
-        print(f"Content-Type: {request.content_type}")
-        raw = request.get_data(as_text=True)
-        print(f"Raw data: {raw}")
-
+        data = json.loads(raw) if raw else None
+    except ValueError:
         data = None
-        try:
-            data = request.get_json(force=True)
-        except:
-            pass
-        if not data:
-            data = request.form.to_dict()
-        if not data:
-            try:
-                data = json.loads(raw)
-            except:
-                pass
-        if not data:
-            return jsonify({'success': False, 'message': 'Dữ liệu trống!'}), 400
-
-        print(f"Parsed data: {data}")
-
-        booking_id = 'ERR'
-        date_formatted = ''
-        try:
-            booking_id, date_formatted = sheets.add_booking(data)
-            print(f"Sheet OK: {booking_id}")
-        except Exception as e:
-            print(f"Sheet ERROR: {e}")
-            traceback.print_exc()
+    return data if data and isinstance(data, dict) else form
+
+def process_booking(data, idempotency_key=None):
+    if not data:
+        return {'success': False, 'message': 'Dữ liệu trống!'}, 400
+    # Bấm đúp / front end gửi lại: trả lại kết quả lần đầu thay vì tạo đơn mới
+    key, ttl = idempotency.key_for(idempotency_key, data)
+    return idempotency.run(key, ttl, lambda: _add_booking(data))
 
+def _add_booking(data):
+    log.payload("Booking data", data)
+
+    # Giữ khung giờ trước khi lưu: trùng giờ / ngoài giờ làm việc thì trả 409 kèm các giờ còn trống
+    hold, error = availability.reserve(data.get('date', ''), data.get('time', ''), data.get('service', ''))
+    if error:
+        return {
+            'success': False,
+            'message': error,
+            'free_slots': availability.free_slots(data.get('date', ''), data.get('service', ''))
+        }, 409
+
+    booking_id = 'ERR'
+    date_formatted = ''
+    try:
+        booking_id, date_formatted = storage.add_booking(data)
+    except Exception as e:
+        log.exception(f"Storage ERROR: {e}")
+        availability.cancel(hold)
+    else:
+        # Đơn đã lưu: từ đây lỗi gì cũng không được trả lại khung giờ
         try:
-            data['source'] = data.get('source', 'Website')
-            tg_result = telegram_bot.notify_new_booking(booking_id, data, date_formatted)
-            print(f"Telegram notify: {tg_result}")
+            availability.confirm(hold, booking_id)
         except Exception as e:
-            print(f"Telegram ERROR: {e}")
-            traceback.print_exc()
-
-        if booking_id == 'ERR':
-            return jsonify({'success': False, 'message': 'Lỗi lưu dữ liệu!'}), 500
+            log.exception(f"Availability ERROR: {e}")
 
-        return jsonify({
-            'success': True,
-            'message': 'Đặt lịch thành công!',
-            'booking_id': booking_id
-        })
+    try:
+        data['source'] = data.get('source', 'Website')
+        telegram_bot.notify_new_booking(booking_id, data, date_formatted)
     except Exception as e:
-        print(f"Booking error: {e}")
-        traceback.print_exc()
-        return jsonify({'success': False, 'message': 'Lỗi hệ thống!'}), 500
+        log.exception(f"Telegram ERROR: {e}")
 
-@app.route('/telegram', methods=['POST'])
-def handle_telegram():
+    if booking_id == 'ERR':
+        return {'success': False, 'message': 'Lỗi lưu dữ liệu!'}, 500
+
+    return {
+        'success': True,
+        'message': 'Đặt lịch thành công!',
+        'booking_id': booking_id
+    }, 200
+
+def _telegram_chat(update):
+    # Khóa hàng đợi: cùng chat thì xử lý lần lượt (bấm nút / lệnh đúng thứ tự)
+    message = update.get('callback_query', {}).get('message') or update.get('message') or {}
+    return message.get('chat', {}).get('id', update.get('update_id'))
+
+def process_telegram(update):
+    # Trả lời Telegram ngay; xử lý sau trong telegram_executor để Telegram không gửi lại
+    # vì chờ lâu. update_id đã nhận (kể cả ở worker khác) thì bỏ qua.
     try:
-        update = request.get_json()
-        print(f"Telegram update at {vn_now().strftime('%H:%M:%S')} VN: {json.dumps(update, ensure_ascii=False)[:500]}")
+        update_id = update.get('update_id')
+        if update_id is not None and not telegram_seen.add(update_id):
+            log.info(f"Telegram: duplicate update {update_id}")
+            return {'ok': True, 'duplicate': True}, 200
+        if not telegram_executor.submit(_telegram_chat(update), handle_telegram_update, update, time.time()):
+            if update_id is not None:
+                telegram_seen.discard(update_id)
+            log.warning(f"Telegram: queue full, shedding {update_id}")
+            return {'ok': False, 'error': 'busy'}, 503
+    except Exception as e:
+        log.exception(f"Telegram error: {e}")
+    return {'ok': True}, 200
+
+def handle_telegram_update(update, received):
+    metrics.observe('telegram_update_lag_seconds', time.time() - received)
+    with metrics.timer('telegram_update_seconds'):
+        log.payload("Telegram update", update)
         if 'callback_query' in update:
             telegram_bot.handle_callback(update['callback_query'])
         elif 'message' in update and 'text' in update['message']:
             telegram_bot.handle_command(update['message'])
-    except Exception as e:
-        print(f"Telegram error: {e}")
-        traceback.print_exc()
-    return jsonify({'ok': True})
 
-@app.route('/zalo', methods=['POST'])
-def handle_zalo():
+def process_zalo(data, secret):
     try:
-        import zalo_bot
-        data = request.get_json()
-        print(f"Zalo update at {vn_now().strftime('%H:%M:%S')} VN: {json.dumps(data, ensure_ascii=False)[:500]}")
-        secret = request.headers.get('X-ZaloOA-Secret', '')
         if secret != config.ZALO_SECRET_TOKEN:
-            print(f"Zalo: Invalid secret token")
-            return jsonify({'error': 'invalid token'}), 403
-        threading.Thread(target=zalo_bot.handle_zalo_update, args=(data,)).start()
+            log.warning("Zalo: invalid secret token")
+            return {'error': 'invalid token'}, 403
+        log.payload("Zalo update", data)
+        msg_id = zalo_bot.message_id(data)
+        if msg_id and not zalo_seen.add(msg_id):
+            log.info(f"Zalo: duplicate message {msg_id}")
+            return {'ok': True, 'duplicate': True}, 200
+        if not zalo_executor.submit(zalo_bot.handle_zalo_update, data):
+            # Quá tải: trả lời ngay, Zalo sẽ gửi lại sau
+            if msg_id:
+                zalo_seen.discard(msg_id)
+            log.warning(f"Zalo: queue full, shedding {msg_id}")
+            return {'ok': False, 'error': 'busy'}, 503
     except Exception as e:
-        print(f"Zalo error: {e}")
-    return jsonify({'ok': True})
+        log.exception(f"Zalo error: {e}")
+    return {'ok': True}, 200
 
-@app.route('/setup')
-def setup():
-    base = config.RENDER_URL or request.host_url.rstrip('/')
+def setup_info(host_url):
+    base = config.RENDER_URL or host_url.rstrip('/')
     results = {'base_url': base, 'server_time_vn': vn_now().strftime('%H:%M:%S %d/%m/%Y')}
     try:
         results['telegram_webhook'] = telegram_bot.set_webhook(base)
     except Exception as e:
         results['telegram_webhook'] = {'error': str(e)}
     try:
-        import zalo_bot
         results['zalo_webhook'] = zalo_bot.set_webhook(base)
     except Exception as e:
         results['zalo_webhook'] = {'error': str(e)}
-    return jsonify(results)
+    return results
 
-@app.route('/debug')
-def debug():
+def debug_info():
     now = vn_now()
     info = {
         'server': 'running',
+        'server_mode': config.SERVER_MODE,
         'server_time_utc': datetime.now(timezone.utc).strftime('%H:%M:%S %d/%m/%Y'),
         'server_time_vn': now.strftime('%H:%M:%S %d/%m/%Y'),
         'timezone': 'UTC+7 (Vietnam/Hanoi)',
-        'last_reset_date': now.strftime('%Y-%m-%d')
+        'scheduler': scheduler.get_state(),
+        'sheets_cache': sheets.get_cache_stats(),
+        'sheets_index': sheets.index_stats,
+        'sheets_quota': quota.get_stats(),
+        'journal': journal.get_stats(),
+        'storage': config.STORAGE_BACKEND,
+        'http_client': http_client.get_stats(),
+        'notifier': notifier.get_stats(),
+        'zalo_executor': dict(zalo_executor.get_stats(), duplicates=zalo_seen.duplicates),
+        'telegram_executor': dict(telegram_executor.get_stats(), duplicates=telegram_seen.duplicates),
+        'availability': availability.get_stats(),
+        'logs': logs.get_stats(),
+        'query_cache': cache.get_stats(),
+        'render': render.get_stats(),
+        'idempotency': idempotency.get_stats()
     }
     try:
-        import requests
-        tg = requests.get(f"https://api.telegram.org/bot{config.TELEGRAM_TOKEN}/getWebhookInfo", timeout=10).json()
-        info['telegram_webhook'] = tg
-    except:
+        info['telegram_webhook'] = http_client.get(f"https://api.telegram.org/bot{config.TELEGRAM_TOKEN}/getWebhookInfo", bot='telegram').json()
+    except Exception:
         pass
-    return jsonify(info)
+    return info
 
-@app.route('/test-booking')
-def test_booking():
+def test_booking_result():
     test_data = {
         'fullname': 'Test User',
         'phone': '0901234567',
@@ -212,30 +277,102 @@ def test_booking():
         'source': 'Test'
     }
     try:
-        booking_id, date_formatted = sheets.add_booking(test_data)
+        booking_id, date_formatted = storage.add_booking(test_data)
         tg = telegram_bot.notify_new_booking(booking_id, test_data, date_formatted)
-        return jsonify({
+        return {
             'success': True,
             'booking_id': booking_id,
             'date_formatted': date_formatted,
             'server_time_vn': vn_now().strftime('%H:%M:%S %d/%m/%Y'),
             'telegram': tg
-        })
+        }, 200
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        return {'success': False, 'error': str(e)}, 500
 
-@app.route('/reset')
-def reset():
+def reset_result():
     try:
         send_daily_summary()
-        result = sheets.clear_old_data()
-        return jsonify({
+        result = storage.clear_old_data()
+        return {
             'success': True,
             'cleared': result,
             'time_vn': vn_now().strftime('%H:%M:%S %d/%m/%Y')
-        })
+        }, 200
+    except Exception as e:
+        return {'success': False, 'error': str(e)}, 500
+
+def home_info():
+    return {
+        'service': 'BarberShop Booking Bot',
+        'status': 'running',
+        'endpoints': ['/booking', '/telegram', '/zalo', '/setup', '/debug', '/metrics'],
+        'server_time_vn': vn_now().strftime('%H:%M:%S %d/%m/%Y'),
+        'timezone': 'UTC+7 (Vietnam/Hanoi)'
+    }
+
+# ===== REQUEST ID & ĐO THỜI GIAN =====
+@app.before_request
+def assign_request_id():
+    g.started = time.perf_counter()
+    logs.new_request_id(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def echo_request_id(response):
+    response.headers['X-Request-ID'] = logs.request_id.get()
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe('http_request_seconds', time.perf_counter() - g.started, route=route)
+    metrics.inc('http_requests_total', route=route, status=response.status_code)
+    return response
+
+# ===== ROUTES =====
+@app.route('/')
+def home():
+    return jsonify(home_info())
+
+@app.route('/booking', methods=['POST', 'OPTIONS'])
+def handle_booking():
+    if request.method == 'OPTIONS':
+        return jsonify({'ok': True})
+    try:
+        raw = request.get_data(as_text=True)
+        log.debug("Booking request", content_type=request.content_type, size=len(raw))
+        body, status = process_booking(parse_booking(raw, request.form.to_dict()), request.headers.get('Idempotency-Key'))
+        return jsonify(body), status
     except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+        log.exception(f"Booking error: {e}")
+        return jsonify({'success': False, 'message': 'Lỗi hệ thống!'}), 500
+
+@app.route('/telegram', methods=['POST'])
+def handle_telegram():
+    body, status = process_telegram(request.get_json(silent=True) or {})
+    return jsonify(body), status
+
+@app.route('/zalo', methods=['POST'])
+def handle_zalo():
+    body, status = process_zalo(request.get_json(silent=True) or {}, request.headers.get('X-ZaloOA-Secret', ''))
+    return jsonify(body), status
+
+@app.route('/setup')
+def setup():
+    return jsonify(setup_info(request.host_url))
+
+@app.route('/debug')
+def debug():
+    return jsonify(debug_info())
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/test-booking')
+def test_booking():
+    body, status = test_booking_result()
+    return jsonify(body), status
+
+@app.route('/reset')
+def reset():
+    body, status = reset_result()
+    return jsonify(body), status
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=config.PORT, debug=True)
@@ -0,0 +1,185 @@
+import bisect, json, os, socket, threading, time
+from contextlib import contextmanager
+import config, db, logs
+
+# ===== METRICS (ĐỊNH DẠNG PROMETHEUS) =====
+# Mỗi worker đếm trong bộ nhớ rồi định kỳ ghi snapshot (giá trị cộng dồn) vào SQLite.
+# /metrics ở worker nào cũng gộp snapshot của mọi worker: counter và histogram cộng lại,
+# gauge lấy theo cách gộp đã khai báo ('sum' cho số riêng từng worker, 'max' cho số
+# dùng chung như hàng đợi SQLite). Gauge của worker đã chết bị bỏ qua.
+
+log = logs.get_logger('metrics')
+
+WORKER = f"{socket.gethostname()}:{os.getpid()}"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Snapshot không cập nhật quá lâu thì xóa (worker cũ sau nhiều lần restart)
+SNAPSHOT_RETENTION = 86400
+
+db.schema('''CREATE TABLE IF NOT EXISTS metric_snapshots (
+    worker TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL
+)''')
+
+_lock = threading.Lock()
+_meta = {}         # name -> (kiểu, mô tả, buckets)
+_counters = {}     # name -> {labels: value}
+_hists = {}        # name -> {labels: [đếm từng bucket..., đếm +Inf, tổng]}
+_collectors = []   # (name, kiểu, mô tả, fn, cách gộp)
+_ratios = []       # (name, mô tả, counter, nhãn, giá trị tử số)
+_flusher = None
+
+
+def _key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def counter(name, help):
+    _meta[name] = ('counter', help, None)
+    _counters.setdefault(name, {})
+
+def histogram(name, help, buckets=DEFAULT_BUCKETS):
+    _meta[name] = ('histogram', help, tuple(buckets))
+    _hists.setdefault(name, {})
+
+def collect(name, kind, help, fn, agg='sum'):
+    # fn() đọc số đã có sẵn ở module khác lúc ghi snapshot: trả về 1 số hoặc [(nhãn, số), ...]
+    _meta[name] = (kind, help, None)
+    _collectors.append((name, kind, fn, agg))
+
+def ratio(name, help, counter_name, label, value):
+    # Tỉ lệ tính trên counter đã gộp, vd tỉ lệ cache hit = result="hit" / tổng
+    _meta[name] = ('gauge', help, None)
+    _ratios.append((name, counter_name, label, value))
+
+def inc(name, value=1, **labels):
+    key = _key(labels)
+    with _lock:
+        series = _counters[name]
+        series[key] = series.get(key, 0) + value
+
+def observe(name, seconds, **labels):
+    key = _key(labels)
+    buckets = _meta[name][2]
+    with _lock:
+        h = _hists[name].get(key)
+        if h is None:
+            h = _hists[name][key] = [0] * (len(buckets) + 2)
+        h[bisect.bisect_left(buckets, seconds)] += 1
+        h[-1] += seconds
+
+@contextmanager
+def timer(name, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+# ===== SNAPSHOT GIỮA CÁC WORKER =====
+def _snapshot():
+    with _lock:
+        data = {
+            'counters': [[n, k, v] for n, s in _counters.items() for k, v in s.items()],
+            'hists': [[n, k, list(h)] for n, s in _hists.items() for k, h in s.items()],
+        }
+    gauges = []
+    for name, kind, fn, agg in _collectors:
+        try:
+            value = fn()
+        except Exception as e:
+            log.warning(f"Metrics collector {name} error: {e}")
+            continue
+        series = value if isinstance(value, list) else [({}, value)]
+        target = data['counters'] if kind == 'counter' else gauges
+        for labels, v in series:
+            target.append([name, _key(labels), v] + ([agg] if kind != 'counter' else []))
+    data['gauges'] = gauges
+    return data
+
+def flush():
+    data = json.dumps(_snapshot(), separators=(',', ':'))
+    now = time.time()
+    with db.transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO metric_snapshots (worker, data, updated) VALUES (?, ?, ?)',
+                     (WORKER, data, now))
+        conn.execute('DELETE FROM metric_snapshots WHERE updated < ?', (now - SNAPSHOT_RETENTION,))
+
+def _merge():
+    counters, hists, gauges = {}, {}, {}
+    live_after = time.time() - 3 * config.METRICS_FLUSH_INTERVAL
+    for data, updated in db.connect().execute('SELECT data, updated FROM metric_snapshots'):
+        data = json.loads(data)
+        for name, key, v in data['counters']:
+            k = (name, tuple(map(tuple, key)))
+            counters[k] = counters.get(k, 0) + v
+        for name, key, h in data['hists']:
+            k = (name, tuple(map(tuple, key)))
+            if k in hists and len(hists[k]) == len(h):
+                hists[k] = [a + b for a, b in zip(hists[k], h)]
+            else:
+                hists[k] = h
+        if updated < live_after:
+            continue
+        for name, key, v, agg in data['gauges']:
+            k = (name, tuple(map(tuple, key)))
+            gauges[k] = max(gauges[k], v) if k in gauges and agg == 'max' else gauges.get(k, 0) + v
+    for name, counter_name, label, value in _ratios:
+        total = hit = 0
+        for (n, key), v in counters.items():
+            if n == counter_name:
+                total += v
+                hit += v if (label, value) in key else 0
+        gauges[(name, ())] = round(hit / total, 4) if total else 0.0
+    return counters, hists, gauges
+
+
+# ===== ĐỊNH DẠNG PROMETHEUS TEXT =====
+def _labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    esc = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{k}="{esc(v)}"' for k, v in pairs) + '}'
+
+def render():
+    try:
+        flush()
+    except Exception as e:
+        log.warning(f"Metrics flush error: {e}")
+    counters, hists, gauges = _merge()
+    series = {}
+    for (name, key), v in counters.items():
+        series.setdefault(name, []).append(f"{name}{_labels(key)} {v}")
+    for (name, key), v in gauges.items():
+        series.setdefault(name, []).append(f"{name}{_labels(key)} {v}")
+    for (name, key), h in hists.items():
+        buckets = _meta.get(name, (None, None, DEFAULT_BUCKETS))[2] or DEFAULT_BUCKETS
+        lines, running = series.setdefault(name, []), 0
+        for le, n in zip(list(buckets) + ['+Inf'], h[:-1]):
+            running += n
+            lines.append(f"{name}_bucket{_labels(key, [('le', le)])} {running}")
+        lines.append(f"{name}_sum{_labels(key)} {round(h[-1], 6)}")
+        lines.append(f"{name}_count{_labels(key)} {running}")
+    out = []
+    for name in sorted(series):
+        kind, help, _ = _meta.get(name, ('untyped', '', None))
+        out.append(f"# HELP {name} {help}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(series[name])
+    return '\n'.join(out) + '\n'
+
+
+def _flush_loop():
+    while True:
+        time.sleep(config.METRICS_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            log.warning(f"Metrics flush error: {e}")
+
+def start():
+    global _flusher
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, daemon=True)
+    _flusher.start()
@@ -0,0 +1,98 @@
+import sys
+from enum import Enum
+
+# ===== KIỂU DỮ LIỆU BOOKING =====
+# Cột A-J trên sheet, theo đúng thứ tự
+COLUMNS = ('id', 'name', 'phone', 'email', 'service', 'date', 'time', 'note', 'status', 'created')
+HEADER = ('ID', 'Họ tên', 'SĐT', 'Email', 'Dịch vụ', 'Ngày', 'Giờ', 'Ghi chú', 'Trạng thái', 'Tạo lúc')
+# Các cột lặp lại nhiều giữa các dòng: intern để các dòng dùng chung 1 chuỗi
+_INTERNED = ('service', 'date', 'time', 'status')
+
+
+class Status(str, Enum):
+    PENDING = '⏳ Chờ xác nhận'
+    CONFIRMED = '✅ Đã xác nhận'
+    COMPLETED = '✅ Đã hoàn thành'
+    REJECTED = '❌ Đã từ chối'
+
+    @property
+    def category(self):
+        return self.name.lower()
+
+
+STATUS_CATEGORIES = ('pending', 'confirmed', 'completed', 'rejected', 'other')
+_status_cache = {}
+
+def parse_status(text):
+    # Chữ trạng thái trên sheet -> Status (None nếu lạ); nhớ kết quả vì chỉ có vài giá trị
+    status = _status_cache.get(text, False)
+    if status is False:
+        if 'Chờ' in text:
+            status = Status.PENDING
+        elif 'Đã xác nhận' in text:
+            status = Status.CONFIRMED
+        elif 'hoàn thành' in text.lower():
+            status = Status.COMPLETED
+        elif 'từ chối' in text.lower():
+            status = Status.REJECTED
+        else:
+            status = None
+        if len(_status_cache) < 1000:
+            _status_cache[text] = status
+    return status
+
+def category_of(text):
+    status = parse_status(text)
+    return status.category if status else 'other'
+
+
+class Booking:
+    __slots__ = COLUMNS + ('state',)
+
+    def __init__(self, *values):
+        values = (list(values) + [''] * 10)[:10]
+        for col, value in zip(COLUMNS, values):
+            value = '' if value is None else str(value)
+            setattr(self, col, sys.intern(value) if col in _INTERNED else value)
+        self.state = parse_status(self.status)
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(*row[:10])
+
+    def to_row(self):
+        return [getattr(self, c) for c in COLUMNS]
+
+    def key(self):
+        return tuple(self.to_row())
+
+    def copy(self):
+        return Booking(*self.to_row())
+
+    def set_status(self, text):
+        self.status = sys.intern(text)
+        self.state = parse_status(text)
+
+    @property
+    def category(self):
+        return self.state.category if self.state else 'other'
+
+    def __eq__(self, other):
+        return isinstance(other, Booking) and self.to_row() == other.to_row()
+
+    def __repr__(self):
+        return f"Booking({', '.join(repr(v) for v in self.to_row())})"
+
+
+def parse_rows(rows, pool=None, start=2):
+    # Dòng thô -> Booking; dòng không đổi so với lần dựng trước thì dùng lại object cũ.
+    # pool khóa theo (số dòng, nội dung): 2 dòng trùng hệt nhau vẫn là 2 object riêng
+    out = []
+    for n, row in enumerate(rows, start):
+        if not any(row):
+            out.append(None)
+            continue
+        key = (n, tuple((list(row) + [''] * 10)[:10]))
+        b = pool.get(key) if pool else None
+        out.append(b if b is not None else Booking.from_row(row))
+    return out
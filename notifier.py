@@ -0,0 +1,195 @@
+import json, queue, threading, time
+import config, db, logs
+
+log = logs.get_logger('notifier')
+
+# ===== HÀNG ĐỢI THÔNG BÁO TELEGRAM =====
+# Mọi thông báo được ghi vào bảng outbox trước (không mất khi restart), rồi một nhóm
+# worker nhỏ gửi đi. Nhiều đơn mới đến gần nhau được gộp thành 1 tin tổng hợp.
+db.schema('''CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_try REAL NOT NULL DEFAULT 0,
+    lease_until REAL NOT NULL DEFAULT 0
+)''')
+
+# Lease gia hạn trước mỗi lần gửi: đủ cho 1 lần gửi kể cả các lần thử lại trong http_client
+LEASE_SECONDS = 120
+MAX_BACKOFF = 300
+# Gửi lỗi quá bấy nhiêu lần thì bỏ tin (ghi log), không thử lại mãi
+MAX_ATTEMPTS = 20
+
+_queue = queue.Queue(maxsize=config.NOTIFY_QUEUE_SIZE)
+_digest = []
+_digest_lock = threading.Lock()
+_start_lock = threading.Lock()
+_started = False
+stats = {'enqueued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'digests': 0, 'merged': 0, 'overflow': 0}
+
+def notify(kind, chat_id, payload):
+    # kind: 'booking' (đơn mới, có thể gộp), 'message' (tin kèm bàn phím admin), 'inline'
+    start()
+    with db.transaction() as conn:
+        oid = conn.execute('INSERT INTO outbox (kind, chat_id, payload, created) VALUES (?, ?, ?, ?)',
+                           (kind, str(chat_id), json.dumps(payload, ensure_ascii=False), time.time())).lastrowid
+    stats['enqueued'] += 1
+    if kind == 'booking':
+        with _digest_lock:
+            _digest.append(oid)
+            if len(_digest) == 1:
+                threading.Timer(config.NOTIFY_DIGEST_WINDOW, _flush_digest).start()
+    else:
+        _put([oid])
+    return oid
+
+def _put(ids):
+    try:
+        _queue.put_nowait(ids)
+    except queue.Full:
+        # Hàng đợi đầy: để lại trong outbox, luồng quét sẽ gửi sau
+        stats['overflow'] += 1
+
+def _flush_digest():
+    with _digest_lock:
+        ids = list(_digest)
+        _digest.clear()
+    if ids:
+        _put(ids)
+
+def _claim(ids):
+    now = time.time()
+    marks = ','.join('?' * len(ids))
+    lease = db.Lease('outbox', 'id', LEASE_SECONDS)
+    with db.transaction() as conn:
+        rows = conn.execute(f'SELECT id, kind, chat_id, payload, attempts FROM outbox WHERE id IN ({marks}) AND lease_until < ? ORDER BY id',
+                            ids + [now]).fetchall()
+        lease.claim(conn, [r[0] for r in rows])
+    return rows, lease
+
+def _rejected(result):
+    # Telegram trả 4xx (trừ 429): tin sai, gửi lại cũng không được
+    code = result.get('error_code') or 0
+    return 400 <= code < 500 and code != 429
+
+def _deliver(rows, lease, sent, dropped):
+    # Ghi vào sent (id đã gửi) / dropped (id bỏ luôn vì Telegram từ chối); mất lease giữa chừng thì dừng
+    import telegram_bot
+    def send(chat_id, msg, keyboard=None):
+        if not lease.renew():
+            raise RuntimeError('outbox lease lost')
+        return telegram_bot.send_message_inline(chat_id, msg, keyboard)
+    bookings = [r for r in rows if r[1] == 'booking']
+    others = [r for r in rows if r[1] != 'booking']
+    if bookings:
+        # Gộp theo chat_id; 1 đơn thì gửi tin thường, nhiều đơn thì gửi tin tổng hợp (tách nhiều tin nếu dài)
+        by_chat = {}
+        for r in bookings:
+            by_chat.setdefault(r[2], []).append(r)
+        for chat_id, group in by_chat.items():
+            items = [json.loads(r[3]) for r in group]
+            if len(items) == 1:
+                msg, keyboard = telegram_bot.format_new_booking(**items[0])
+                chunks = [(msg, keyboard, 1)]
+            else:
+                chunks = telegram_bot.format_booking_digest(items)
+                stats['digests'] += len(chunks)
+                stats['merged'] += len(items)
+            start = 0
+            for msg, keyboard, n in chunks:
+                part, start = group[start:start + n], start + n
+                result = send(chat_id, msg, keyboard)
+                if result.get('ok'):
+                    sent.extend(r[0] for r in part)
+                elif _rejected(result):
+                    if n == 1:
+                        dropped.append(part[0][0])
+                    else:
+                        # Tin tổng hợp bị từ chối: gửi lẻ từng đơn để 1 đơn lỗi không kéo theo cả nhóm
+                        for r in part:
+                            one = send(chat_id, *telegram_bot.format_new_booking(**json.loads(r[3])))
+                            if one.get('ok'):
+                                sent.append(r[0])
+                            elif _rejected(one):
+                                dropped.append(r[0])
+    for oid, kind, chat_id, payload, _ in others:
+        p = json.loads(payload)
+        if not lease.renew():
+            raise RuntimeError('outbox lease lost')
+        if kind == 'inline':
+            result = telegram_bot.send_message_inline(chat_id, p['text'], p.get('reply_markup'))
+        else:
+            result = telegram_bot.send_message(chat_id, p['text'])
+        if result.get('ok'):
+            sent.append(oid)
+        elif _rejected(result):
+            dropped.append(oid)
+
+def _process(ids):
+    rows, lease = _claim(ids)
+    if not rows:
+        return
+    sent, dropped = [], []
+    try:
+        _deliver(rows, lease, sent, dropped)
+    except Exception as e:
+        log.exception(f"Notify error: {e}")
+    failed = [r for r in rows if r[0] not in sent and r[0] not in dropped]
+    dropped += [r[0] for r in failed if r[4] + 1 >= MAX_ATTEMPTS]
+    failed = [r for r in failed if r[0] not in dropped]
+    if dropped:
+        log.error(f"Notify: dropping {len(dropped)} messages", ids=dropped)
+    with db.transaction() as conn:
+        # Chỉ đụng tới dòng còn trong lease (worker khác đã lấy lại thì để nó xử lý)
+        done = sent + dropped
+        if done:
+            lease.delete(conn, done)
+        for r in failed:
+            backoff = min(MAX_BACKOFF, 5 * 2 ** min(r[4], 6))
+            lease.release(conn, [r[0]], 'attempts = attempts + 1, next_try = ?', [time.time() + backoff])
+    stats['sent'] += len(sent)
+    stats['failed'] += len(failed)
+    stats['dropped'] += len(dropped)
+
+def _worker():
+    while True:
+        ids = _queue.get()
+        try:
+            _process(ids)
+        except Exception as e:
+            log.exception(f"Notify worker error: {e}")
+        finally:
+            _queue.task_done()
+
+def _sweep():
+    # Gửi lại tin lỗi / tin còn tồn từ lần chạy trước / tin bị tràn hàng đợi
+    while True:
+        try:
+            now = time.time()
+            rows = db.connect().execute(
+                'SELECT id FROM outbox WHERE next_try <= ? AND lease_until < ? AND created < ? ORDER BY id LIMIT 50',
+                (now, now, now - config.NOTIFY_DIGEST_WINDOW - 5)).fetchall()
+            if rows:
+                _put([r[0] for r in rows])
+        except Exception as e:
+            log.exception(f"Notify sweep error: {e}")
+        time.sleep(config.NOTIFY_RETRY_INTERVAL)
+
+def pending_count():
+    return db.connect().execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+def get_stats():
+    return dict(stats, queue_depth=_queue.qsize(), outbox=pending_count())
+
+def start():
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    for _ in range(config.NOTIFY_WORKERS):
+        threading.Thread(target=_worker, daemon=True).start()
+    threading.Thread(target=_sweep, daemon=True).start()
@@ -0,0 +1,184 @@
+import random, threading, time
+from gspread.exceptions import APIError
+import config, db, logs
+
+# ===== ĐIỀU PHỐI QUOTA GOOGLE SHEETS =====
+# Quota Sheets API tính theo user cho cả project nên ngân sách đọc / ghi là token bucket
+# nằm trong SQLite, dùng chung mọi worker. Bị 429/503 thì giảm tốc độ một nửa và tạm
+# dừng có jitter, gọi thành công thì tăng dần trở lại. Trong 1 worker: các lần đọc giống
+# nhau đang chạy được gộp làm 1 (single-flight), các lần ghi ô được gom thành 1 batch_update.
+
+log = logs.get_logger('quota')
+
+RETRY_CODES = (429, 500, 503)
+MIN_RATE_FACTOR = 0.1   # tốc độ thấp nhất sau nhiều lần bị 429 (so với quota)
+RECOVER_FACTOR = 0.05   # mỗi lần gọi thành công tăng lại bấy nhiêu phần quota
+MAX_BACKOFF = 32
+
+db.schema('''CREATE TABLE IF NOT EXISTS quota_budget (
+    kind TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    rate REAL NOT NULL,
+    updated REAL NOT NULL,
+    paused_until REAL NOT NULL DEFAULT 0,
+    strikes INTEGER NOT NULL DEFAULT 0
+)''')
+
+stats = {'calls': 0, 'waits': 0, 'wait_seconds': 0.0, 'throttled': 0,
+         'reads_coalesced': 0, 'write_batches': 0, 'writes_coalesced': 0}
+
+def _limit(kind):
+    return config.SHEETS_READS_PER_MINUTE if kind == 'read' else config.SHEETS_WRITES_PER_MINUTE
+
+def _take(kind):
+    # Lấy 1 token; trả về số giây phải chờ (0 = lấy được)
+    limit = _limit(kind)
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT tokens, rate, updated, paused_until, strikes FROM quota_budget WHERE kind = ?',
+                           (kind,)).fetchone()
+        tokens, rate, updated, paused, strikes = row or (limit, limit, now, 0, 0)
+        tokens = min(limit, tokens + (now - updated) * rate / 60)
+        if now < paused:
+            wait = paused - now
+        elif tokens >= 1:
+            tokens -= 1
+            wait = 0
+        else:
+            wait = (1 - tokens) * 60 / rate
+        conn.execute('INSERT OR REPLACE INTO quota_budget (kind, tokens, rate, updated, paused_until, strikes) '
+                     'VALUES (?, ?, ?, ?, ?, ?)', (kind, tokens, rate, now, paused, strikes))
+    return wait
+
+def _throttled(kind, code):
+    limit = _limit(kind)
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT rate, paused_until, strikes FROM quota_budget WHERE kind = ?', (kind,)).fetchone()
+        rate, paused, strikes = row or (limit, 0, 0)
+        strikes += 1
+        rate = max(limit * MIN_RATE_FACTOR, rate / 2)
+        backoff = min(MAX_BACKOFF, 2 ** strikes) * (0.5 + random.random())
+        conn.execute('INSERT OR REPLACE INTO quota_budget (kind, tokens, rate, updated, paused_until, strikes) '
+                     'VALUES (?, 0, ?, ?, ?, ?)', (kind, rate, now, max(paused, now + backoff), strikes))
+    stats['throttled'] += 1
+    log.warning(f"Sheets {code} on {kind}: backing off {backoff:.1f}s, rate {rate:.0f}/min")
+
+def _succeeded(kind):
+    limit = _limit(kind)
+    # Không ghi gì khi đang ở tốc độ đầy đủ
+    db.connect().execute('UPDATE quota_budget SET strikes = 0, rate = MIN(?, rate + ?) '
+                         'WHERE kind = ? AND (strikes > 0 OR rate < ?)', (limit, limit * RECOVER_FACTOR, kind, limit))
+
+def run(kind, fn):
+    # kind: 'read' | 'write'. Chờ đến lượt theo ngân sách; 429/503 thì lùi lại và thử tiếp
+    # cho đến SHEETS_QUOTA_MAX_WAIT giây, quá hạn thì gọi thẳng và trả lỗi nếu vẫn bị chặn
+    deadline = time.time() + config.SHEETS_QUOTA_MAX_WAIT
+    while True:
+        wait = _take(kind)
+        if wait > 0:
+            stats['waits'] += 1
+            while wait > 0 and time.time() < deadline:
+                pause = min(wait, 1.0, max(deadline - time.time(), 0))
+                time.sleep(pause)
+                stats['wait_seconds'] += pause
+                wait = _take(kind)
+        stats['calls'] += 1
+        try:
+            result = fn()
+        except APIError as e:
+            if e.code not in RETRY_CODES:
+                raise
+            _throttled(kind, e.code)
+            if time.time() >= deadline:
+                raise
+            continue
+        _succeeded(kind)
+        return result
+
+
+# ===== SINGLE-FLIGHT CHO LỆNH ĐỌC =====
+# Đọc bắt đầu sau 1 lần ghi không dùng lại kết quả của lần đọc đã chạy từ trước đó.
+# Kết quả được dùng chung giữa các thread: không sửa trực tiếp.
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+_flights = {}
+_flights_lock = threading.Lock()
+_generation = 0
+
+def wrote():
+    global _generation
+    with _flights_lock:
+        _generation += 1
+
+def single_flight(key, fn):
+    with _flights_lock:
+        k = (key, _generation)
+        flight = _flights.get(k)
+        leader = flight is None
+        if leader:
+            flight = _flights[k] = _Flight()
+        else:
+            stats['reads_coalesced'] += 1
+    if not leader:
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+    try:
+        flight.result = fn()
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _flights_lock:
+            _flights.pop(k, None)
+        flight.event.set()
+
+
+# ===== GOM LỆNH GHI Ô =====
+class _Write:
+    def __init__(self, ranges):
+        self.ranges = ranges
+        self.event = threading.Event()
+        self.error = None
+
+_batch = []
+_batch_lock = threading.Lock()
+
+def write_ranges(ranges, send):
+    # ranges: [{'range': 'I5', 'values': [[...]]}, ...]; send(ranges) gửi 1 batch_update.
+    # Thread đầu tiên chờ SHEETS_WRITE_COALESCE giây rồi gửi luôn phần của các thread đến sau.
+    entry = _Write(ranges)
+    with _batch_lock:
+        _batch.append(entry)
+        leader = len(_batch) == 1
+    if leader:
+        time.sleep(config.SHEETS_WRITE_COALESCE)
+        with _batch_lock:
+            group = list(_batch)
+            _batch.clear()
+        error = None
+        try:
+            send([r for w in group for r in w.ranges])
+        except Exception as e:
+            error = e
+        stats['write_batches'] += 1
+        stats['writes_coalesced'] += len(group) - 1
+        for w in group:
+            w.error = error
+            w.event.set()
+    entry.event.wait()
+    if entry.error is not None:
+        raise entry.error
+
+def get_stats():
+    rows = db.connect().execute('SELECT kind, tokens, rate, paused_until, strikes FROM quota_budget').fetchall()
+    budget = {k: {'tokens': round(t, 2), 'rate_per_min': round(r, 1), 'paused_for': round(max(p - time.time(), 0), 1),
+                  'strikes': s} for k, t, r, p, s in rows}
+    return dict(stats, wait_seconds=round(stats['wait_seconds'], 3), budget=budget)
@@ -0,0 +1,138 @@
+import json, secrets, time
+import db, logs
+
+log = logs.get_logger('render')
+
+# ===== CHIA TRANG DANH SÁCH CHO TELEGRAM =====
+# Tin Telegram tối đa 4096 ký tự: danh sách dài được dựng thành nhiều trang (giới hạn cả
+# số ký tự lẫn số đơn mỗi trang). Có hơn 1 trang thì các trang lưu vào SQLite theo 1 mã
+# cursor (worker nào nhận lần bấm cũng đọc được), tin gửi đi là trang 1 kèm nút ◀ / ▶;
+# mỗi lần bấm chỉ đọc đúng 1 trang rồi sửa tin tại chỗ.
+
+MAX_CHARS = 4096
+PAGE_ITEMS = 10
+# Chừa chỗ cho dòng "Trang x/y" và các dòng "✅ DUC01 ĐÃ XÁC NHẬN" nối thêm khi bấm nút
+RESERVED_CHARS = 512
+PAGE_TTL = 2 * 86400
+
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS list_pages (
+        cursor TEXT NOT NULL,
+        page INTEGER NOT NULL,
+        pages INTEGER NOT NULL,
+        text TEXT NOT NULL,
+        buttons TEXT NOT NULL,
+        expires REAL NOT NULL,
+        PRIMARY KEY (cursor, page)
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_list_pages_expires ON list_pages (expires)',
+)
+
+stats = {'lists': 0, 'paged_lists': 0, 'pages_stored': 0, 'page_views': 0, 'expired_views': 0}
+
+def size(text):
+    # Telegram đếm độ dài theo UTF-16 (emoji = 2)
+    return len(text.encode('utf-16-le')) // 2
+
+def truncate(text, limit):
+    if size(text) <= limit:
+        return text
+    out, used = [], 0
+    for ch in text:
+        used += size(ch)
+        if used > limit - 1:
+            break
+        out.append(ch)
+    return ''.join(out) + '…'
+
+
+class Pages:
+    # Dựng trang từ các khối chữ (mỗi đơn 1 khối, kèm hàng nút riêng nếu có).
+    # actions: các hàng nút lặp lại trên mọi trang (vd Đồng ý / Hủy)
+    def __init__(self, header, footer='', actions=None, per_page=PAGE_ITEMS):
+        self.header = header
+        self.footer = footer
+        self.actions = actions or []
+        self.per_page = per_page
+        self.limit = MAX_CHARS - RESERVED_CHARS - size(header) - size(footer)
+        self.pages = []
+        self._blocks, self._buttons, self._size = [], [], 0
+
+    def add(self, block, buttons=None):
+        block = truncate(block, self.limit)
+        n = size(block)
+        if self._blocks and (len(self._blocks) >= self.per_page or self._size + n > self.limit):
+            self._close()
+        self._blocks.append(block)
+        self._size += n
+        if buttons:
+            self._buttons.append(buttons)
+        return self
+
+    def _close(self):
+        self.pages.append((self._blocks, self._buttons))
+        self._blocks, self._buttons, self._size = [], [], 0
+
+    def render(self):
+        # -> [(text, [hàng nút của đơn])]
+        if self._blocks or not self.pages:
+            self._close()
+        total = len(self.pages)
+        out = []
+        for i, (blocks, buttons) in enumerate(self.pages):
+            parts = [self.header, *blocks]
+            if total > 1:
+                parts.append(f"📄 Trang {i + 1}/{total}\n")
+            parts.append(self.footer)
+            out.append((''.join(parts).rstrip(), buttons + self.actions))
+        return out
+
+
+def _keyboard(buttons, cursor=None, page=0, total=1):
+    rows = list(buttons)
+    if total > 1:
+        nav = []
+        if page > 0:
+            nav.append({'text': '◀', 'callback_data': f'page:{cursor}:{page - 1}'})
+        nav.append({'text': f'{page + 1}/{total}', 'callback_data': f'page:{cursor}:{page}'})
+        if page < total - 1:
+            nav.append({'text': '▶', 'callback_data': f'page:{cursor}:{page + 1}'})
+        rows.append(nav)
+    return {'inline_keyboard': rows} if rows else None
+
+def first_page(pages):
+    # Pages -> (text, keyboard hoặc None) của trang 1; lưu các trang nếu có hơn 1
+    rendered = pages.render()
+    stats['lists'] += 1
+    text, buttons = rendered[0]
+    if len(rendered) == 1:
+        return text, _keyboard(buttons)
+    cursor = secrets.token_hex(6)
+    now = time.time()
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM list_pages WHERE expires < ?', (now,))
+        conn.executemany('INSERT INTO list_pages (cursor, page, pages, text, buttons, expires) VALUES (?, ?, ?, ?, ?, ?)',
+                         [(cursor, i, len(rendered), t, json.dumps(b, ensure_ascii=False), now + PAGE_TTL)
+                          for i, (t, b) in enumerate(rendered)])
+    stats['paged_lists'] += 1
+    stats['pages_stored'] += len(rendered)
+    return text, _keyboard(buttons, cursor, 0, len(rendered))
+
+def get_page(callback_data):
+    # 'page:<cursor>:<n>' -> (text, keyboard); None nếu đã hết hạn / không có
+    try:
+        _, cursor, page = callback_data.split(':')
+        page = int(page)
+    except ValueError:
+        return None
+    row = db.connect().execute('SELECT pages, text, buttons FROM list_pages WHERE cursor = ? AND page = ? AND expires >= ?',
+                               (cursor, page, time.time())).fetchone()
+    if row is None:
+        stats['expired_views'] += 1
+        return None
+    stats['page_views'] += 1
+    total, text, buttons = row
+    return text, _keyboard(json.loads(buttons), cursor, page, total)
+
+def get_stats():
+    return dict(stats)
@@ -0,0 +1,153 @@
+import os, socket, threading, time
+from datetime import datetime, timezone, timedelta
+import db, logs
+
+log = logs.get_logger('scheduler')
+
+# ===== LẬP LỊCH CÔNG VIỆC (CHỈ 1 WORKER CHẠY) =====
+# Mỗi worker đều chạy vòng lặp, nhưng chỉ worker giữ lease 'scheduler' trong SQLite
+# mới thực thi job. Lần chạy gần nhất được lưu lại để restart không chạy trùng,
+# và job bị lỡ (worker chết đúng giờ) sẽ được chạy bù nếu chưa trễ quá `catchup` giây.
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS leases (
+        name TEXT PRIMARY KEY,
+        holder TEXT NOT NULL,
+        expires REAL NOT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS job_runs (
+        name TEXT PRIMARY KEY,
+        last_run REAL NOT NULL,
+        last_status TEXT NOT NULL DEFAULT '',
+        updated REAL NOT NULL DEFAULT 0
+    )''',
+)
+
+TICK_SECONDS = 30
+LEASE_SECONDS = 300
+HOLDER = f"{socket.gethostname()}:{os.getpid()}"
+VN_TZ = timezone(timedelta(hours=7))
+
+_jobs = {}
+_started = False
+_start_lock = threading.Lock()
+
+# ===== CRON: "phút giờ ngày tháng thứ" =====
+_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+def _parse_field(field, lo, hi):
+    values = set()
+    for part in field.split(','):
+        step = 1
+        if '/' in part:
+            part, step = part.split('/')
+            step = int(step)
+        if part == '*':
+            a, b = lo, hi
+        elif '-' in part:
+            a, b = map(int, part.split('-'))
+        else:
+            a = b = int(part)
+        values.update(range(a, b + 1, step))
+    return values
+
+def parse_cron(expr):
+    fields = expr.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron cần 5 trường: {expr}")
+    return [_parse_field(f, lo, hi) for f, (lo, hi) in zip(fields, _RANGES)]
+
+def _matches(spec, dt):
+    # Thứ theo cron: 0 = Chủ nhật
+    return (dt.minute in spec[0] and dt.hour in spec[1] and dt.day in spec[2]
+            and dt.month in spec[3] and (dt.weekday() + 1) % 7 in spec[4])
+
+def last_due(spec, now, lookback_minutes=2 * 24 * 60):
+    # Mốc lịch gần nhất <= now (None nếu không có trong khoảng lookback)
+    dt = now.replace(second=0, microsecond=0)
+    for _ in range(lookback_minutes):
+        if _matches(spec, dt):
+            return dt
+        dt -= timedelta(minutes=1)
+    return None
+
+def job(name, cron, catchup=TICK_SECONDS * 2):
+    def register(fn):
+        _jobs[name] = {'fn': fn, 'cron': cron, 'spec': parse_cron(cron), 'catchup': catchup}
+        return fn
+    return register
+
+# ===== LEADER =====
+def _acquire_lease():
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute("SELECT holder, expires FROM leases WHERE name = 'scheduler'").fetchone()
+        if row and row[0] != HOLDER and row[1] > now:
+            return False
+        conn.execute("INSERT OR REPLACE INTO leases (name, holder, expires) VALUES ('scheduler', ?, ?)",
+                     (HOLDER, now + LEASE_SECONDS))
+    return True
+
+def is_leader():
+    row = db.connect().execute("SELECT holder, expires FROM leases WHERE name = 'scheduler'").fetchone()
+    return bool(row and row[0] == HOLDER and row[1] > time.time())
+
+# ===== TRẠNG THÁI JOB =====
+def _last_run(name):
+    row = db.connect().execute('SELECT last_run FROM job_runs WHERE name = ?', (name,)).fetchone()
+    return row[0] if row else None
+
+def _record(name, last_run, status):
+    with db.transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO job_runs (name, last_run, last_status, updated) VALUES (?, ?, ?, ?)',
+                     (name, last_run, status, time.time()))
+
+def get_state():
+    rows = db.connect().execute('SELECT name, last_run, last_status FROM job_runs').fetchall()
+    state = {name: {'last_run': datetime.fromtimestamp(ts, VN_TZ).strftime('%H:%M:%S %d/%m/%Y'), 'status': st}
+             for name, ts, st in rows}
+    return {'leader': is_leader(), 'holder': HOLDER, 'jobs': state}
+
+def run_pending(now=None):
+    now = now or datetime.now(VN_TZ)
+    for name, j in _jobs.items():
+        due = last_due(j['spec'], now)
+        if due is None:
+            continue
+        last = _last_run(name)
+        if last is None:
+            # Lần đầu thấy job: chỉ ghi mốc, không chạy bù lịch cũ
+            _record(name, due.timestamp(), 'init')
+            continue
+        if last >= due.timestamp():
+            continue
+        if (now - due).total_seconds() > j['catchup']:
+            log.warning(f"Scheduler: skip {name} (missed {due.strftime('%H:%M %d/%m/%Y')})")
+            _record(name, due.timestamp(), 'skipped')
+            continue
+        # Ghi trước khi chạy: job lỗi giữa chừng không bị chạy lại lần nữa
+        _record(name, due.timestamp(), 'running')
+        log.info(f"Scheduler: run {name} (due {due.strftime('%H:%M %d/%m/%Y')})")
+        try:
+            j['fn']()
+            _record(name, due.timestamp(), 'ok')
+        except Exception as e:
+            log.exception(f"Scheduler: {name} error: {e}")
+            _record(name, due.timestamp(), f'error: {e}'[:200])
+        _acquire_lease()
+
+def _loop():
+    while True:
+        try:
+            if _acquire_lease():
+                run_pending()
+        except Exception as e:
+            log.exception(f"Scheduler loop error: {e}")
+        time.sleep(TICK_SECONDS)
+
+def start():
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_loop, daemon=True).start()
@@ -0,0 +1,205 @@
+import re, threading, unicodedata
+from functools import lru_cache
+
+# ===== TÌM KIẾM ĐƠN (SĐT CHUẨN HÓA, TÊN BỎ DẤU) =====
+# SĐT đưa về E.164 nên '0901 234 567', '+84 90-123-4567' và '84901234567' là một số.
+# Tên / email bỏ dấu tiếng Việt ('Nguyễn' -> 'nguyen') rồi tách từ; mỗi từ ghi vào bảng
+# tiền tố (tiền tố -> khóa) nên gõ 'nguy' hay 'nguyen van' đều tra thẳng ra đơn.
+# SĐT tra theo tiền tố và theo đuôi (vd 4 số cuối). Index sửa từng đơn khi thêm / xóa,
+# kết quả xếp theo độ khớp rồi đến đơn mới hơn. Không ra gì thì mới quét chuỗi con.
+
+COUNTRY_CODE = '84'
+MIN_PHONE_PART = 3   # số chữ số tối thiểu để tra tiền tố / đuôi SĐT
+LIMIT = 10
+
+_SEP = re.compile(r'[^0-9a-z]+')
+_PHONE_QUERY = re.compile(r'^[+\d][\d\s.()-]*$')
+
+
+def fold(text):
+    # Thường hóa + bỏ dấu: 'Đỗ Thị Ánh' -> 'do thi anh'
+    text = unicodedata.normalize('NFD', text.lower().replace('đ', 'd'))
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+def tokens(text):
+    return [t for t in _SEP.split(fold(text)) if t]
+
+def _national_digits(raw, digits):
+    # Bỏ mã nước / số 0 đầu: phần còn lại sau '+84'
+    if raw.startswith('+') or digits.startswith('00'):
+        digits = digits.lstrip('0')
+        return digits[len(COUNTRY_CODE):] if digits.startswith(COUNTRY_CODE) else None
+    if digits.startswith('0'):
+        return digits[1:]
+    if digits.startswith(COUNTRY_CODE) and len(digits) >= 11:
+        return digits[len(COUNTRY_CODE):]
+    return digits if len(digits) == 9 else None
+
+def normalize_phone(text):
+    # -> '+84901234567'; không giống SĐT thì trả ''
+    raw = text.strip()
+    digits = re.sub(r'\D', '', raw)
+    if raw.startswith('+') and not digits.startswith(COUNTRY_CODE):
+        return '+' + digits if 8 <= len(digits) <= 15 else ''
+    national = _national_digits(raw, digits) if digits else None
+    return f'+{COUNTRY_CODE}{national}' if national and 8 <= len(national) <= 10 else ''
+
+
+@lru_cache(maxsize=16384)
+def _terms(booking_id, name, phone, email):
+    # Dữ liệu tìm kiếm của 1 đơn; cùng nội dung thì dùng lại (index dựng lại nhiều lần)
+    e164 = normalize_phone(phone).lstrip('+')
+    folded = fold(name)
+    return {
+        'id': booking_id.upper(),
+        'name': tuple(tokens(name)),
+        'email': tuple(tokens(email)),
+        'phone': e164,
+        'folded': ' '.join(_SEP.split(folded)).strip(),
+        'lower': name.lower(),
+        'text': '\x00'.join((booking_id.lower(), folded, phone, e164, fold(email))),
+    }
+
+def terms_of(b):
+    return _terms(b.id, b.name, b.phone, b.email)
+
+
+class Query:
+    # Từ khóa đã chuẩn bị sẵn; dùng chung cho index và cho lưu trữ (archive.search_archive)
+    def __init__(self, keyword):
+        raw = keyword.strip()
+        self.raw = raw.lower()
+        self.folded = fold(raw).strip()
+        self.id = raw.upper()
+        self.tokens = tokens(raw)
+        self.accented = self.folded != self.raw
+        self.phone = self.phone_prefix = self.phone_suffix = ''
+        digits = re.sub(r'\D', '', raw)
+        if _PHONE_QUERY.match(raw) and len(digits) >= MIN_PHONE_PART:
+            self.tokens = []
+            self.phone = normalize_phone(raw).lstrip('+')
+            national = _national_digits(raw, digits) if raw.startswith(('+', '0')) or len(digits) >= 11 else None
+            if national is not None:
+                self.phone_prefix = COUNTRY_CODE + national
+            else:
+                self.phone_suffix = digits
+
+    def score(self, t):
+        # 0 = không khớp; càng cao càng khớp
+        if self.id == t['id']:
+            return 100
+        if self.phone or self.phone_prefix or self.phone_suffix:
+            if self.phone and self.phone == t['phone']:
+                return 90
+            if self.phone_prefix and t['phone'].startswith(self.phone_prefix):
+                return 60
+            if self.phone_suffix and t['phone'].endswith(self.phone_suffix):
+                return 50
+            return 0
+        if not self.tokens:
+            return 0
+        score = 0
+        for q in self.tokens:
+            best = 0
+            for tok in t['name']:
+                best = max(best, 10 if tok == q else 6 if tok.startswith(q) else 0)
+            if not best:
+                for tok in t['email']:
+                    best = max(best, 4 if tok == q else 2 if tok.startswith(q) else 0)
+            if not best:
+                return 0
+            score += best
+        folded = ' '.join(self.tokens)
+        if t['folded'] == folded:
+            score += 20
+        elif t['folded'].startswith(folded):
+            score += 5
+        if self.accented and self.raw in t['lower']:
+            score += 3
+        return score
+
+    def fallback(self, t):
+        # Chuỗi con bất kỳ (vd giữa tên, giữa SĐT) khi index không ra kết quả
+        return bool(self.folded) and self.folded in t['text']
+
+def matches(keyword, b):
+    q = keyword if isinstance(keyword, Query) else Query(keyword)
+    t = terms_of(b)
+    return q.score(t) > 0 or q.fallback(t)
+
+
+class SearchIndex:
+    # Khóa = số dòng (sheet) / seq (SQLite): khóa lớn hơn là đơn mới hơn
+    def __init__(self):
+        self.terms = {}
+        self.by_id = {}
+        self.prefixes = {}         # tiền tố từ (tên / email) -> {khóa}
+        self.phone_prefixes = {}   # tiền tố SĐT E.164 (không '+') -> {khóa}
+        self.phone_suffixes = {}   # đuôi SĐT đảo ngược -> {khóa}
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.terms)
+
+    def _entries(self, t):
+        for tok in set(t['name'] + t['email']):
+            for i in range(1, len(tok) + 1):
+                yield self.prefixes, tok[:i]
+        phone = t['phone']
+        for i in range(len(COUNTRY_CODE) + MIN_PHONE_PART - 1, len(phone) + 1):
+            yield self.phone_prefixes, phone[:i]
+        rev = phone[::-1]
+        for i in range(MIN_PHONE_PART, len(rev) + 1):
+            yield self.phone_suffixes, rev[:i]
+
+    def add(self, key, b):
+        t = terms_of(b)
+        with self.lock:
+            if key in self.terms:
+                self.remove(key)
+            self.terms[key] = t
+            self.by_id.setdefault(t['id'], set()).add(key)
+            for table, k in self._entries(t):
+                table.setdefault(k, set()).add(key)
+
+    def remove(self, key):
+        with self.lock:
+            t = self.terms.pop(key, None)
+            if t is None:
+                return
+            self._discard(self.by_id, t['id'], key)
+            for table, k in self._entries(t):
+                self._discard(table, k, key)
+
+    @staticmethod
+    def _discard(table, k, key):
+        keys = table.get(k)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del table[k]
+
+    def _candidates(self, q):
+        if q.phone_prefix or q.phone_suffix:
+            if q.phone_prefix:
+                return set(self.phone_prefixes.get(q.phone_prefix, ()))
+            return set(self.phone_suffixes.get(q.phone_suffix[::-1], ()))
+        found = None
+        for tok in q.tokens:
+            keys = self.prefixes.get(tok, set())
+            found = set(keys) if found is None else found & keys
+            if not found:
+                break
+        return found or set()
+
+    def search(self, keyword, limit=LIMIT):
+        # -> [khóa], khớp nhất trước; cùng điểm thì đơn mới trước
+        q = Query(keyword)
+        with self.lock:
+            keys = self._candidates(q) | self.by_id.get(q.id, set())
+            ranked = [(q.score(self.terms[k]), k) for k in keys]
+            ranked = [(s, k) for s, k in ranked if s > 0]
+            if not ranked:
+                ranked = [(1, k) for k, t in self.terms.items() if q.fallback(t)]
+        ranked.sort(key=lambda r: (-r[0], -r[1]))
+        return [k for _, k in ranked[:limit]]
@@ -0,0 +1,113 @@
+import heapq, json, threading, time
+import config, db, logs
+
+log = logs.get_logger('sessions')
+
+# ===== PHIÊN HỘI THOẠI ZALO DÙNG CHUNG GIỮA CÁC WORKER =====
+# Lưu trong SQLite để tin nhắn tiếp theo rơi vào worker nào cũng đọc được.
+# Mỗi phiên có hạn (SESSION_TTL), gia hạn mỗi lần cập nhật.
+db.schema(
+    '''CREATE TABLE IF NOT EXISTS sessions (
+        chat_id TEXT PRIMARY KEY,
+        step TEXT NOT NULL,
+        data TEXT NOT NULL,
+        expires REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)',
+)
+
+# Tên field -> khóa ngắn khi lưu, bỏ qua giá trị rỗng
+_SHORT = {'sender_name': 's', 'fullname': 'f', 'phone': 'p', 'service': 'v', 'date': 'd', 'time': 't', 'note': 'n'}
+_LONG = {v: k for k, v in _SHORT.items()}
+
+_heap = []  # (hạn, chat_id) của các phiên worker này đã chạm tới
+_heap_lock = threading.Lock()
+_wake = threading.Event()
+_started = False
+stats = {'expired': 0}
+
+def _pack(session):
+    data = {_SHORT.get(k, k): v for k, v in session.items() if k != 'step' and v != ''}
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+def _unpack(step, data):
+    session = dict.fromkeys(_SHORT, '')
+    session.update({_LONG.get(k, k): v for k, v in json.loads(data).items()})
+    session['step'] = step
+    return session
+
+def _schedule(chat_id, expires):
+    start()
+    with _heap_lock:
+        heapq.heappush(_heap, (expires, str(chat_id)))
+        if _heap[0][1] == str(chat_id):
+            _wake.set()
+
+def get(chat_id):
+    row = db.connect().execute('SELECT step, data, expires FROM sessions WHERE chat_id = ?', (str(chat_id),)).fetchone()
+    if row is None or row[2] < time.time():
+        return None
+    return _unpack(row[0], row[1])
+
+def put(chat_id, session):
+    expires = time.time() + config.SESSION_TTL
+    with db.transaction() as conn:
+        conn.execute('INSERT OR REPLACE INTO sessions (chat_id, step, data, expires) VALUES (?, ?, ?, ?)',
+                     (str(chat_id), session['step'], _pack(session), expires))
+    _schedule(chat_id, expires)
+
+def delete(chat_id):
+    with db.transaction() as conn:
+        conn.execute('DELETE FROM sessions WHERE chat_id = ?', (str(chat_id),))
+
+def advance(chat_id, from_step, to_step, **fields):
+    # Chuyển bước nguyên tử: chỉ thành công nếu phiên vẫn đang ở from_step
+    # (tin trùng / tin đến song song ở worker khác sẽ nhận None)
+    now = time.time()
+    with db.transaction() as conn:
+        row = conn.execute('SELECT step, data, expires FROM sessions WHERE chat_id = ?', (str(chat_id),)).fetchone()
+        if row is None or row[2] < now or row[0] != from_step:
+            return None
+        session = _unpack(row[0], row[1])
+        session.update(fields)
+        session['step'] = to_step
+        expires = now + config.SESSION_TTL
+        conn.execute('UPDATE sessions SET step = ?, data = ?, expires = ? WHERE chat_id = ?',
+                     (to_step, _pack(session), expires, str(chat_id)))
+    _schedule(chat_id, expires)
+    return session
+
+def purge_expired():
+    with db.transaction() as conn:
+        n = conn.execute('DELETE FROM sessions WHERE expires < ?', (time.time(),)).rowcount
+    stats['expired'] += n
+    return n
+
+def count():
+    return db.connect().execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
+
+def _expiry_loop():
+    # Ngủ đến hạn sớm nhất trong heap rồi xóa các phiên hết hạn (dùng index expires)
+    while True:
+        with _heap_lock:
+            now = time.time()
+            due = False
+            while _heap and _heap[0][0] <= now:
+                heapq.heappop(_heap)
+                due = True
+            wait = min(_heap[0][0] - now, config.SESSION_TTL) if _heap else config.SESSION_TTL
+            _wake.clear()
+        if due:
+            try:
+                purge_expired()
+            except Exception as e:
+                log.exception(f"Session purge error: {e}")
+        _wake.wait(max(wait, 1))
+
+def start():
+    global _started
+    with _heap_lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=_expiry_loop, daemon=True).start()
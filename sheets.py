@@ -1,50 +1,266 @@
 import gspread
+from gspread.exceptions import APIError
 from google.oauth2.service_account import Credentials
+from google.auth.transport.requests import Request
+from contextlib import contextmanager
 from datetime import datetime, timezone, timedelta
-import config, json, os
+import archive, config, db, json, logs, metrics, os, quota, re, search, threading, time
+from models import Booking, HEADER, Status, STATUS_CATEGORIES, parse_rows, parse_status
 
 SCOPES = ['https://www.googleapis.com/auth/spreadsheets']
 VN_TZ = timezone(timedelta(hours=7))  # UTC+7
+log = logs.get_logger('sheets')
+
+# Làm mới token trước khi hết hạn bao lâu (giây)
+TOKEN_REFRESH_MARGIN = 300
 
 def vn_now():
     """Trả về thời gian hiện tại theo giờ Việt Nam"""
     return datetime.now(VN_TZ)
 
-def get_sheet():
+# ===== CLIENT & WORKSHEET CACHE (mỗi worker 1 bản) =====
+_lock = threading.RLock()
+_creds = None
+_client = None
+_sheet = None
+_refresher = None
+cache_stats = {'hits': 0, 'misses': 0, 'reopens': 0, 'token_refreshes': 0}
+
+def _load_creds():
     if os.path.exists('credentials.json'):
-        creds = Credentials.from_service_account_file('credentials.json', scopes=SCOPES)
-    else:
-        creds_json = json.loads(os.environ.get('GOOGLE_CREDENTIALS', '{}'))
-        creds = Credentials.from_service_account_info(creds_json, scopes=SCOPES)
-    client = gspread.authorize(creds)
-    return client.open_by_key(config.SHEET_ID).sheet1
+        return Credentials.from_service_account_file('credentials.json', scopes=SCOPES)
+    creds_json = json.loads(os.environ.get('GOOGLE_CREDENTIALS', '{}'))
+    return Credentials.from_service_account_info(creds_json, scopes=SCOPES)
+
+def _refresh_loop():
+    # Làm mới OAuth token ở nền để request không phải chờ refresh
+    while True:
+        with _lock:
+            creds = _creds
+        wait = 60
+        if creds is not None:
+            try:
+                expiry = creds.expiry
+                if not creds.valid or expiry is None or (expiry - datetime.utcnow()).total_seconds() < TOKEN_REFRESH_MARGIN:
+                    creds.refresh(Request())
+                    cache_stats['token_refreshes'] += 1
+                    expiry = creds.expiry
+                if expiry is not None:
+                    wait = max(30, (expiry - datetime.utcnow()).total_seconds() - TOKEN_REFRESH_MARGIN)
+            except Exception as e:
+                log.exception(f"Token refresh error: {e}")
+        time.sleep(wait)
+
+def get_sheet():
+    global _creds, _client, _sheet, _refresher
+    with _lock:
+        if _sheet is not None:
+            cache_stats['hits'] += 1
+            return _sheet
+        cache_stats['misses'] += 1
+        if _client is None:
+            _creds = _load_creds()
+            _client = gspread.authorize(_creds)
+            if _refresher is None:
+                _refresher = threading.Thread(target=_refresh_loop, daemon=True)
+                _refresher.start()
+        _sheet = _client.open_by_key(config.SHEET_ID).sheet1
+        return _sheet
+
+def reset_sheet(drop_client=False):
+    global _creds, _client, _sheet
+    with _lock:
+        _sheet = None
+        cache_stats['reopens'] += 1
+        if drop_client:
+            _creds = None
+            _client = None
+
+metrics.histogram('sheets_api_seconds', 'Google Sheets API call latency by operation')
+metrics.counter('sheets_api_errors_total', 'Google Sheets API errors by operation and code')
+
+def _call(fn, op, read=None):
+    # op = tên thao tác cho metrics (update_status, write_statuses, ...), caller ghi rõ vì lệnh ghi
+    # gộp chạy trong luồng của caller khác; read = khóa của lệnh đọc (gộp các lần đọc giống nhau
+    # đang chạy); None = lệnh ghi. Mọi lệnh đi qua ngân sách quota
+    with metrics.timer('sheets_api_seconds', function=op):
+        try:
+            if read is not None:
+                return quota.single_flight(read, lambda: quota.run('read', lambda: _call_once(fn)))
+            try:
+                return quota.run('write', lambda: _call_once(fn))
+            finally:
+                quota.wrote()
+        except Exception as e:
+            metrics.inc('sheets_api_errors_total', function=op, code=getattr(e, 'code', type(e).__name__))
+            raise
+
+def _call_once(fn):
+    # Chạy fn(sheet); lỗi auth / 404 thì mở lại handle và thử lại 1 lần
+    try:
+        return fn(get_sheet())
+    except APIError as e:
+        if e.code not in (401, 403, 404):
+            raise
+        log.warning(f"Sheet handle error {e.code}, reopening")
+        reset_sheet(drop_client=e.code != 404)
+        return fn(get_sheet())
+
+def get_cache_stats():
+    total = cache_stats['hits'] + cache_stats['misses']
+    return dict(cache_stats, hit_ratio=round(cache_stats['hits'] / total, 4) if total else 0.0)
 
 def get_today_str():
     return vn_now().strftime('%d/%m/%Y')
 
-def generate_booking_id(sheet):
-    data = sheet.get_all_values()
-    today = get_today_str()
+# ===== INDEX BOOKING TRONG BỘ NHỚ =====
+# rows[n-1] = Booking ở dòng n trên sheet (rows[0] là header thô, dòng trống là None)
+_index_lock = threading.RLock()
+_index = None
+
+# ===== BỘ ĐẾM THEO TRẠNG THÁI / NGÀY =====
+index_stats = {'rebuilds': 0, 'counter_drift': 0, 'reused_rows': 0}
+
+def _empty_counts():
+    return dict.fromkeys(STATUS_CATEGORIES + ('total',), 0)
+
+def _count(counts, by_date, b, delta):
+    cat = b.category
+    day = by_date.setdefault(b.date, _empty_counts())
+    counts[cat] += delta
+    counts['total'] += delta
+    day[cat] += delta
+    day['total'] += delta
+
+def count_rows(bookings):
+    # Đếm 1 lượt: (theo trạng thái, theo ngày) — dùng khi không có bộ đếm sẵn
+    counts, by_date = _empty_counts(), {}
+    for b in bookings:
+        _count(counts, by_date, b, 1)
+    return counts, by_date
+
+def _build_index(data, pool=None):
+    idx = {'rows': [data[0] if data else []], 'by_id': {}, 'by_date': {}, 'by_status': {},
+           'loaded_at': time.time(), 'counts': _empty_counts(), 'date_counts': {},
+           'search': search.SearchIndex()}
+    for i, b in enumerate(parse_rows(data[1:], pool)):
+        _index_put(idx, i + 2, b)
+    return idx
+
+def _index_remove(idx, row_num):
+    b = idx['rows'][row_num - 1]
+    if b is None:
+        return
+    if row_num in idx['by_id'].get(b.id, []):
+        idx['by_id'][b.id].remove(row_num)
+    if row_num in idx['by_date'].get(b.date, []):
+        idx['by_date'][b.date].remove(row_num)
+    idx['by_status'].get(b.status, set()).discard(row_num)
+    idx['search'].remove(row_num)
+    _count(idx['counts'], idx['date_counts'], b, -1)
+    idx['rows'][row_num - 1] = None
+
+def _index_put(idx, row_num, b):
+    while len(idx['rows']) < row_num:
+        idx['rows'].append(None)
+    _index_remove(idx, row_num)
+    idx['rows'][row_num - 1] = b
+    if b is None:
+        return
+    if b.id:
+        idx['by_id'].setdefault(b.id, []).append(row_num)
+        idx['search'].add(row_num, b)
+    idx['by_date'].setdefault(b.date, []).append(row_num)
+    idx['by_status'].setdefault(b.status, set()).add(row_num)
+    _count(idx['counts'], idx['date_counts'], b, 1)
+
+def _index_set_status(idx, row_num, new_status):
+    # Thay object mới thay vì sửa tại chỗ: object cũ có thể đang nằm trong cache / kết quả đã trả ra
+    old_b = idx['rows'][row_num - 1]
+    old = idx['by_status'].get(old_b.status)
+    if old is not None:
+        old.discard(row_num)
+        if not old:
+            del idx['by_status'][old_b.status]
+    _count(idx['counts'], idx['date_counts'], old_b, -1)
+    b = old_b.copy()
+    b.set_status(new_status)
+    idx['rows'][row_num - 1] = b
+    _count(idx['counts'], idx['date_counts'], b, 1)
+    idx['by_status'].setdefault(b.status, set()).add(row_num)
+
+def _load_index(data=None):
+    global _index
+    if data is None:
+        data = _call(lambda s: s.get_all_values(), 'load_index', read='get_all_values')
+    with _index_lock:
+        # Dòng không đổi so với index cũ thì dùng lại object Booking cũ
+        pool = {(n, b.key()): b for n, b in enumerate(_index['rows'][1:], 2) if b is not None} if _index is not None else None
+        new = _build_index(data, pool)
+        if pool:
+            index_stats['reused_rows'] += sum(1 for n, b in enumerate(new['rows'][1:], 2) if b is not None and pool.get((n, b.key())) is b)
+        # Đối chiếu bộ đếm cũ với dữ liệu mới tải từ sheet
+        if _index is not None and _index['counts'] != new['counts']:
+            index_stats['counter_drift'] += 1
+            log.warning("Counters reconciled", before=_index['counts'], after=new['counts'])
+        index_stats['rebuilds'] += 1
+        _index = new
+        return _index
+
+def _get_index():
+    # Gọi khi KHÔNG giữ _index_lock: tải lại gọi Sheets (có thể chờ quota cả phút) ngoài khóa,
+    # _load_index chỉ giữ khóa lúc đổi _index nên thread khác vẫn đọc index cũ trong lúc chờ
+    idx = _index
+    if idx is None or time.time() - idx['loaded_at'] > config.SHEET_INDEX_MAX_AGE:
+        return _load_index()
+    return idx
+
+@contextmanager
+def _locked_index():
+    # Giữ _index_lock trên index hiện tại (tải trước ngoài khóa nếu cần);
+    # index bị thay / bỏ giữa lúc tải và lúc vào khóa thì lấy lại
+    while True:
+        idx = _get_index()
+        with _index_lock:
+            if idx is _index:
+                yield idx
+                return
+
+def invalidate_index():
+    global _index
+    with _index_lock:
+        _index = None
+
+def _max_id(booking_ids):
     max_num = 0
-    for row in data[1:]:
-        if len(row) >= 10 and today in row[9] and row[0].startswith('DUC'):
+    for bid in booking_ids:
+        if bid.startswith('DUC'):
             try:
-                num = int(row[0].replace('DUC', ''))
-                max_num = max(max_num, num)
-            except:
+                max_num = max(max_num, int(bid[3:]))
+            except ValueError:
                 pass
-    return f"DUC{max_num + 1:02d}"
+    return max_num
 
-def add_booking(data):
-    sheet = get_sheet()
-    booking_id = generate_booking_id(sheet)
-    now = vn_now().strftime('%H:%M %d/%m/%Y')
+def next_booking_id(existing_ids):
+    # 1 bộ đếm chung trong SQLite cho mọi worker, không đếm lại theo ngày: đơn của ngày sau nằm
+    # lại trên sheet qua nhiều ngày nên mã theo ngày sẽ trùng (DUC01 hôm qua và DUC01 hôm nay).
+    # existing_ids() chỉ gọi khi bộ đếm chưa tồn tại (DB mới): mã lớn nhất đang có làm mức sàn
+    floor = 0
+    if db.current_sequence('booking') is None:
+        floor = _max_id(existing_ids())
+    return f"DUC{db.next_sequence('booking', floor):02d}"
 
+def generate_booking_id():
+    def existing_ids():
+        with _locked_index() as idx:
+            return [b.id for b in idx['rows'][1:] if b is not None]
+    return next_booking_id(existing_ids)
+
+def build_row(booking_id, data):
     date_raw = data.get('date', '')
     parts = date_raw.split('-')
     date_formatted = f"{parts[2]}/{parts[1]}/{parts[0]}" if len(parts) == 3 else date_raw
-
-    row = [
+    return Booking(
         booking_id,
         data.get('fullname', ''),
         data.get('phone', ''),
@@ -53,109 +269,251 @@ def add_booking(data):
         date_formatted,
         data.get('time', ''),
         data.get('note', ''),
-        '⏳ Chờ xác nhận',
-        now
-    ]
-
-    next_row = len(sheet.get_all_values()) + 1
-    cell_range = f'A{next_row}:J{next_row}'
-    sheet.update(cell_range, [row])
-    print(f"Sheet: {booking_id} -> row {next_row} ({cell_range}) at {now} VN time")
-    return booking_id, date_formatted
-
-def update_status(booking_id, new_status):
-    sheet = get_sheet()
-    data = sheet.get_all_values()
-    target_row = -1
-
-    for i, row in enumerate(data):
-        if row and row[0] == booking_id:
-            if 'xác nhận' in new_status.lower() and 'Chờ' not in new_status and 'Chờ' in row[8]:
-                target_row = i
-                break
-            if 'hoàn thành' in new_status.lower() and 'Đã xác nhận' in row[8]:
-                target_row = i
-                break
-            if 'từ chối' in new_status.lower() and 'Chờ' in row[8]:
-                target_row = i
-                break
-
-    # Fallback: tìm theo ID
-    if target_row < 0:
-        for i, row in enumerate(data):
-            if row and row[0] == booking_id:
-                target_row = i
-                break
-
-    if target_row >= 0:
-        sheet.update_cell(target_row + 1, 9, new_status)
-        print(f"Status: {booking_id} -> {new_status} (row {target_row + 1}) at {vn_now().strftime('%H:%M %d/%m/%Y')} VN")
-        return data[target_row]
-    print(f"Status: {booking_id} NOT FOUND")
+        Status.PENDING.value,
+        vn_now().strftime('%H:%M %d/%m/%Y')
+    )
+
+def _appended_row_num(resp):
+    # updatedRange dạng "Sheet1!A5:J5"
+    m = re.search(r'![A-Z]+(\d+)', resp.get('updates', {}).get('updatedRange', ''))
+    return int(m.group(1)) if m else -1
+
+def append_rows(rows):
+    # rows: list 10 cột (payload của journal)
+    resp = _call(lambda s: s.append_rows(rows, table_range='A1'), 'append_rows')
+    start = _appended_row_num(resp)
+    if start > 0:
+        with _locked_index() as idx:
+            for i, row in enumerate(rows):
+                _index_put(idx, start + i, Booking.from_row(row))
+    else:
+        invalidate_index()
+    return start
+
+def add_booking(data):
+    b = build_row(generate_booking_id(), data)
+    row_num = append_rows([b.to_row()])
+    log.info(f"Sheet: {b.id} -> row {row_num}", booking_id=b.id)
+    return b.id, b.date
+
+# Chuyển trạng thái hợp lệ: trạng thái mới -> trạng thái hiện tại cần có
+TRANSITIONS = {
+    Status.CONFIRMED: Status.PENDING,
+    Status.COMPLETED: Status.CONFIRMED,
+    Status.REJECTED: Status.PENDING,
+}
+
+def matches_transition(current_status, new_status):
+    source = TRANSITIONS.get(parse_status(new_status))
+    return source is not None and parse_status(current_status) is source
+
+def _resolve_row(idx, booking_id, new_status, exclude=()):
+    # Dòng duy nhất của mã này đang ở đúng trạng thái nguồn. Không có, hoặc nhiều dòng cùng khớp
+    # (mã trùng từ khi còn đếm theo ngày) thì -1: không đoán dòng, tránh đổi nhầm đơn của khách khác
+    found = [n for n in idx['by_id'].get(booking_id, [])
+             if n not in exclude and matches_transition(idx['rows'][n - 1].status, new_status)]
+    if len(found) > 1:
+        log.warning(f"Status: {booking_id} matches {len(found)} rows, skipped", booking_id=booking_id)
+    return found[0] if len(found) == 1 else -1
+
+def _flush_cells(ranges):
+    return _call(lambda s: s.batch_update(ranges), 'write_statuses')
+
+def _write_statuses(updates):
+    # updates = [(dòng, trạng thái)]; index đã đổi trước, ghi lỗi thì bỏ index để tải lại
+    try:
+        quota.write_ranges([{'range': f'I{n}', 'values': [[st]]} for n, st in updates], _flush_cells)
+    except Exception:
+        invalidate_index()
+        raise
+
+def update_status(booking_id, new_status, _retry=True):
+    # Trả về bản sao Booking trước khi đổi (None nếu không thấy).
+    # Gọi Sheets ngoài _index_lock để thread khác vẫn đọc index khi đang chờ quota.
+    with _locked_index() as idx:
+        target_row = _resolve_row(idx, booking_id, new_status)
+    before = None
+    if target_row > 0:
+        # Kiểm tra dòng thật trên sheet, lệch với index thì dựng lại index
+        current = Booking.from_row(_call(lambda s: s.row_values(target_row), 'update_status', read=('row_values', target_row)))
+        with _locked_index() as idx:
+            stale = target_row > len(idx['rows']) or current != idx['rows'][target_row - 1]
+            if not stale:
+                before = idx['rows'][target_row - 1].copy()
+                _index_set_status(idx, target_row, new_status)
+        if stale:
+            log.warning(f"Index stale at row {target_row}, rebuilding")
+            _load_index()
+            with _locked_index() as idx:
+                target_row = _resolve_row(idx, booking_id, new_status)
+                if target_row > 0:
+                    before = idx['rows'][target_row - 1].copy()
+                    _index_set_status(idx, target_row, new_status)
+    if before is not None:
+        _write_statuses([(target_row, new_status)])
+        log.info(f"Status: {booking_id} -> {new_status} (row {target_row})", booking_id=booking_id)
+        return before
+    # Đơn có thể còn nằm trong journal chưa ghi xuống sheet
+    import journal
+    if _retry and journal.flush():
+        return update_status(booking_id, new_status, _retry=False)
+    log.warning(f"Status: {booking_id} NOT FOUND", booking_id=booking_id)
     return None
 
+def update_status_many(booking_ids, new_status):
+    # Đọc 1 snapshot, ghi tất cả trong 1 batch_update; trả về {id: Booking cũ hoặc None}
+    results = {}
+    data = _call(lambda s: s.get_all_values(), 'update_status_many', read='get_all_values')
+    with _index_lock:
+        idx = _load_index(data)
+        targets = []
+        for bid in booking_ids:
+            n = _resolve_row(idx, bid, new_status, exclude={t for _, t in targets})
+            if n > 0:
+                targets.append((bid, n))
+                results[bid] = idx['rows'][n - 1].copy()
+                _index_set_status(idx, n, new_status)
+            else:
+                results.setdefault(bid, None)
+    if targets:
+        _write_statuses([(n, new_status) for _, n in targets])
+    log.info(f"Status many: {len(targets)}/{len(booking_ids)} -> {new_status}")
+    return results
+
+def set_statuses(items):
+    # Ghi trạng thái đã quyết định sẵn (từ backend khác); items = [[booking_id, created, status], ...]
+    # Trả về vị trí các mục chưa thấy dòng trên sheet (đơn có thể chưa được append xong) để ghi lại sau
+    data = _call(lambda s: s.get_all_values(), 'set_statuses', read='get_all_values')
+    missing = []
+    with _index_lock:
+        idx = _load_index(data)
+        updates = []
+        for i, (bid, created, new_status) in enumerate(items):
+            nums = idx['by_id'].get(bid, [])
+            # Mã cũ (đếm theo ngày) có thể trùng: khớp cả thời điểm tạo; không có thời điểm tạo thì
+            # chỉ nhận khi mã có đúng 1 dòng
+            if created:
+                n = next((n for n in nums if idx['rows'][n - 1].created == created), -1)
+            else:
+                n = nums[0] if len(nums) == 1 else -1
+            if n > 0:
+                updates.append((n, new_status))
+                _index_set_status(idx, n, new_status)
+            else:
+                log.warning(f"Status mirror: {bid} not on sheet yet", booking_id=bid)
+                missing.append(i)
+    if updates:
+        _write_statuses(updates)
+    return missing
+
+def status_filter(status):
+    # Status -> so đúng loại; chuỗi -> so chứa (kiểu cũ)
+    if isinstance(status, Status):
+        return lambda text: parse_status(text) is status
+    return lambda text: status in text
+
 def get_bookings_by_date(target_date):
-    sheet = get_sheet()
-    results = [row for row in sheet.get_all_values()[1:] if len(row) >= 7 and row[5] == target_date]
-    return sorted(results, key=lambda x: x[6] if len(x) > 6 else '')
+    with _locked_index() as idx:
+        results = [idx['rows'][n - 1] for n in idx['by_date'].get(target_date, [])]
+    return sorted(results, key=lambda b: b.time)
 
-def get_bookings_by_status(status_keyword):
-    sheet = get_sheet()
-    results = [row for row in sheet.get_all_values()[1:] if len(row) >= 9 and status_keyword in row[8]]
-    return results[-20:]
+def get_bookings_by_status(status):
+    match = status_filter(status)
+    with _locked_index() as idx:
+        nums = sorted(n for text, rows in idx['by_status'].items() if match(text) for n in rows)
+        return [idx['rows'][n - 1] for n in nums]
 
 def find_booking(keyword):
-    sheet = get_sheet()
-    kw = keyword.lower()
-    results = [row for row in sheet.get_all_values()[1:] if any(kw in str(c).lower() for c in row[:4])]
-    return results[-10:]
+    # Xếp hạng: khớp nhất trước (xem search.py)
+    with _locked_index() as idx:
+        return [idx['rows'][n - 1] for n in idx['search'].search(keyword)]
 
-def get_stats():
-    sheet = get_sheet()
-    rows = sheet.get_all_values()[1:]
-    today = get_today_str()
+def _all_rows():
+    with _locked_index() as idx:
+        return [b for b in idx['rows'][1:] if b is not None]
+
+def _stats(counts, today_total):
     return {
-        'total': len(rows),
-        'pending': sum(1 for r in rows if len(r) > 8 and 'Chờ' in r[8]),
-        'confirmed': sum(1 for r in rows if len(r) > 8 and 'Đã xác nhận' in r[8]),
-        'completed': sum(1 for r in rows if len(r) > 8 and 'hoàn thành' in r[8].lower()),
-        'rejected': sum(1 for r in rows if len(r) > 8 and 'từ chối' in r[8].lower()),
-        'today': sum(1 for r in rows if len(r) > 5 and r[5] == today)
+        'total': counts['total'],
+        'pending': counts['pending'],
+        'confirmed': counts['confirmed'],
+        'completed': counts['completed'],
+        'rejected': counts['rejected'],
+        'today': today_total
     }
 
-def clear_old_data():
+def stats_from_rows(bookings):
+    counts, by_date = count_rows(bookings)
+    return _stats(counts, by_date.get(get_today_str(), {}).get('total', 0))
+
+def get_stats():
+    # Đọc thẳng bộ đếm của index, không quét dòng nào
+    with _locked_index() as idx:
+        return _stats(idx['counts'], idx['date_counts'].get(get_today_str(), {}).get('total', 0))
+
+def _archive_sheet(s):
+    # Tab lưu trữ trên cùng spreadsheet, chưa có thì tạo kèm dòng tiêu đề
     try:
-        sheet = get_sheet()
-        data = sheet.get_all_values()
+        return s.spreadsheet.worksheet(config.ARCHIVE_SHEET)
+    except gspread.WorksheetNotFound:
+        ws = s.spreadsheet.add_worksheet(config.ARCHIVE_SHEET, rows=1, cols=len(HEADER))
+        ws.append_row(list(HEADER))
+        return ws
+
+def clear_old_data(write_archive=True):
+    # Không xóa hết nữa: chuyển đơn của các ngày đã qua sang tab lưu trữ (và file lưu trữ để tìm
+    # nhanh; write_archive=False khi backend SQLite đã tự ghi file), sheet chỉ giữ đơn hôm nay và tương lai
+    try:
+        data = _call(lambda s: s.get_all_values(), 'clear_old_data', read='get_all_values')
         if len(data) <= 1:
             return {'cleared': 0}
-        count = len(data) - 1
-        sheet.delete_rows(2, len(data))
-        print(f"Cleared {count} rows at {vn_now().strftime('%H:%M %d/%m/%Y')} VN")
-        return {'cleared': count}
+        today = vn_now().date()
+        old = [(i + 2, b) for i, b in enumerate(parse_rows(data[1:])) if b is not None and archive.is_old(b, today)]
+        if not old:
+            return {'cleared': 0, 'kept': len(data) - 1}
+        # Chép sang tab lưu trữ trước khi xóa; lỗi thì chưa xóa gì, lần sau làm lại
+        if config.ARCHIVE_SHEET:
+            rows = [b.to_row() for _, b in old]
+            _call(lambda s: _archive_sheet(s).append_rows(rows, table_range='A1'), 'archive_rows')
+        if write_archive:
+            archive.write_rows([b for _, b in old])
+        # Xóa từ dưới lên theo từng đoạn liên tiếp, 1 request; dòng mới append sau lúc đọc không bị ảnh hưởng
+        runs = []
+        for n, _ in old:
+            if runs and runs[-1][1] == n - 1:
+                runs[-1][1] = n
+            else:
+                runs.append([n, n])
+        def delete(s):
+            return s.spreadsheet.batch_update({'requests': [{'deleteDimension': {'range': {
+                'sheetId': s.id, 'dimension': 'ROWS', 'startIndex': a - 1, 'endIndex': b}}} for a, b in reversed(runs)]})
+        _call(delete, 'clear_old_data')
+        invalidate_index()
+        count = len(old)
+        log.info(f"Archived {count} rows")
+        return {'cleared': count, 'kept': len(data) - 1 - count}
     except Exception as e:
-        print(f"Clear error: {e}")
+        log.exception(f"Clear error: {e}")
         return {'cleared': 0, 'error': str(e)}
 
-def get_daily_summary():
-    sheet = get_sheet()
-    rows = sheet.get_all_values()[1:]
-    if not rows:
+def get_daily_summary(date=None):
+    date = date or get_today_str()
+    with _locked_index() as idx:
+        bookings = sorted((idx['rows'][n - 1] for n in idx['by_date'].get(date, [])), key=lambda b: b.time)
+        counts = dict(idx['date_counts'].get(date, _empty_counts()))
+    return summary_from_rows(bookings, date, counts)
+
+def summary_from_rows(bookings, date=None, counts=None):
+    if not bookings:
         return None
-    customers = [{
-        'id': r[0] if len(r) > 0 else '',
-        'name': r[1] if len(r) > 1 else '',
-        'phone': r[2] if len(r) > 2 else '',
-        'service': r[4] if len(r) > 4 else '',
-        'time': r[6] if len(r) > 6 else '',
-        'status': r[8] if len(r) > 8 else ''
-    } for r in rows]
+    if counts is None:
+        counts = count_rows(bookings)[0]
     return {
-        'date': get_today_str(),
-        'total': len(rows),
-        'completed': sum(1 for r in rows if len(r) > 8 and 'hoàn thành' in r[8].lower()),
-        'confirmed': sum(1 for r in rows if len(r) > 8 and 'Đã xác nhận' in r[8]),
-        'rejected': sum(1 for r in rows if len(r) > 8 and 'từ chối' in r[8].lower()),
-        'pending': sum(1 for r in rows if len(r) > 8 and 'Chờ' in r[8]),
-        'customers': customers
+        'date': date or get_today_str(),
+        'total': counts['total'],
+        'completed': counts['completed'],
+        'confirmed': counts['confirmed'],
+        'rejected': counts['rejected'],
+        'pending': counts['pending'],
+        'customers': [b.copy() for b in bookings]
     }
@@ -0,0 +1,261 @@
+import threading
+import archive, availability, cache, config, db, journal, logs, search, sheets
+from models import Booking, Status, category_of, parse_rows
+
+log = logs.get_logger('storage')
+
+# ===== LỚP LƯU TRỮ =====
+# Cùng một bộ hàm cho mọi backend:
+#   add_booking, update_status, update_status_many, get_bookings_by_date,
+#   get_bookings_by_status, find_booking, get_stats, get_daily_summary, clear_old_data
+# Dòng trả về luôn là models.Booking (10 cột A-J như trên sheet).
+# - 'sheets': Google Sheets là nguồn chính (ghi qua journal, đọc qua index)
+# - 'sqlite': SQLite là nguồn chính, sheet chỉ là bản mirror ghi sau qua journal
+# Các hàm đọc ở cuối file đi qua cache (theo tag), các hàm ghi làm mất hiệu lực đúng tag liên quan.
+# Đơn bị từ chối trả lại khung giờ cho availability.
+
+COLUMNS = ['booking_id', 'fullname', 'phone', 'email', 'service', 'date', 'time', 'note', 'status', 'created']
+
+class SheetsStorage:
+    name = 'sheets'
+
+    def add_booking(self, data):
+        return journal.record_booking(data)
+
+    def refresh(self):
+        # Worker khác vừa ghi: tải lại index từ sheet
+        sheets._load_index()
+
+    def __getattr__(self, attr):
+        return getattr(sheets, attr)
+
+
+db.schema(
+    f'''CREATE TABLE IF NOT EXISTS bookings (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        {', '.join(c + " TEXT NOT NULL DEFAULT ''" for c in COLUMNS)}
+    )''',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_id ON bookings (booking_id)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_date ON bookings (date, time)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings (status)',
+    'CREATE INDEX IF NOT EXISTS idx_bookings_phone ON bookings (phone)',
+)
+
+_SELECT = f"SELECT {', '.join(COLUMNS)} FROM bookings"
+
+class SQLiteStorage:
+    name = 'sqlite'
+
+    def __init__(self):
+        self._search = search.SearchIndex()
+        self._search_seq = 0
+        self._search_lock = threading.Lock()
+        self._import_from_sheet()
+
+    def refresh(self):
+        # Mọi worker đọc chung 1 file SQLite, không có gì để tải lại
+        pass
+
+    def _import_from_sheet(self):
+        # Lần đầu chuyển sang SQLite: chép dữ liệu hiện có trên sheet về (không mirror ngược lại)
+        conn = db.connect()
+        if conn.execute('SELECT 1 FROM bookings LIMIT 1').fetchone():
+            return
+        rows = [b.to_row() for b in parse_rows(sheets._call(lambda s: s.get_all_values(), 'import_from_sheet', read='get_all_values')[1:]) if b is not None]
+        with db.transaction() as conn:
+            if conn.execute('SELECT 1 FROM bookings LIMIT 1').fetchone():
+                return
+            conn.executemany(f"INSERT INTO bookings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * 10)})", rows)
+        log.info(f"Storage: imported {len(rows)} rows from sheet")
+
+    def _query(self, where='', args=()):
+        return [Booking(*r) for r in db.connect().execute(f'{_SELECT} {where}', args).fetchall()]
+
+    def add_booking(self, data):
+        booking_id = sheets.next_booking_id(
+            lambda: [bid for (bid,) in db.connect().execute("SELECT booking_id FROM bookings WHERE booking_id LIKE 'DUC%'")])
+        row = sheets.build_row(booking_id, data).to_row()
+        with db.transaction() as conn:
+            conn.execute(f"INSERT INTO bookings ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * 10)})", row)
+            journal.enqueue('append', row, conn)
+        log.info(f"Storage: {booking_id} saved", booking_id=booking_id)
+        return booking_id, row[5]
+
+    def _transition(self, conn, booking_id, new_status, exclude=()):
+        # Như sheets._resolve_row: chỉ đổi khi đúng 1 dòng của mã này ở trạng thái nguồn
+        found = [r for r in conn.execute(f'SELECT seq, {", ".join(COLUMNS)} FROM bookings WHERE booking_id = ? ORDER BY seq', (booking_id,))
+                 if r[0] not in exclude and sheets.matches_transition(r[9], new_status)]
+        if len(found) != 1:
+            if found:
+                log.warning(f"Status: {booking_id} matches {len(found)} rows, skipped", booking_id=booking_id)
+            return None, None
+        target = found[0]
+        conn.execute('UPDATE bookings SET status = ? WHERE seq = ?', (new_status, target[0]))
+        before = Booking(*target[1:])
+        journal.enqueue('status', [booking_id, before.created, new_status], conn)
+        return target[0], before
+
+    def update_status(self, booking_id, new_status):
+        with db.transaction() as conn:
+            _, before = self._transition(conn, booking_id, new_status)
+        log.info(f"Status: {booking_id} -> {new_status} {'OK' if before else 'NOT FOUND'}", booking_id=booking_id)
+        return before
+
+    def update_status_many(self, booking_ids, new_status):
+        results, used = {}, set()
+        with db.transaction() as conn:
+            for bid in booking_ids:
+                seq, before = self._transition(conn, bid, new_status, used)
+                if seq is not None:
+                    used.add(seq)
+                    results[bid] = before
+                else:
+                    results.setdefault(bid, None)
+        return results
+
+    def get_bookings_by_date(self, target_date):
+        return self._query('WHERE date = ? ORDER BY time', (target_date,))
+
+    def get_bookings_by_status(self, status):
+        # Số trạng thái rất ít: lọc trên index status rồi truy vấn bằng IN (...)
+        conn = db.connect()
+        match = sheets.status_filter(status)
+        statuses = [s for (s,) in conn.execute('SELECT DISTINCT status FROM bookings') if match(s)]
+        if not statuses:
+            return []
+        return self._query(f"WHERE status IN ({', '.join('?' * len(statuses))}) ORDER BY seq", statuses)
+
+    def _search_index(self):
+        # Index tìm kiếm của worker này, khóa = seq: đơn mới (seq lớn hơn) nạp thêm,
+        # số dòng lệch (đã lưu trữ / xóa) thì dựng lại
+        conn = db.connect()
+        with self._search_lock:
+            last, count = conn.execute('SELECT COALESCE(MAX(seq), 0), COUNT(*) FROM bookings').fetchone()
+            idx = self._search
+            if last > self._search_seq:
+                for row in conn.execute(f'SELECT seq, {", ".join(COLUMNS)} FROM bookings WHERE seq > ?', (self._search_seq,)):
+                    idx.add(row[0], Booking(*row[1:]))
+                self._search_seq = last
+            if len(idx) != count:
+                idx = self._search = search.SearchIndex()
+                for row in conn.execute(f'SELECT seq, {", ".join(COLUMNS)} FROM bookings'):
+                    idx.add(row[0], Booking(*row[1:]))
+                self._search_seq = last
+        return idx
+
+    def find_booking(self, keyword):
+        # Index chỉ cho ra seq; đọc lại dòng để có trạng thái mới nhất
+        seqs = self._search_index().search(keyword)
+        if not seqs:
+            return []
+        rows = {r[0]: Booking(*r[1:]) for r in db.connect().execute(
+            f'SELECT seq, {", ".join(COLUMNS)} FROM bookings WHERE seq IN ({", ".join("?" * len(seqs))})', seqs)}
+        return [rows[s] for s in seqs if s in rows]
+
+    def get_stats(self):
+        conn = db.connect()
+        counts = sheets._empty_counts()
+        for status, n in conn.execute('SELECT status, COUNT(*) FROM bookings GROUP BY status'):
+            counts[category_of(status)] += n
+            counts['total'] += n
+        today = conn.execute('SELECT COUNT(*) FROM bookings WHERE date = ?', (sheets.get_today_str(),)).fetchone()[0]
+        return sheets._stats(counts, today)
+
+    def get_daily_summary(self, date=None):
+        date = date or sheets.get_today_str()
+        return sheets.summary_from_rows(self._query('WHERE date = ? ORDER BY time', (date,)), date)
+
+    def clear_old_data(self):
+        # Chuyển đơn của các ngày đã qua sang file lưu trữ; sheet mirror chuyển các dòng đó sang tab
+        # lưu trữ, không ghi file lần nữa
+        try:
+            today = sheets.vn_now().date()
+            with db.transaction() as conn:
+                rows = conn.execute(f'SELECT seq, {", ".join(COLUMNS)} FROM bookings ORDER BY seq').fetchall()
+                old = [r for r in rows if archive.is_old(Booking(*r[1:]), today)]
+                if old:
+                    archive.write_rows([Booking(*r[1:]) for r in old])
+                    conn.executemany('DELETE FROM bookings WHERE seq = ?', [(r[0],) for r in old])
+                    journal.enqueue('clear', {'archive': False}, conn)
+            log.info(f"Archived {len(old)} rows")
+            return {'cleared': len(old), 'kept': len(rows) - len(old)}
+        except Exception as e:
+            log.exception(f"Clear error: {e}")
+            return {'cleared': 0, 'error': str(e)}
+
+
+BACKENDS = {'sheets': SheetsStorage, 'sqlite': SQLiteStorage}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = BACKENDS[config.STORAGE_BACKEND]()
+        return _backend
+
+# ===== TAG CACHE =====
+# 'date:<dd/mm/yyyy>' cho lịch theo ngày / báo cáo ngày; 'status', 'stats', 'find' cho các
+# truy vấn quét mọi ngày; 'all' có trong mọi mục (xóa / lưu trữ đơn cũ)
+ROW_TAGS = ['status', 'stats', 'find']
+
+def changed_tags(dates):
+    return ['date:' + d for d in dict.fromkeys(dates) if d] + ROW_TAGS
+
+def _cached(key, tags, loader):
+    return cache.get(key, tags + ['all'], loader, refresh=lambda: backend().refresh())
+
+def add_booking(data):
+    booking_id, date = backend().add_booking(data)
+    cache.invalidate(changed_tags([date]))
+    return booking_id, date
+
+def update_status(booking_id, new_status):
+    before = backend().update_status(booking_id, new_status)
+    if before:
+        cache.invalidate(changed_tags([before.date]))
+        if new_status == Status.REJECTED.value:
+            availability.release(before)
+    return before
+
+def update_status_many(booking_ids, new_status):
+    results = backend().update_status_many(booking_ids, new_status)
+    changed = [b.date for b in results.values() if b]
+    if changed:
+        cache.invalidate(changed_tags(changed))
+        if new_status == Status.REJECTED.value:
+            for b in results.values():
+                if b:
+                    availability.release(b)
+    return results
+
+def get_bookings_by_date(target_date):
+    return _cached(('by_date', target_date), ['date:' + target_date],
+                   lambda: backend().get_bookings_by_date(target_date))
+
+def get_bookings_by_status(status, fresh=False):
+    # fresh: cho thao tác ghi hàng loạt (xác nhận / hoàn thành tất cả) - bỏ qua cache và tải lại
+    # nguồn trước, để không làm trên danh sách cũ khi worker khác vừa ghi
+    if fresh:
+        backend().refresh()
+        return backend().get_bookings_by_status(status)
+    return _cached(('by_status', type(status).__name__, str(getattr(status, 'value', status))), ['status'],
+                   lambda: backend().get_bookings_by_status(status))
+
+def find_booking(keyword):
+    return _cached(('find', keyword.strip().lower()), ['find'], lambda: backend().find_booking(keyword))
+
+def get_stats():
+    # 'today' trong thống kê đổi theo ngày: đưa ngày vào khóa
+    return _cached(('stats', sheets.get_today_str()), ['stats'], lambda: backend().get_stats())
+
+def get_daily_summary(date=None):
+    date = date or sheets.get_today_str()
+    return _cached(('summary', date), ['date:' + date], lambda: backend().get_daily_summary(date))
+
+def clear_old_data():
+    result = backend().clear_old_data()
+    cache.invalidate(['all'])
+    return result
@@ -1,9 +1,11 @@
-import requests, json
+import json
 from datetime import datetime, timezone, timedelta
-import config, sheets
+import archive, config, http_client, logs, notifier, render, sheets, storage
+from models import Status
 
 API = f"https://api.telegram.org/bot{config.TELEGRAM_TOKEN}"
 VN_TZ = timezone(timedelta(hours=7))
+log = logs.get_logger('telegram')
 
 def vn_now():
     return datetime.now(VN_TZ)
@@ -29,13 +31,13 @@ def send_message(chat_id, text, reply_markup=None, parse_mode='HTML'):
         'reply_markup': json.dumps(reply_markup or ADMIN_KEYBOARD)
     }
     try:
-        r = requests.post(f"{API}/sendMessage", json=payload, timeout=10)
+        r = http_client.post(f"{API}/sendMessage", bot='telegram', chat_id=chat_id, json=payload)
         result = r.json()
         if not result.get('ok'):
-            print(f"TG send error: {result}")
+            log.warning("TG send error", error=result.get('description'), code=result.get('error_code'))
         return result
     except Exception as e:
-        print(f"TG send exception: {e}")
+        log.exception(f"TG send exception: {e}")
         return {}
 
 def send_message_inline(chat_id, text, reply_markup=None):
@@ -47,13 +49,13 @@ def send_message_inline(chat_id, text, reply_markup=None):
     if reply_markup:
         payload['reply_markup'] = json.dumps(reply_markup)
     try:
-        r = requests.post(f"{API}/sendMessage", json=payload, timeout=10)
+        r = http_client.post(f"{API}/sendMessage", bot='telegram', chat_id=chat_id, json=payload)
         result = r.json()
         if not result.get('ok'):
-            print(f"TG inline send error: {result}")
+            log.warning("TG inline send error", error=result.get('description'), code=result.get('error_code'))
         return result
     except Exception as e:
-        print(f"TG inline exception: {e}")
+        log.exception(f"TG inline exception: {e}")
         return {}
 
 def edit_message(chat_id, message_id, text, reply_markup=None):
@@ -66,15 +68,15 @@ def edit_message(chat_id, message_id, text, reply_markup=None):
     if reply_markup:
         payload['reply_markup'] = json.dumps(reply_markup)
     try:
-        r = requests.post(f"{API}/editMessageText", json=payload, timeout=10)
+        r = http_client.post(f"{API}/editMessageText", bot='telegram', chat_id=chat_id, json=payload)
         return r.json()
     except Exception as e:
-        print(f"TG edit exception: {e}")
+        log.exception(f"TG edit exception: {e}")
         return {}
 
 def answer_callback(callback_id, text=''):
     try:
-        requests.post(f"{API}/answerCallbackQuery", json={
+        http_client.post(f"{API}/answerCallbackQuery", bot='telegram', json={
             'callback_query_id': callback_id,
             'text': text
         }, timeout=10)
@@ -91,13 +93,44 @@ def set_bot_commands():
         {'command': 'help', 'description': '❓ Trợ giúp'}
     ]
     try:
-        requests.post(f"{API}/setMyCommands", json={'commands': cmds}, timeout=10)
+        http_client.post(f"{API}/setMyCommands", bot='telegram', json={'commands': cmds})
     except:
         pass
 
 # ===== THÔNG BÁO ĐƠN MỚI =====
 def notify_new_booking(booking_id, data, date_formatted):
-    now_str = vn_now().strftime('%H:%M %d/%m/%Y')
+    # Không gửi ngay: đưa vào hàng đợi, worker nền gửi (và gộp nếu nhiều đơn đến cùng lúc)
+    oid = notifier.notify('booking', config.TELEGRAM_CHAT_ID, {
+        'booking_id': booking_id, 'data': data, 'date_formatted': date_formatted,
+        'created': vn_now().strftime('%H:%M %d/%m/%Y')
+    })
+    return {'ok': True, 'queued': oid}
+
+def queue_message(chat_id, text):
+    notifier.notify('message', chat_id, {'text': text})
+
+# ===== DANH SÁCH NHIỀU TRANG (xem render.py) =====
+def send_pages(chat_id, pages):
+    text, keyboard = render.first_page(pages)
+    if keyboard:
+        return send_message_inline(chat_id, text, keyboard)
+    return send_message(chat_id, text)
+
+def queue_pages(chat_id, pages):
+    text, keyboard = render.first_page(pages)
+    if keyboard:
+        notifier.notify('inline', chat_id, {'text': text, 'reply_markup': keyboard})
+    else:
+        queue_message(chat_id, text)
+
+def _day_pages(title, bookings):
+    pages = render.Pages(f"{title}\n━━━━━━━━━━━━━━━\n\n", f"📊 Tổng: <b>{len(bookings)}</b>")
+    for b in bookings:
+        pages.add(f"🆔 {b.id} | 🕐 {b.time} | {b.name} ({b.phone})\n💈 {b.service} | {b.status}\n\n")
+    return pages
+
+def format_new_booking(booking_id, data, date_formatted, created=None):
+    now_str = created or vn_now().strftime('%H:%M %d/%m/%Y')
     msg = (
         f"✂️ <b>LỊCH HẸN MỚI</b> ✂️\n"
         f"━━━━━━━━━━━━━━━\n\n"
@@ -129,24 +162,55 @@ def notify_new_booking(booking_id, data, date_formatted):
             ]
         ]
     }
-    return send_message_inline(config.TELEGRAM_CHAT_ID, msg, keyboard)
+    return msg, keyboard
+
+# Số đơn tối đa mỗi tin tổng hợp (2 nút / đơn, Telegram cho tối đa 100 nút / tin)
+DIGEST_ITEMS = 20
+
+def format_booking_digest(items):
+    # -> [(text, keyboard, số đơn)]: tách thành nhiều tin theo độ dài (render.Pages) và số nút
+    pages = render.Pages(f"✂️ <b>{len(items)} LỊCH HẸN MỚI</b> ✂️\n━━━━━━━━━━━━━━━\n\n", per_page=DIGEST_ITEMS)
+    for it in items:
+        bid, data = it['booking_id'], it['data']
+        block = (
+            f"🆔 <b>{bid}</b> | {data.get('fullname', '')} ({data.get('phone', '')})\n"
+            f"📅 {it['date_formatted']} 🕐 {data.get('time', '')} | 💈 {data.get('service', '')}\n"
+        )
+        if data.get('note'):
+            block += f"📝 {data['note']}\n"
+        block += f"📱 <i>{data.get('source', 'Website')} — {it.get('created', '')}</i>\n\n"
+        pages.add(block, [
+            {'text': f'✅ {bid}', 'callback_data': f'confirm_{bid}'},
+            {'text': f'❌ {bid}', 'callback_data': f'reject_{bid}'}
+        ])
+    rendered = pages.render()
+    return [(text, {'inline_keyboard': buttons}, len(blocks))
+            for (text, buttons), (blocks, _) in zip(rendered, pages.pages)]
+
+def _keyboard_after(callback, bid, buttons=None):
+    # Tin tổng hợp nhiều đơn: chỉ thay hàng nút của đơn vừa xử lý, giữ nguyên các đơn khác
+    rows = callback['message'].get('reply_markup', {}).get('inline_keyboard', [])
+    others = [r for r in rows if not any(b.get('callback_data', '').split('_', 1)[-1] == bid for b in r)]
+    if buttons:
+        others.append(buttons)
+    return {'inline_keyboard': others} if others else None
 
 # ===== HIỂN THỊ DANH SÁCH ĐƠN ĐỂ CHỌN =====
 def show_pending_for_action(chat_id, action):
     if action == 'confirm':
-        bookings = sheets.get_bookings_by_status('Chờ')
+        bookings = storage.get_bookings_by_status(Status.PENDING)
         title = "✔️ <b>CHỌN ĐƠN XÁC NHẬN</b>"
         empty_msg = "✅ Không có đơn chờ xác nhận!"
         prefix = 'confirm_'
         btn_icon = '✅'
     elif action == 'complete':
-        bookings = sheets.get_bookings_by_status('Đã xác nhận')
+        bookings = storage.get_bookings_by_status(Status.CONFIRMED)
         title = "✂️ <b>CHỌN ĐƠN HOÀN THÀNH</b>"
         empty_msg = "Không có đơn cần hoàn thành."
         prefix = 'complete_'
         btn_icon = '✂️'
     elif action == 'reject':
-        bookings = sheets.get_bookings_by_status('Chờ')
+        bookings = storage.get_bookings_by_status(Status.PENDING)
         title = "❌ <b>CHỌN ĐƠN TỪ CHỐI</b>"
         empty_msg = "Không có đơn chờ để từ chối."
         prefix = 'reject_'
@@ -158,24 +222,15 @@ def show_pending_for_action(chat_id, action):
         send_message(chat_id, empty_msg)
         return
 
-    msg = f"{title}\n━━━━━━━━━━━━━━━\n\n"
-    buttons = []
+    pages = render.Pages(f"{title}\n━━━━━━━━━━━━━━━\n\n")
     for b in bookings:
-        bid = b[0] if len(b) > 0 else '?'
-        name = b[1] if len(b) > 1 else '?'
-        phone = b[2] if len(b) > 2 else ''
-        service = b[4] if len(b) > 4 else ''
-        date_val = b[5] if len(b) > 5 else ''
-        time_val = b[6] if len(b) > 6 else ''
-
-        msg += f"🆔 <b>{bid}</b> | {name} ({phone})\n📅 {date_val} 🕐 {time_val} | 💈 {service}\n\n"
-        buttons.append([{
-            'text': f'{btn_icon} {bid} — {name} | {date_val} {time_val}',
+        bid = b.id or '?'
+        name = b.name or '?'
+        pages.add(f"🆔 <b>{bid}</b> | {name} ({b.phone})\n📅 {b.date} 🕐 {b.time} | 💈 {b.service}\n\n", [{
+            'text': f'{btn_icon} {bid} — {name} | {b.date} {b.time}',
             'callback_data': f'{prefix}{bid}'
         }])
-
-    keyboard = {'inline_keyboard': buttons}
-    send_message_inline(chat_id, msg, keyboard)
+    send_pages(chat_id, pages)
 
 # ===== XỬ LÝ CALLBACK =====
 def handle_callback(callback):
@@ -185,82 +240,83 @@ def handle_callback(callback):
     original_text = callback['message'].get('text', '')
     now_str = vn_now().strftime('%H:%M %d/%m/%Y')
 
-    print(f"Callback: {data} at {now_str} VN")
+    log.info(f"Callback: {data}")
 
     # === XÁC NHẬN 1 ĐƠN ===
     if data.startswith('confirm_') and data != 'confirm_all_yes':
         bid = data.replace('confirm_', '')
-        row = sheets.update_status(bid, '✅ Đã xác nhận')
+        row = storage.update_status(bid, Status.CONFIRMED.value)
         if not row:
             answer_callback(callback['id'], f'⚠️ Không tìm thấy {bid} đang chờ!')
             return
         answer_callback(callback['id'], f'✅ {bid} đã xác nhận!')
-        new_text = original_text + f"\n\n✅ ĐÃ XÁC NHẬN — {now_str}"
-        keyboard = {'inline_keyboard': [[
-            {'text': '✂️ Hoàn thành', 'callback_data': f'complete_{bid}'}
-        ]]}
+        new_text = original_text + f"\n\n✅ {bid} ĐÃ XÁC NHẬN — {now_str}"
+        keyboard = _keyboard_after(callback, bid, [
+            {'text': f'✂️ Hoàn thành {bid}', 'callback_data': f'complete_{bid}'}
+        ])
         edit_message(chat_id, message_id, new_text, keyboard)
-        send_message(chat_id, f"✅ Đã xác nhận <b>{bid}</b> — {row[1] if len(row) > 1 else ''}")
+        queue_message(chat_id, f"✅ Đã xác nhận <b>{bid}</b> — {row.name}")
 
     # === TỪ CHỐI 1 ĐƠN ===
     elif data.startswith('reject_') and data != 'reject_all':
         bid = data.replace('reject_', '')
-        row = sheets.update_status(bid, '❌ Đã từ chối')
+        row = storage.update_status(bid, Status.REJECTED.value)
         if not row:
             answer_callback(callback['id'], f'⚠️ Không tìm thấy {bid}!')
             return
         answer_callback(callback['id'], f'❌ {bid} đã từ chối!')
-        new_text = original_text + f"\n\n❌ ĐÃ TỪ CHỐI — {now_str}"
-        edit_message(chat_id, message_id, new_text)
-        send_message(chat_id, f"❌ Đã từ chối <b>{bid}</b> — {row[1] if len(row) > 1 else ''}")
+        new_text = original_text + f"\n\n❌ {bid} ĐÃ TỪ CHỐI — {now_str}"
+        edit_message(chat_id, message_id, new_text, _keyboard_after(callback, bid))
+        queue_message(chat_id, f"❌ Đã từ chối <b>{bid}</b> — {row.name}")
 
     # === HOÀN THÀNH 1 ĐƠN ===
     elif data.startswith('complete_') and data != 'complete_all_yes':
         bid = data.replace('complete_', '')
-        row = sheets.update_status(bid, '✅ Đã hoàn thành')
+        row = storage.update_status(bid, Status.COMPLETED.value)
         if not row:
             answer_callback(callback['id'], f'⚠️ Không tìm thấy {bid}!')
             return
         answer_callback(callback['id'], f'✂️ {bid} hoàn thành!')
-        new_text = original_text + f"\n\n✅ ĐÃ HOÀN THÀNH — {now_str}"
-        edit_message(chat_id, message_id, new_text)
-        send_message(chat_id, f"✂️ <b>{bid}</b> — {row[1] if len(row) > 1 else ''} hoàn thành!")
+        new_text = original_text + f"\n\n✅ {bid} ĐÃ HOÀN THÀNH — {now_str}"
+        edit_message(chat_id, message_id, new_text, _keyboard_after(callback, bid))
+        queue_message(chat_id, f"✂️ <b>{bid}</b> — {row.name} hoàn thành!")
 
     # === XÁC NHẬN TẤT CẢ — ĐỒNG Ý ===
     elif data == 'confirm_all_yes':
         answer_callback(callback['id'], '⏳ Đang xác nhận tất cả...')
-        bookings = sheets.get_bookings_by_status('Chờ')
+        bookings = storage.get_bookings_by_status(Status.PENDING, fresh=True)
         if not bookings:
             edit_message(chat_id, message_id, "✅ Không có đơn chờ xác nhận!")
             return
-        count = 0
-        for b in bookings:
-            bid = b[0] if len(b) > 0 else ''
-            if bid:
-                result = sheets.update_status(bid, '✅ Đã xác nhận')
-                if result:
-                    count += 1
+        ids = [b.id for b in bookings if b.id]
+        results = storage.update_status_many(ids, Status.CONFIRMED.value)
+        count = sum(1 for r in results.values() if r)
         msg = f"✅ <b>ĐÃ XÁC NHẬN TẤT CẢ</b>\n\nSố đơn: <b>{count}</b>\n⏰ {now_str}"
         edit_message(chat_id, message_id, msg)
-        send_message(chat_id, f"✅ Đã xác nhận tất cả <b>{count}</b> đơn!")
+        queue_message(chat_id, f"✅ Đã xác nhận tất cả <b>{count}</b> đơn!")
 
     # === HOÀN THÀNH TẤT CẢ — ĐỒNG Ý ===
     elif data == 'complete_all_yes':
         answer_callback(callback['id'], '⏳ Đang hoàn thành tất cả...')
-        bookings = sheets.get_bookings_by_status('Đã xác nhận')
+        bookings = storage.get_bookings_by_status(Status.CONFIRMED, fresh=True)
         if not bookings:
             edit_message(chat_id, message_id, "Không có đơn cần hoàn thành!")
             return
-        count = 0
-        for b in bookings:
-            bid = b[0] if len(b) > 0 else ''
-            if bid:
-                result = sheets.update_status(bid, '✅ Đã hoàn thành')
-                if result:
-                    count += 1
+        ids = [b.id for b in bookings if b.id]
+        results = storage.update_status_many(ids, Status.COMPLETED.value)
+        count = sum(1 for r in results.values() if r)
         msg = f"🏁 <b>ĐÃ HOÀN THÀNH TẤT CẢ</b>\n\nSố đơn: <b>{count}</b>\n⏰ {now_str}"
         edit_message(chat_id, message_id, msg)
-        send_message(chat_id, f"🏁 Đã hoàn thành tất cả <b>{count}</b> đơn!")
+        queue_message(chat_id, f"🏁 Đã hoàn thành tất cả <b>{count}</b> đơn!")
+
+    # === CHUYỂN TRANG DANH SÁCH ===
+    elif data.startswith('page:'):
+        page = render.get_page(data)
+        if page is None:
+            answer_callback(callback['id'], '⚠️ Danh sách đã hết hạn, mở lại lệnh')
+            return
+        answer_callback(callback['id'])
+        edit_message(chat_id, message_id, *page)
 
     # === HỦY THAO TÁC ===
     elif data == 'cancel_action':
@@ -276,7 +332,7 @@ def handle_command(message):
     text = message.get('text', '').strip()
     now_str = vn_now().strftime('%H:%M %d/%m/%Y')
 
-    print(f"Command: '{text}' from {chat_id} at {now_str} VN")
+    log.debug("Command", text=text, chat_id=chat_id)
 
     # --- START / HELP ---
     if text in ['/start', '/help', '❓ Trợ giúp']:
@@ -296,30 +352,20 @@ def handle_command(message):
     # --- HÔM NAY ---
     elif text in ['/today', '📅 Hôm nay']:
         today = sheets.get_today_str()
-        bookings = sheets.get_bookings_by_date(today)
+        bookings = storage.get_bookings_by_date(today)
         if not bookings:
             send_message(chat_id, f"📅 <b>Hôm nay ({today})</b>\n\nKhông có lịch hẹn.")
             return
-        msg = f"📅 <b>Hôm nay ({today})</b>\n━━━━━━━━━━━━━━━\n\n"
-        for b in bookings:
-            status = b[8] if len(b) > 8 else ''
-            msg += f"🆔 {b[0]} | 🕐 {b[6]} | {b[1]} ({b[2]})\n💈 {b[4]} | {status}\n\n"
-        msg += f"📊 Tổng: <b>{len(bookings)}</b>"
-        send_message(chat_id, msg)
+        send_pages(chat_id, _day_pages(f"📅 <b>Hôm nay ({today})</b>", bookings))
 
     # --- NGÀY MAI ---
     elif text in ['/tomorrow', '📅 Ngày mai']:
         tmr = (vn_now() + timedelta(days=1)).strftime('%d/%m/%Y')
-        bookings = sheets.get_bookings_by_date(tmr)
+        bookings = storage.get_bookings_by_date(tmr)
         if not bookings:
             send_message(chat_id, f"📅 <b>Ngày mai ({tmr})</b>\n\nKhông có lịch hẹn.")
             return
-        msg = f"📅 <b>Ngày mai ({tmr})</b>\n━━━━━━━━━━━━━━━\n\n"
-        for b in bookings:
-            status = b[8] if len(b) > 8 else ''
-            msg += f"🆔 {b[0]} | 🕐 {b[6]} | {b[1]} ({b[2]})\n💈 {b[4]} | {status}\n\n"
-        msg += f"📊 Tổng: <b>{len(bookings)}</b>"
-        send_message(chat_id, msg)
+        send_pages(chat_id, _day_pages(f"📅 <b>Ngày mai ({tmr})</b>", bookings))
 
     # --- TÌM KIẾM ---
     elif text.startswith('/find'):
@@ -327,18 +373,19 @@ def handle_command(message):
         if not keyword:
             send_message(chat_id, "⚠️ Nhập: /find 0901234567")
             return
-        results = sheets.find_booking(keyword)
+        # Không thấy trên dữ liệu đang chạy thì tìm trong lưu trữ 30 ngày gần đây
+        results = storage.find_booking(keyword) or archive.search_archive(keyword)
         if not results:
             send_message(chat_id, f"🔍 Không tìm thấy: <b>{keyword}</b>")
             return
-        msg = f"🔍 <b>Kết quả: {keyword}</b>\n━━━━━━━━━━━━━━━\n\n"
+        pages = render.Pages(f"🔍 <b>Kết quả: {keyword}</b>\n━━━━━━━━━━━━━━━\n\n")
         for b in results:
-            msg += f"🆔 {b[0]} | {b[1]} ({b[2]})\n📅 {b[5]} 🕐 {b[6]} | {b[8]}\n\n"
-        send_message(chat_id, msg)
+            pages.add(f"🆔 {b.id} | {b.name} ({b.phone})\n📅 {b.date} 🕐 {b.time} | {b.status}\n\n")
+        send_pages(chat_id, pages)
 
     # --- THỐNG KÊ ---
     elif text in ['/stats', '📊 Thống kê']:
-        s = sheets.get_stats()
+        s = storage.get_stats()
         send_message(chat_id,
             f"📊 <b>THỐNG KÊ</b>\n━━━━━━━━━━━━━━━\n\n"
             f"📋 Tổng: <b>{s['total']}</b>\n"
@@ -364,49 +411,35 @@ def handle_command(message):
 
     # --- XÁC NHẬN TẤT CẢ ---
     elif text == '✅ Xác nhận tất cả':
-        bookings = sheets.get_bookings_by_status('Chờ')
+        bookings = storage.get_bookings_by_status(Status.PENDING)
         if not bookings:
             send_message(chat_id, "✅ Không có đơn chờ xác nhận!")
             return
-        msg = f"⚠️ <b>XÁC NHẬN TẤT CẢ?</b>\n\nSẽ xác nhận <b>{len(bookings)}</b> đơn đang chờ:\n\n"
-        for b in bookings:
-            bid = b[0] if len(b) > 0 else '?'
-            name = b[1] if len(b) > 1 else '?'
-            date_val = b[5] if len(b) > 5 else ''
-            time_val = b[6] if len(b) > 6 else ''
-            msg += f"• {bid} — {name} | {date_val} {time_val}\n"
-        keyboard = {
-            'inline_keyboard': [
-                [
-                    {'text': '✅ Đồng ý xác nhận tất cả', 'callback_data': 'confirm_all_yes'},
-                    {'text': '❎ Hủy', 'callback_data': 'cancel_action'}
-                ]
+        pages = render.Pages(f"⚠️ <b>XÁC NHẬN TẤT CẢ?</b>\n\nSẽ xác nhận <b>{len(bookings)}</b> đơn đang chờ:\n\n", actions=[
+            [
+                {'text': '✅ Đồng ý xác nhận tất cả', 'callback_data': 'confirm_all_yes'},
+                {'text': '❎ Hủy', 'callback_data': 'cancel_action'}
             ]
-        }
-        send_message_inline(chat_id, msg, keyboard)
+        ], per_page=30)
+        for b in bookings:
+            pages.add(f"• {b.id or '?'} — {b.name or '?'} | {b.date} {b.time}\n")
+        send_pages(chat_id, pages)
 
     # --- HOÀN THÀNH TẤT CẢ ---
     elif text == '🏁 Hoàn thành tất cả':
-        bookings = sheets.get_bookings_by_status('Đã xác nhận')
+        bookings = storage.get_bookings_by_status(Status.CONFIRMED)
         if not bookings:
             send_message(chat_id, "Không có đơn đã xác nhận để hoàn thành!")
             return
-        msg = f"⚠️ <b>HOÀN THÀNH TẤT CẢ?</b>\n\nSẽ hoàn thành <b>{len(bookings)}</b> đơn đã xác nhận:\n\n"
-        for b in bookings:
-            bid = b[0] if len(b) > 0 else '?'
-            name = b[1] if len(b) > 1 else '?'
-            date_val = b[5] if len(b) > 5 else ''
-            time_val = b[6] if len(b) > 6 else ''
-            msg += f"• {bid} — {name} | {date_val} {time_val}\n"
-        keyboard = {
-            'inline_keyboard': [
-                [
-                    {'text': '🏁 Đồng ý hoàn thành tất cả', 'callback_data': 'complete_all_yes'},
-                    {'text': '❎ Hủy', 'callback_data': 'cancel_action'}
-                ]
+        pages = render.Pages(f"⚠️ <b>HOÀN THÀNH TẤT CẢ?</b>\n\nSẽ hoàn thành <b>{len(bookings)}</b> đơn đã xác nhận:\n\n", actions=[
+            [
+                {'text': '🏁 Đồng ý hoàn thành tất cả', 'callback_data': 'complete_all_yes'},
+                {'text': '❎ Hủy', 'callback_data': 'cancel_action'}
             ]
-        }
-        send_message_inline(chat_id, msg, keyboard)
+        ], per_page=30)
+        for b in bookings:
+            pages.add(f"• {b.id or '?'} — {b.name or '?'} | {b.date} {b.time}\n")
+        send_pages(chat_id, pages)
 
     # --- MẶC ĐỊNH ---
     else:
@@ -415,7 +448,7 @@ def handle_command(message):
 # ===== WEBHOOK =====
 def set_webhook(url):
     try:
-        resp = requests.post(f"{API}/setWebhook", json={
+        resp = http_client.post(f"{API}/setWebhook", bot='telegram', json={
             'url': f"{url}/telegram",
             'drop_pending_updates': True
         }, timeout=10)
@@ -426,7 +459,7 @@ def set_webhook(url):
 
 def delete_webhook():
     try:
-        resp = requests.post(f"{API}/deleteWebhook", json={
+        resp = http_client.post(f"{API}/deleteWebhook", bot='telegram', json={
             'drop_pending_updates': True
         }, timeout=10)
         return resp.json()
@@ -1,13 +1,16 @@
-import requests
 import json
 from datetime import datetime, timedelta
+import availability
 import config
-import sheets
+import http_client
+import logs
+import sessions
+import storage
 
 ZALO_API = f"https://bot-api.zaloplatforms.com/bot{config.ZALO_BOT_TOKEN}"
+log = logs.get_logger('zalo')
 
-# Lưu trạng thái hội thoại của từng user (in-memory)
-user_sessions = {}
+# Trạng thái hội thoại của từng user nằm trong sessions (SQLite, dùng chung giữa các worker)
 
 SERVICES = {
     '1': 'Cắt Tóc Nam - 100K',
@@ -26,6 +29,7 @@ STEP_ENTER_DATE = 'enter_date'
 STEP_ENTER_TIME = 'enter_time'
 STEP_ENTER_NOTE = 'enter_note'
 STEP_CONFIRM = 'confirm'
+STEP_SAVING = 'saving'
 
 
 def send_message(chat_id, text):
@@ -34,19 +38,24 @@ def send_message(chat_id, text):
         'text': text
     }
     try:
-        resp = requests.post(f"{ZALO_API}/sendMessage", json=payload, timeout=10)
-        print(f"Zalo sendMessage: {resp.status_code} {resp.text}")
+        resp = http_client.post(f"{ZALO_API}/sendMessage", bot='zalo', chat_id=chat_id, json=payload)
+        log.debug("Zalo sendMessage", status=resp.status_code)
         return resp.json()
     except Exception as e:
-        print(f"Zalo send error: {e}")
+        log.exception(f"Zalo send error: {e}")
         return {}
 
 
+def message_id(data):
+    message = data.get('result', {}).get('message', {})
+    return message.get('message_id') or ''
+
+
 def handle_zalo_update(data):
     try:
         result = data.get('result', {})
         event = result.get('event_name', '')
-        print(f"Zalo event: {event}")
+        log.debug(f"Zalo event: {event}")
 
         if event == 'message.text.received':
             message = result.get('message', {})
@@ -54,10 +63,10 @@ def handle_zalo_update(data):
             text = message.get('text', '').strip()
             sender_name = message.get('from', {}).get('display_name', 'Khách')
 
-            print(f"Zalo msg from {sender_name} ({chat_id}): {text}")
+            log.payload("Zalo msg", {'name': sender_name, 'chat_id': chat_id, 'text': text})
             handle_zalo_message(chat_id, text, sender_name)
     except Exception as e:
-        print(f"Zalo handle error: {e}")
+        log.exception(f"Zalo handle error: {e}")
 
 
 def handle_zalo_message(chat_id, text, sender_name):
@@ -65,14 +74,12 @@ def handle_zalo_message(chat_id, text, sender_name):
 
     # ===== LỆNH ĐẶC BIỆT (luôn ưu tiên) =====
     if text_lower in ['huy', 'hủy', 'cancel', 'thoat', 'thoát', 'exit']:
-        if chat_id in user_sessions:
-            del user_sessions[chat_id]
+        sessions.delete(chat_id)
         send_message(chat_id, "❌ Đã hủy đặt lịch.\n\nGõ 'đặt lịch' để bắt đầu lại.")
         return
 
     if text_lower in ['/start', 'hi', 'hello', 'xin chào', 'chào', 'start']:
-        if chat_id in user_sessions:
-            del user_sessions[chat_id]
+        sessions.delete(chat_id)
         show_welcome(chat_id, sender_name)
         return
 
@@ -85,8 +92,8 @@ def handle_zalo_message(chat_id, text, sender_name):
         return
 
     # ===== XỬ LÝ THEO TRẠNG THÁI HỘI THOẠI =====
-    if chat_id in user_sessions:
-        session = user_sessions[chat_id]
+    session = sessions.get(chat_id)
+    if session:
         step = session.get('step', '')
 
         if step == STEP_CHOOSE_SERVICE:
@@ -145,7 +152,7 @@ def show_menu(chat_id):
 # ===== QUY TRÌNH ĐẶT LỊCH =====
 
 def start_booking(chat_id, sender_name):
-    user_sessions[chat_id] = {
+    sessions.put(chat_id, {
         'step': STEP_CHOOSE_SERVICE,
         'sender_name': sender_name,
         'fullname': '',
@@ -154,7 +161,7 @@ def start_booking(chat_id, sender_name):
         'date': '',
         'time': '',
         'note': ''
-    }
+    })
 
     msg = (
         "✂️ ĐẶT LỊCH CẮT TÓC\n"
@@ -178,9 +185,8 @@ def handle_choose_service(chat_id, text):
         send_message(chat_id, "⚠️ Vui lòng gõ số từ 1 đến 6 để chọn dịch vụ.\n\nGõ 'hủy' để thoát.")
         return
 
-    session = user_sessions[chat_id]
-    session['service'] = SERVICES[text]
-    session['step'] = STEP_ENTER_NAME
+    if not sessions.advance(chat_id, STEP_CHOOSE_SERVICE, STEP_ENTER_NAME, service=SERVICES[text]):
+        return
 
     msg = (
         f"✅ Dịch vụ: {SERVICES[text]}\n\n"
@@ -195,9 +201,8 @@ def handle_enter_name(chat_id, text):
         send_message(chat_id, "⚠️ Họ tên quá ngắn. Vui lòng nhập lại:")
         return
 
-    session = user_sessions[chat_id]
-    session['fullname'] = text
-    session['step'] = STEP_ENTER_PHONE
+    if not sessions.advance(chat_id, STEP_ENTER_NAME, STEP_ENTER_PHONE, fullname=text):
+        return
 
     msg = (
         f"✅ Họ tên: {text}\n\n"
@@ -214,9 +219,8 @@ def handle_enter_phone(chat_id, text):
         send_message(chat_id, "⚠️ Số điện thoại không hợp lệ.\nVui lòng nhập lại (VD: 0901234567):")
         return
 
-    session = user_sessions[chat_id]
-    session['phone'] = phone
-    session['step'] = STEP_ENTER_DATE
+    if not sessions.advance(chat_id, STEP_ENTER_PHONE, STEP_ENTER_DATE, phone=phone):
+        return
 
     today = datetime.now().strftime('%d/%m/%Y')
     tomorrow = (datetime.now() + timedelta(days=1)).strftime('%d/%m/%Y')
@@ -253,44 +257,73 @@ def handle_enter_date(chat_id, text):
             send_message(chat_id, "⚠️ Sai định dạng. Gõ 1, 2 hoặc ngày dd/mm/yyyy\nVí dụ: 20/02/2026")
             return
 
-    session = user_sessions[chat_id]
-    session['date'] = date_str
-    session['step'] = STEP_ENTER_TIME
+    # Menu giờ lấy từ lịch trống của ngày đó cho đúng dịch vụ đã chọn
+    session = sessions.get(chat_id) or {}
+    slots = availability.free_slots(date_str, session.get('service', ''))
+    if not slots:
+        send_message(chat_id, f"⚠️ Ngày {date_str} đã kín lịch.\nVui lòng chọn ngày khác (dd/mm/yyyy):")
+        return
+
+    if not sessions.advance(chat_id, STEP_ENTER_DATE, STEP_ENTER_TIME, date=date_str, slots=slots):
+        return
 
     msg = (
         f"✅ Ngày: {date_str}\n\n"
-        f"Bước 5/6 — Chọn giờ hẹn:\n\n"
-        f"1 — 08:00    5 — 12:00\n"
-        f"2 — 09:00    6 — 14:00\n"
-        f"3 — 10:00    7 — 15:00\n"
-        f"4 — 11:00    8 — 16:00\n\n"
+        f"Bước 5/6 — Chọn giờ hẹn (giờ còn trống):\n\n"
+        f"{time_menu(slots)}\n\n"
         f"Hoặc gõ giờ: HH:MM\n"
-        f"👉 Ví dụ: 14:30"
+        f"👉 Ví dụ: {slots[-1]}"
     )
     send_message(chat_id, msg)
 
 
+def time_menu(slots):
+    # 2 cột: 1 — 08:00    9 — 12:00
+    half = (len(slots) + 1) // 2
+    lines = []
+    for i in range(half):
+        line = f"{i + 1} — {slots[i]}"
+        if i + half < len(slots):
+            line += f"    {i + half + 1} — {slots[i + half]}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def send_time_again(chat_id, error, slots):
+    if slots:
+        send_message(chat_id, f"⚠️ {error}\n\nGiờ còn trống:\n{time_menu(slots)}")
+    else:
+        send_message(chat_id, f"⚠️ {error}\n\nNgày này đã kín lịch. Gõ 'đặt lịch' để chọn ngày khác.")
+
+
 def handle_enter_time(chat_id, text):
     text = text.strip()
+    session = sessions.get(chat_id) or {}
+    slots = session.get('slots') or []
 
-    time_options = {
-        '1': '08:00', '2': '09:00', '3': '10:00', '4': '11:00',
-        '5': '12:00', '6': '14:00', '7': '15:00', '8': '16:00'
-    }
-
-    if text in time_options:
-        time_str = time_options[text]
+    if text.isdigit() and 1 <= int(text) <= len(slots):
+        time_str = slots[int(text) - 1]
     else:
         # Kiểm tra định dạng HH:MM
         import re
         if not re.match(r'^([01]?[0-9]|2[0-3]):[0-5][0-9]$', text):
-            send_message(chat_id, "⚠️ Sai định dạng. Gõ số 1-8 hoặc giờ HH:MM\nVí dụ: 14:30")
+            if slots:
+                send_message(chat_id, f"⚠️ Sai định dạng. Gõ số 1-{len(slots)} hoặc giờ HH:MM\nVí dụ: {slots[-1]}")
+            else:
+                send_message(chat_id, "⚠️ Ngày này đã kín lịch. Gõ 'đặt lịch' để chọn ngày khác.")
             return
         time_str = text
 
-    session = user_sessions[chat_id]
-    session['time'] = time_str
-    session['step'] = STEP_ENTER_NOTE
+    # Menu có thể đã cũ (người khác vừa đặt): hỏi lại lịch trống
+    error = availability.check(session.get('date', ''), time_str, session.get('service', ''))
+    if error:
+        slots = availability.free_slots(session.get('date', ''), session.get('service', ''))
+        sessions.advance(chat_id, STEP_ENTER_TIME, STEP_ENTER_TIME, slots=slots)
+        send_time_again(chat_id, error, slots)
+        return
+
+    if not sessions.advance(chat_id, STEP_ENTER_TIME, STEP_ENTER_NOTE, time=time_str):
+        return
 
     msg = (
         f"✅ Giờ: {time_str}\n\n"
@@ -302,14 +335,10 @@ def handle_enter_time(chat_id, text):
 
 
 def handle_enter_note(chat_id, text):
-    session = user_sessions[chat_id]
-
-    if text.strip() == '0':
-        session['note'] = ''
-    else:
-        session['note'] = text
-
-    session['step'] = STEP_CONFIRM
+    note = '' if text.strip() == '0' else text
+    session = sessions.advance(chat_id, STEP_ENTER_NOTE, STEP_CONFIRM, note=note)
+    if not session:
+        return
 
     # Hiện tổng kết
     msg = (
@@ -336,13 +365,13 @@ def handle_confirm(chat_id, text):
     text = text.strip()
 
     if text == '2':
-        del user_sessions[chat_id]
+        sessions.delete(chat_id)
         send_message(chat_id, "❌ Đã hủy đặt lịch.\nGõ 'đặt lịch' để bắt đầu lại.")
         return
 
     if text == '3':
-        sender_name = user_sessions[chat_id].get('sender_name', 'Khách')
-        del user_sessions[chat_id]
+        session = sessions.get(chat_id) or {}
+        sender_name = session.get('sender_name') or 'Khách'
         start_booking(chat_id, sender_name)
         return
 
@@ -351,7 +380,10 @@ def handle_confirm(chat_id, text):
         return
 
     # ===== XÁC NHẬN - LƯU BOOKING =====
-    session = user_sessions[chat_id]
+    # Chiếm phiên trước khi lưu để tin '1' gửi trùng không tạo 2 đơn
+    session = sessions.advance(chat_id, STEP_CONFIRM, STEP_SAVING)
+    if not session:
+        return
 
     # Chuyển ngày dd/mm/yyyy sang yyyy-mm-dd để lưu vào sheets
     date_parts = session['date'].split('/')
@@ -371,9 +403,30 @@ def handle_confirm(chat_id, text):
         'source': 'Zalo'
     }
 
+    # Giữ khung giờ; vừa có người khác đặt mất thì quay lại bước chọn giờ
+    hold, error = availability.reserve(booking_data['date'], booking_data['time'], booking_data['service'])
+    if error:
+        slots = availability.free_slots(booking_data['date'], booking_data['service'])
+        sessions.advance(chat_id, STEP_SAVING, STEP_ENTER_TIME, time='', slots=slots)
+        send_time_again(chat_id, error, slots)
+        return
+
+    try:
+        booking_id, date_formatted = storage.add_booking(booking_data)
+    except Exception as e:
+        log.exception(f"Booking save error: {e}")
+        availability.cancel(hold)
+        send_message(chat_id, "⚠️ Có lỗi xảy ra, vui lòng thử lại sau hoặc gọi 0901 234 567.")
+        sessions.delete(chat_id)
+        return
+
+    # Đơn đã lưu: lỗi gửi tin phía sau không được trả lại khung giờ hay báo lỗi cho khách
     try:
-        booking_id, date_formatted = sheets.add_booking(booking_data)
+        availability.confirm(hold, booking_id)
+    except Exception as e:
+        log.exception(f"Availability confirm error: {e}")
 
+    try:
         # Gửi xác nhận cho khách
         confirm_msg = (
             "🎉 ĐẶT LỊCH THÀNH CÔNG!\n"
@@ -393,24 +446,24 @@ def handle_confirm(chat_id, text):
             "Gõ 'đặt lịch' để đặt thêm lịch mới."
         )
         send_message(chat_id, confirm_msg)
+    except Exception as e:
+        log.exception(f"Booking confirm message error: {e}")
 
+    try:
         # Thông báo admin qua Telegram
         from telegram_bot import notify_new_booking
         notify_new_booking(booking_id, booking_data, date_formatted)
-
     except Exception as e:
-        print(f"Booking save error: {e}")
-        send_message(chat_id, "⚠️ Có lỗi xảy ra, vui lòng thử lại sau hoặc gọi 0901 234 567.")
+        log.exception(f"Booking notify error: {e}")
 
     # Xóa session
-    if chat_id in user_sessions:
-        del user_sessions[chat_id]
+    sessions.delete(chat_id)
 
 
 def set_webhook(url):
-    resp = requests.post(f"{ZALO_API}/setWebhook", json={
+    resp = http_client.post(f"{ZALO_API}/setWebhook", bot='zalo', json={
         'url': f"{url}/zalo",
         'secret_token': config.ZALO_SECRET_TOKEN
     }, timeout=10)
-    print(f"Zalo setWebhook: {resp.status_code} {resp.text}")
+    log.info(f"Zalo setWebhook: {resp.status_code} {resp.text}")
     return resp.json()